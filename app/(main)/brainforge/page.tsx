@@ -1,7 +1,7 @@
 // brainforge/page.tsx
 "use client";
 
-import { useState } from "react";
+import { useRef, useState } from "react";
 import { toast } from "sonner";
 import { Brain, Sparkles } from "lucide-react";
 
@@ -17,6 +17,9 @@ export default function BrainForgePage() {
   const [trueFalsePercentage, setTrueFalsePercentage] = useState(50);
   const [fillInPercentage, setFillInPercentage] = useState(0);
 
+  // Files already registered with the backend, so regenerating skips the upload
+  const documentIds = useRef(new Map<string, string>());
+
   // API/Data State
   const [isLoading, setIsLoading] = useState(false);
   const [generatedQuestions, setGeneratedQuestions] =
@@ -92,22 +95,42 @@ export default function BrainForgePage() {
           }),
         });
       } else {
-        // file
-        const formData = new FormData();
-        formData.append("file", source.content);
-        formData.append("total_questions", totalQuestions.toString());
-        formData.append(
-          "question_distribution_json",
-          JSON.stringify({
-            mcq: mcqPercentage / 100,
-            true_false: trueFalsePercentage / 100,
-            fill_in: fillInPercentage / 100,
-          }),
-        );
-        response = await fetch("http://localhost:8000/generate-from-file/", {
-          method: "POST",
-          body: formData,
-        });
+        // file: uploaded and processed once, then generated from by id
+        const file = source.content;
+        const fileKey = `${file.name}:${file.size}:${file.lastModified}`;
+        const generate = (documentId: string) =>
+          fetch("http://localhost:8000/generate-from-document/", {
+            method: "POST",
+            headers: { "Content-Type": "application/json" },
+            body: JSON.stringify({
+              document_id: documentId,
+              total_questions: totalQuestions,
+              mcq_percentage: mcqPercentage / 100,
+              true_false_percentage: trueFalsePercentage / 100,
+              fill_in_percentage: fillInPercentage / 100,
+            }),
+          });
+
+        const cachedId = documentIds.current.get(fileKey);
+        const cached = cachedId ? await generate(cachedId) : null;
+        if (cached && cached.status !== 410) {
+          response = cached;
+        } else {
+          // Not registered yet, or pruned on the server since (410)
+          const formData = new FormData();
+          formData.append("file", file);
+          const upload = await fetch("http://localhost:8000/documents/", {
+            method: "POST",
+            body: formData,
+          });
+          if (!upload.ok) {
+            response = upload;
+          } else {
+            const { document_id } = await upload.json();
+            documentIds.current.set(fileKey, document_id);
+            response = await generate(document_id);
+          }
+        }
       }
 
       if (!response.ok) {
@@ -0,0 +1,280 @@
+"""
+artifacts.py - Prefetch, checksum and locate every model artifact offline.
+
+Everything the service loads from the network on first use is listed in
+ARTIFACTS:
+- the Questgen T5 checkpoints and the BART summarizer (Hugging Face Hub)
+- the sense2vec vectors Questgen reads from ./s2v_old
+- the NLTK corpora and tokenizers
+- the spaCy pipeline
+
+`prefetch` downloads them into MODEL_CACHE_DIR and writes a lock file. The
+lock file records the resolved revision, size and sha256 of every file.
+
+At startup, `prepare_runtime()` points Hugging Face and NLTK at the cache and
+checks the files against the lock. If that check passes, it switches both
+libraries to offline mode, so a baked image never touches the network.
+
+Usage (from ml-backend/):
+    python -m app.artifacts prefetch            # at image build time
+    python -m app.artifacts verify --full       # re-hash every file
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import urllib.request
+from typing import Dict, List, Optional
+
+from . import config
+
+# -----------------------------------------------------------------------------
+# MANIFEST
+# -----------------------------------------------------------------------------
+# Only the PyTorch weights and tokenizer files are fetched; TF, Flax and Rust
+# weights in the same repos are never loaded.
+HF_ALLOW_PATTERNS = ["*.json", "*.bin", "*.safetensors", "*.model", "*.txt"]
+
+ARTIFACTS: List[Dict[str, str]] = [
+    {"name": "questgen-mcq", "kind": "huggingface", "source": "Parth/result"},
+    {"name": "questgen-boolq", "kind": "huggingface", "source": "ramsrigouthamg/t5_boolean_questions"},
+    {"name": "t5-tokenizer", "kind": "huggingface", "source": "t5-base"},
+    {"name": "summarizer", "kind": "huggingface", "source": "facebook/bart-large-cnn"},
+    {
+        "name": "sense2vec",
+        "kind": "archive",
+        "source": "https://github.com/explosion/sense2vec/releases/download/v1.0.0/s2v_reddit_2015_md.tar.gz",
+        "target": "s2v_old",
+    },
+    {"name": "nltk-punkt", "kind": "nltk", "source": "punkt", "target": "tokenizers/punkt"},
+    {"name": "nltk-punkt-tab", "kind": "nltk", "source": "punkt_tab", "target": "tokenizers/punkt_tab"},
+    {"name": "nltk-stopwords", "kind": "nltk", "source": "stopwords", "target": "corpora/stopwords"},
+    {"name": "nltk-brown", "kind": "nltk", "source": "brown", "target": "corpora/brown"},
+    {"name": "nltk-universal-tagset", "kind": "nltk", "source": "universal_tagset", "target": "taggers/universal_tagset"},
+    {"name": "spacy-en", "kind": "spacy", "source": "en_core_web_sm"},
+]
+
+LOCK_FILE = "artifacts.lock.json"
+# Set once prepare_runtime() has switched to the verified cache; runtime downloaders check it
+OFFLINE_ENV = "EDUHIVE_MODELS_OFFLINE"
+
+
+def hf_home(cache_dir: str) -> str:
+    return os.path.join(cache_dir, "huggingface")
+
+
+def nltk_dir(cache_dir: str) -> str:
+    return os.path.join(cache_dir, "nltk_data")
+
+
+def lock_path(cache_dir: str) -> str:
+    return os.path.join(cache_dir, LOCK_FILE)
+
+
+# -----------------------------------------------------------------------------
+# FILE HASHING
+# -----------------------------------------------------------------------------
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _describe_tree(root: str) -> Dict[str, Dict[str, object]]:
+    """{relative path: {size, sha256}} for every file under root."""
+    files = {}
+    for directory, subdirectories, filenames in os.walk(root):
+        # Bytecode caches change whenever Python recompiles; they are not artifacts
+        subdirectories[:] = [d for d in subdirectories if d != "__pycache__"]
+        for filename in sorted(filenames):
+            path = os.path.join(directory, filename)
+            # Hub snapshots are symlinks into blobs/; hash what they point at
+            files[os.path.relpath(path, root)] = {"size": os.path.getsize(path), "sha256": _sha256(path)}
+    return files
+
+
+# -----------------------------------------------------------------------------
+# PREFETCH
+# -----------------------------------------------------------------------------
+def _fetch_huggingface(artifact: Dict[str, str], cache_dir: str) -> Dict[str, object]:
+    from huggingface_hub import snapshot_download
+
+    path = snapshot_download(
+        artifact["source"], cache_dir=os.path.join(hf_home(cache_dir), "hub"), allow_patterns=HF_ALLOW_PATTERNS
+    )
+    return {"path": os.path.relpath(path, cache_dir), "revision": os.path.basename(path)}
+
+
+def _fetch_archive(artifact: Dict[str, str], cache_dir: str) -> Dict[str, object]:
+    target = os.path.join(cache_dir, artifact["target"])
+    if not os.path.isdir(target):
+        with tempfile.TemporaryDirectory(dir=cache_dir) as scratch:
+            archive = os.path.join(scratch, "archive.tar.gz")
+            print(f"  downloading {artifact['source']}")
+            urllib.request.urlretrieve(artifact["source"], archive)
+            with tarfile.open(archive) as tar:
+                for member in tar.getmembers():
+                    if member.name.startswith(("/", "..")) or ".." in member.name.split("/"):
+                        raise ValueError(f"Refusing unsafe archive member {member.name}")
+                tar.extractall(scratch)
+            shutil.move(os.path.join(scratch, artifact["target"]), target)
+    return {"path": artifact["target"], "revision": os.path.basename(artifact["source"])}
+
+
+def _fetch_nltk(artifact: Dict[str, str], cache_dir: str) -> Dict[str, object]:
+    import nltk
+
+    if not nltk.download(artifact["source"], download_dir=nltk_dir(cache_dir), quiet=True):
+        raise RuntimeError(f"NLTK download failed for {artifact['source']}")
+    return {"path": os.path.relpath(os.path.join(nltk_dir(cache_dir), artifact["target"]), cache_dir), "revision": None}
+
+
+def _fetch_spacy(artifact: Dict[str, str], cache_dir: str) -> Dict[str, object]:
+    import spacy
+
+    if not spacy.util.is_package(artifact["source"]):
+        spacy.cli.download(artifact["source"])
+    # spaCy pipelines are pip packages; they are verified in place rather than copied
+    path = str(spacy.util.get_package_path(artifact["source"]))
+    return {"path": path, "revision": spacy.util.get_package_version(artifact["source"])}
+
+
+FETCHERS = {
+    "huggingface": _fetch_huggingface,
+    "archive": _fetch_archive,
+    "nltk": _fetch_nltk,
+    "spacy": _fetch_spacy,
+}
+
+
+def _resolve(cache_dir: str, path: str) -> str:
+    return path if os.path.isabs(path) else os.path.join(cache_dir, path)
+
+
+def prefetch(cache_dir: str) -> dict:
+    """Download every artifact into cache_dir and write the lock file."""
+    os.makedirs(cache_dir, exist_ok=True)
+    lock = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "artifacts": {}}
+    for artifact in ARTIFACTS:
+        print(f"• {artifact['name']} ({artifact['kind']}: {artifact['source']})")
+        entry = FETCHERS[artifact["kind"]](artifact, cache_dir)
+        entry["files"] = _describe_tree(_resolve(cache_dir, entry["path"]))
+        if not entry["files"]:
+            raise RuntimeError(f"{artifact['name']} produced no files")
+        lock["artifacts"][artifact["name"]] = {"kind": artifact["kind"], "source": artifact["source"], **entry}
+
+    with open(lock_path(cache_dir), "w", encoding="utf-8") as handle:
+        json.dump(lock, handle, indent=2)
+    return lock
+
+
+# -----------------------------------------------------------------------------
+# VERIFY
+# -----------------------------------------------------------------------------
+def verify(cache_dir: str, full: bool = False) -> List[str]:
+    """
+    Compare the cache against its lock file and return the problems found.
+    The default check is file presence and size; full=True re-hashes everything.
+    """
+    try:
+        with open(lock_path(cache_dir), encoding="utf-8") as handle:
+            lock = json.load(handle)
+    except (OSError, ValueError) as e:
+        return [f"unreadable lock file {lock_path(cache_dir)}: {e}"]
+
+    problems = []
+    missing = {a["name"] for a in ARTIFACTS} - set(lock["artifacts"])
+    problems.extend(f"{name}: not in lock file" for name in sorted(missing))
+    for name, entry in lock["artifacts"].items():
+        root = _resolve(cache_dir, entry["path"])
+        for relative, expected in entry["files"].items():
+            path = os.path.join(root, relative)
+            if not os.path.isfile(path):
+                problems.append(f"{name}: missing {relative}")
+            elif os.path.getsize(path) != expected["size"]:
+                problems.append(f"{name}: size mismatch for {relative}")
+            elif full and _sha256(path) != expected["sha256"]:
+                problems.append(f"{name}: checksum mismatch for {relative}")
+    return problems
+
+
+# -----------------------------------------------------------------------------
+# RUNTIME
+# -----------------------------------------------------------------------------
+def prepare_runtime(cache_dir: Optional[str] = None, mode: Optional[str] = None) -> bool:
+    """
+    Point Hugging Face, NLTK and Questgen at the artifact cache.
+
+    Must run before transformers, nltk or Questgen are imported. mode is
+    config.OFFLINE_MODELS: "auto" goes offline only when a verified lock
+    file is present, "1" requires it and raises otherwise, "0" leaves
+    network access alone. Returns True when running offline.
+    """
+    cache_dir = cache_dir or config.MODEL_CACHE_DIR
+    mode = (mode or config.OFFLINE_MODELS).lower()
+    if mode in ("0", "false", "no") or not os.path.isdir(cache_dir):
+        if mode in ("1", "true", "yes"):
+            raise RuntimeError(f"OFFLINE_MODELS is set but {cache_dir} does not exist; run `python -m app.artifacts prefetch`")
+        return False
+
+    os.environ["HF_HOME"] = os.path.abspath(hf_home(cache_dir))
+    os.environ["NLTK_DATA"] = os.pathsep.join(filter(None, [os.path.abspath(nltk_dir(cache_dir)), os.getenv("NLTK_DATA")]))
+    if "nltk" in sys.modules:
+        sys.modules["nltk"].data.path.insert(0, os.path.abspath(nltk_dir(cache_dir)))
+
+    problems = verify(cache_dir, full=config.MODEL_VERIFY == "sha256") if config.MODEL_VERIFY != "off" else []
+    if problems:
+        summary = "; ".join(problems[:5])
+        if mode in ("1", "true", "yes"):
+            raise RuntimeError(f"Model artifact check failed: {summary}")
+        print(f"⚠️ Model cache {cache_dir} failed verification, staying online: {summary}")
+        return False
+
+    # Questgen loads sense2vec from the relative path s2v_old
+    s2v_target = os.path.join(cache_dir, "s2v_old")
+    if os.path.isdir(s2v_target) and not os.path.exists("s2v_old"):
+        try:
+            os.symlink(os.path.abspath(s2v_target), "s2v_old")
+        except OSError as e:
+            print(f"⚠️ Could not link s2v_old to {s2v_target}: {e}")
+
+    os.environ["HF_HUB_OFFLINE"] = "1"
+    os.environ["TRANSFORMERS_OFFLINE"] = "1"
+    os.environ[OFFLINE_ENV] = "1"
+    print(f"📦 Using verified model artifacts from {cache_dir} (offline)")
+    return True
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("prefetch", "verify"))
+    parser.add_argument("--cache-dir", default=config.MODEL_CACHE_DIR)
+    parser.add_argument("--full", action="store_true", help="verify: re-hash every file instead of checking sizes")
+    args = parser.parse_args(argv)
+
+    if args.command == "prefetch":
+        os.environ["HF_HOME"] = os.path.abspath(hf_home(args.cache_dir))
+        lock = prefetch(args.cache_dir)
+        total = sum(f["size"] for entry in lock["artifacts"].values() for f in entry["files"].values())
+        print(f"Wrote {lock_path(args.cache_dir)}: {len(lock['artifacts'])} artifacts, {total / 1_048_576:,.0f} MiB")
+        return 0
+
+    problems = verify(args.cache_dir, full=args.full)
+    for problem in problems:
+        print(f"✗ {problem}")
+    print("OK" if not problems else f"{len(problems)} problem(s)")
+    return 0 if not problems else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,405 @@
+"""
+broker.py - Job queue between the API and the inference workers.
+
+With BROKER_URL set, the API process loads no models: it submits each
+generation request as a job and waits for the result. The work is done by
+`python -m app.worker` processes, on this host or others, which claim jobs,
+publish progress events and store results (see worker.py).
+
+Broker is the interface; open_broker() picks the implementation from the
+URL scheme. SQLiteBroker ("sqlite:///path/to/jobs.sqlite3") is for one host:
+API and workers share the file. Another backend (Redis, a database server)
+only needs the same methods and an entry in BROKERS.
+
+Jobs move through queued -> running -> done | failed | cancelled. A running
+job holds a lease that its worker renews; when a worker dies, the job is
+queued again once the lease runs out, up to MAX_ATTEMPTS runs. A job can
+also go back to queued as a different kind, the next stage of the same
+request (prepare -> generate), keeping its id, events and priority. Jobs
+with a target are only claimed by that worker (follow-ups to a generation
+session it holds in memory). Queued jobs are claimed in priority order,
+lowest first; the API sets priority to the job's fair-queuing finish tag.
+
+Usage:
+    broker = open_broker("sqlite:///jobs.sqlite3")
+    job_id = broker.submit("generate", {"context": text, ...}, priority=3.5)
+    job = broker.claim("worker-1", ["generate"], lease_s=30)     # in a worker
+    broker.complete(job.id, result)
+    broker.get(job_id).result                                    # in the API; no payload or data
+"""
+
+from __future__ import annotations
+
+import abc
+import contextlib
+import json
+import os
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+TERMINAL = ("done", "failed", "cancelled")
+MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    priority REAL NOT NULL,
+    client TEXT NOT NULL,
+    target TEXT,
+    worker TEXT,
+    payload TEXT NOT NULL,
+    data BLOB,
+    result TEXT,
+    error TEXT,
+    status_code INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_queue ON jobs(status, priority, created_at);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_job ON events(job_id, seq);
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    kinds TEXT NOT NULL,
+    last_seen REAL NOT NULL
+);
+"""
+
+
+@dataclass
+class BrokerJob:
+    id: str
+    kind: str
+    status: str
+    client: str
+    payload: dict
+    data: Optional[bytes] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    status_code: Optional[int] = None
+    attempts: int = 0
+    worker: Optional[str] = None
+    cancel_requested: bool = False
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL
+
+    def describe(self) -> dict:
+        """Status without payload, data or result, for GET /jobs/{id}."""
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "worker": self.worker,
+            "attempts": self.attempts,
+            "error": self.error,
+            "status_code": self.status_code,
+        }
+
+
+class Broker(abc.ABC):
+    """Interface every broker implements; all methods are safe to call from any thread or process."""
+
+    @abc.abstractmethod
+    def submit(
+        self, kind: str, payload: dict, data: Optional[bytes] = None, job_id: Optional[str] = None,
+        priority: float = 0.0, client: str = "", target: Optional[str] = None,
+    ) -> str:
+        """Queue a job; ValueError when `job_id` is already taken."""
+
+    @abc.abstractmethod
+    def claim(self, worker: str, kinds: Iterable[str], lease_s: float) -> Optional[BrokerJob]:
+        """The next queued job of one of `kinds` for this worker, now running under its lease; None if idle."""
+
+    @abc.abstractmethod
+    def renew(self, job_id: str, worker: str, lease_s: float) -> bool:
+        """Extend the lease; returns True when the API has asked for the job to be cancelled."""
+
+    @abc.abstractmethod
+    def advance(self, job_id: str, worker: str, kind: str, payload: dict, data: Optional[bytes] = None) -> None:
+        """Queue the job again as its next stage."""
+
+    @abc.abstractmethod
+    def complete(self, job_id: str, worker: str, result: dict) -> None:
+        ...
+
+    @abc.abstractmethod
+    def fail(self, job_id: str, worker: str, error: str, status_code: int = 500, cancelled: bool = False) -> None:
+        ...
+
+    @abc.abstractmethod
+    def cancel(self, job_id: str) -> None:
+        """Ask for the job to stop: a queued job is cancelled at once, a running one at its next check."""
+
+    @abc.abstractmethod
+    def get(self, job_id: str) -> Optional[BrokerJob]:
+        """The job's status, error and result for polling; its payload is empty and data None (claim() has them)."""
+
+    @abc.abstractmethod
+    def publish(self, job_id: str, event: dict) -> None:
+        ...
+
+    @abc.abstractmethod
+    def events(self, job_id: str, after: int = 0) -> List[Tuple[int, dict]]:
+        """(sequence, event) pairs published for the job after sequence `after`."""
+
+    @abc.abstractmethod
+    def heartbeat(self, worker: str, kinds: Iterable[str]) -> None:
+        ...
+
+    @abc.abstractmethod
+    def live_workers(self, within_s: float) -> Dict[str, List[str]]:
+        """Workers seen in the last `within_s` seconds, with the job kinds they take."""
+
+    @abc.abstractmethod
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        """Number of jobs by (kind, status)."""
+
+    @abc.abstractmethod
+    def prune(self, older_than_s: float) -> int:
+        """Drop finished jobs and their events older than `older_than_s`; returns how many."""
+
+
+class SQLiteBroker(Broker):
+    """Broker in one SQLite file, shared by the API and the workers of a single host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._initialized = False
+
+    @contextlib.contextmanager
+    def _connect(self, immediate: bool = False):
+        if not self._initialized:
+            self.initialize()
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            # IMMEDIATE takes the write lock up front, so two workers never claim the same job
+            connection.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+    def initialize(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                connection.execute("PRAGMA journal_mode = WAL")
+                connection.executescript(_SCHEMA)
+        finally:
+            connection.close()
+        self._initialized = True
+
+    def submit(self, kind, payload, data=None, job_id=None, priority=0.0, client="", target=None) -> str:
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        try:
+            with self._connect() as connection:
+                connection.execute(
+                    "INSERT INTO jobs (id, kind, status, priority, client, target, payload, data, created_at, updated_at)"
+                    " VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, priority, client, target, json.dumps(payload), data, now, now),
+                )
+                self._publish(connection, job_id, {"event": "queued", "kind": kind})
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Job id '{job_id}' is already taken")
+        return job_id
+
+    def claim(self, worker, kinds, lease_s) -> Optional[BrokerJob]:
+        kinds = list(kinds)
+        marks = ",".join("?" * len(kinds))
+        now = time.time()
+        with self._connect(immediate=True) as connection:
+            # Jobs whose worker stopped renewing its lease run again, up to MAX_ATTEMPTS times,
+            # unless the API has cancelled them meanwhile
+            expired = connection.execute(
+                "SELECT id, attempts, cancel_requested FROM jobs WHERE status = 'running' AND lease_until < ?", (now,)
+            ).fetchall()
+            for job_id, attempts, cancel_requested in expired:
+                if cancel_requested:
+                    connection.execute(
+                        "UPDATE jobs SET status = 'cancelled', worker = NULL, error = ?, status_code = 499, data = NULL,"
+                        " updated_at = ? WHERE id = ?",
+                        ("Request cancelled: inference worker lost", now, job_id),
+                    )
+                    self._publish(connection, job_id, {"event": "cancelled", "detail": "cancelled after its worker was lost",
+                                                       "status_code": 499})
+                    continue
+                status = "queued" if attempts < MAX_ATTEMPTS else "failed"
+                connection.execute(
+                    "UPDATE jobs SET status = ?, worker = NULL, error = ?, status_code = ?, updated_at = ? WHERE id = ?",
+                    (status, None if status == "queued" else "Inference worker lost", None if status == "queued" else 500,
+                     now, job_id),
+                )
+                self._publish(connection, job_id, {"event": "requeued" if status == "queued" else "failed",
+                                                   "detail": "Inference worker lost", "status_code": 500})
+            row = connection.execute(
+                f"SELECT id FROM jobs WHERE status = 'queued' AND kind IN ({marks})"
+                " AND (target IS NULL OR target = ?) ORDER BY priority, created_at LIMIT 1",
+                (*kinds, worker),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, lease_until = ?,"
+                " updated_at = ? WHERE id = ?",
+                (worker, now + lease_s, now, row[0]),
+            )
+            job = self._claimed(connection, row[0])
+            self._publish(connection, job.id, {"event": "started", "kind": job.kind, "worker": worker})
+            return job
+
+    def renew(self, job_id, worker, lease_s) -> bool:
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + lease_s, job_id, worker),
+            )
+            row = connection.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def advance(self, job_id, worker, kind, payload, data=None) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET kind = ?, status = 'queued', worker = NULL, target = NULL, payload = ?, data = ?,"
+                " attempts = 0, lease_until = NULL, updated_at = ? WHERE id = ? AND worker = ?",
+                (kind, json.dumps(payload), data, time.time(), job_id, worker),
+            )
+            self._publish(connection, job_id, {"event": "queued", "kind": kind})
+
+    def complete(self, job_id, worker, result) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = 'done', result = ?, data = NULL, updated_at = ? WHERE id = ? AND worker = ?",
+                (json.dumps(result), time.time(), job_id, worker),
+            )
+            self._publish(connection, job_id, {"event": "done", "result": result})
+
+    def fail(self, job_id, worker, error, status_code=500, cancelled=False) -> None:
+        status = "cancelled" if cancelled else "failed"
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, status_code = ?, data = NULL, updated_at = ?"
+                " WHERE id = ? AND worker = ?",
+                (status, error, status_code, time.time(), job_id, worker),
+            )
+            self._publish(connection, job_id, {"event": status, "detail": error, "status_code": status_code})
+
+    def cancel(self, job_id) -> None:
+        with self._connect() as connection:
+            connection.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            cancelled = connection.execute(
+                "UPDATE jobs SET status = 'cancelled', data = NULL, updated_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id),
+            ).rowcount
+            if cancelled:
+                self._publish(connection, job_id, {"event": "cancelled", "detail": "cancelled before it started"})
+
+    def get(self, job_id) -> Optional[BrokerJob]:
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT id, kind, status, client, result, error, status_code, attempts, worker, cancel_requested"
+                " FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job_id, kind, status, client, result, error, status_code, attempts, worker, cancel = row
+        return BrokerJob(
+            job_id, kind, status, client, {}, None, json.loads(result) if result else None,
+            error, status_code, attempts, worker, bool(cancel),
+        )
+
+    def publish(self, job_id, event) -> None:
+        with self._connect() as connection:
+            self._publish(connection, job_id, event)
+
+    def events(self, job_id, after=0) -> List[Tuple[int, dict]]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT seq, event FROM events WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after)
+            ).fetchall()
+        return [(seq, json.loads(event)) for seq, event in rows]
+
+    def heartbeat(self, worker, kinds) -> None:
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO workers (id, kinds, last_seen) VALUES (?, ?, ?)",
+                (worker, ",".join(kinds), time.time()),
+            )
+
+    def live_workers(self, within_s) -> Dict[str, List[str]]:
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT id, kinds FROM workers WHERE last_seen >= ?", (time.time() - within_s,)
+            ).fetchall()
+        return {worker: kinds.split(",") for worker, kinds in rows}
+
+    def counts(self) -> Dict[Tuple[str, str], int]:
+        with self._connect() as connection:
+            rows = connection.execute("SELECT kind, status, COUNT(*) FROM jobs GROUP BY kind, status").fetchall()
+        return {(kind, status): count for kind, status, count in rows}
+
+    def prune(self, older_than_s) -> int:
+        cutoff = time.time() - older_than_s
+        with self._connect() as connection:
+            old = [row[0] for row in connection.execute(
+                "SELECT id FROM jobs WHERE status IN ('done', 'failed', 'cancelled') AND updated_at < ?", (cutoff,)
+            )]
+            connection.executemany("DELETE FROM events WHERE job_id = ?", [(job_id,) for job_id in old])
+            connection.executemany("DELETE FROM jobs WHERE id = ?", [(job_id,) for job_id in old])
+            connection.execute("DELETE FROM workers WHERE last_seen < ?", (cutoff,))
+        return len(old)
+
+    @staticmethod
+    def _publish(connection, job_id: str, event: dict) -> None:
+        connection.execute(
+            "INSERT INTO events (job_id, created_at, event) VALUES (?, ?, ?)",
+            (job_id, time.time(), json.dumps(event)),
+        )
+
+    @staticmethod
+    def _claimed(connection, job_id: str) -> BrokerJob:
+        """The whole job, payload and data included, for the worker that claimed it."""
+        row = connection.execute(
+            "SELECT id, kind, status, client, payload, data, result, error, status_code, attempts, worker,"
+            " cancel_requested FROM jobs WHERE id = ?",
+            (job_id,),
+        ).fetchone()
+        job_id, kind, status, client, payload, data, result, error, status_code, attempts, worker, cancel = row
+        return BrokerJob(
+            job_id, kind, status, client, json.loads(payload), data, json.loads(result) if result else None,
+            error, status_code, attempts, worker, bool(cancel),
+        )
+
+
+BROKERS = {"sqlite": SQLiteBroker}
+
+
+def open_broker(url: str) -> Broker:
+    """Broker for a URL such as sqlite:///jobs.sqlite3 (relative) or sqlite:////var/lib/eduhive/jobs.sqlite3."""
+    scheme, separator, location = url.partition("://")
+    if not separator or scheme not in BROKERS:
+        raise ValueError(f"Unsupported broker URL '{url}'. Schemes: {', '.join(s + '://' for s in BROKERS)}")
+    # sqlite:///relative/path and sqlite:////absolute/path, as in SQLAlchemy URLs
+    return BROKERS[scheme](location[1:] if location.startswith("/") else location)
@@ -0,0 +1,165 @@
+"""
+config.py - Runtime settings read from the environment.
+
+Every value has a safe default so the service starts without a .env file.
+"""
+
+import os
+from typing import List
+
+
+def _env_list(name: str, default: str = "") -> List[str]:
+    return [item.strip() for item in os.getenv(name, default).split(",") if item.strip()]
+
+
+# -----------------------------------------------------------------------------
+# PROFILING
+# -----------------------------------------------------------------------------
+# Per-request profiling is only honoured for client hosts on PROFILE_ALLOWLIST
+# or requests whose X-Profile-Token header is one of PROFILE_TOKENS; with both
+# empty the feature is disabled entirely.
+PROFILE_ALLOWLIST = _env_list("PROFILE_ALLOWLIST")
+PROFILE_TOKENS = _env_list("PROFILE_TOKENS")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))
+
+
+# -----------------------------------------------------------------------------
+# QUESTION GENERATION
+# -----------------------------------------------------------------------------
+# Distinct questions collected per requested question before a type stops
+# generating. 1.0 stops at the target; larger values keep more candidates to
+# shuffle from at the cost of extra model calls.
+QUESTION_OVERGENERATION = float(os.getenv("QUESTION_OVERGENERATION", "1.0"))
+
+
+# -----------------------------------------------------------------------------
+# MODEL ARTIFACTS
+# -----------------------------------------------------------------------------
+# Filled by `python -m app.artifacts prefetch`. OFFLINE_MODELS: "auto" runs
+# offline when the cache verifies, "1" refuses to start without it, "0" never
+# goes offline. MODEL_VERIFY: "size" (fast, default), "sha256" or "off".
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "model_cache")
+OFFLINE_MODELS = os.getenv("OFFLINE_MODELS", "auto")
+MODEL_VERIFY = os.getenv("MODEL_VERIFY", "size")
+# Memory-mapped distractor index built from sense2vec by `python -m app.distractors build`.
+# When present, MCQ options come from it and Questgen's in-RAM sense2vec table is dropped.
+DISTRACTOR_INDEX_DIR = os.getenv("DISTRACTOR_INDEX_DIR", os.path.join(MODEL_CACHE_DIR, "distractors"))
+
+
+# -----------------------------------------------------------------------------
+# STARTUP
+# -----------------------------------------------------------------------------
+# Load the Questgen models in a background thread as soon as the server is up.
+# With 0 they load on the first generation request instead.
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "1").lower() not in ("0", "false", "no")
+
+
+# -----------------------------------------------------------------------------
+# CPU TOPOLOGY
+# -----------------------------------------------------------------------------
+# Worker processes and per-worker thread counts. For the thread counts "auto"
+# divides the CPUs the container may use (affinity and cgroup quota) evenly
+# between workers; WEB_CONCURRENCY=auto runs one worker per 4 of those CPUs
+# (each worker loads its own models, so check memory before using it).
+# `python -m benchmarks.topology` measures the best split for a machine.
+WORKERS = os.getenv("WEB_CONCURRENCY", "1")
+TORCH_THREADS = os.getenv("TORCH_THREADS", "auto")
+CLEANER_WORKERS = os.getenv("CLEANER_WORKERS", "auto")
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+
+
+# -----------------------------------------------------------------------------
+# DECODING
+# -----------------------------------------------------------------------------
+# Tier used when a request does not pick one: fast, balanced or thorough
+# (thorough keeps the models' original decoding settings).
+DEFAULT_DECODING_TIER = os.getenv("DEFAULT_DECODING_TIER", "thorough")
+
+
+# -----------------------------------------------------------------------------
+# REQUEST COALESCING
+# -----------------------------------------------------------------------------
+# Identical generation requests (same text and parameters) that arrive while
+# one is still running share its result instead of running the pipeline again.
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "1").lower() not in ("0", "false", "no")
+
+
+# -----------------------------------------------------------------------------
+# QUESTION BANK
+# -----------------------------------------------------------------------------
+# SQLite file written by `python -m app.question_bank build` and sampled by
+# the /question-bank endpoints.
+QUESTION_BANK_PATH = os.getenv("QUESTION_BANK_PATH", "question_bank.sqlite3")
+
+
+# -----------------------------------------------------------------------------
+# DOCUMENT REGISTRY
+# -----------------------------------------------------------------------------
+# Uploads processed once by POST /documents/ and reused by document_id.
+# Documents unused for DOCUMENT_RETENTION_DAYS are pruned (0 keeps them all).
+DOCUMENT_STORE_PATH = os.getenv("DOCUMENT_STORE_PATH", "documents.sqlite3")
+DOCUMENT_RETENTION_DAYS = float(os.getenv("DOCUMENT_RETENTION_DAYS", "30"))
+
+
+# -----------------------------------------------------------------------------
+# GENERATION SESSIONS
+# -----------------------------------------------------------------------------
+# "Generate more" keeps each document's sentences, cursor and unserved
+# questions in memory for this long after the last request (0 disables
+# sessions), for at most MAX_GENERATION_SESSIONS documents per worker.
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "1800"))
+MAX_GENERATION_SESSIONS = int(os.getenv("MAX_GENERATION_SESSIONS", "200"))
+
+
+# -----------------------------------------------------------------------------
+# MODEL MEMORY
+# -----------------------------------------------------------------------------
+# Upper bound on the memory of loaded models (0 = unlimited). Least recently
+# used idle models are unloaded to stay under it and reload on next use.
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+# Unload models that have not been used for this many seconds (0 = never).
+MODEL_IDLE_SECONDS = float(os.getenv("MODEL_IDLE_SECONDS", "0"))
+
+
+# -----------------------------------------------------------------------------
+# PIPELINE PLANNER
+# -----------------------------------------------------------------------------
+# Latency the planner aims for when choosing, per uploaded document, between
+# generating from the full text, sampled sections, extracted sentences or a
+# summary. Requests can override it with latency_target_s.
+PIPELINE_LATENCY_TARGET_S = float(os.getenv("PIPELINE_LATENCY_TARGET_S", "60"))
+
+
+# -----------------------------------------------------------------------------
+# SCHEDULING
+# -----------------------------------------------------------------------------
+# Generation jobs share the models in weighted fair order per client (the
+# X-Client-ID header, else the client address), shortest estimated job first.
+# SCHEDULER_WEIGHTS gives clients a larger or smaller share: "client=weight,...".
+SCHEDULER_WEIGHTS = {
+    client.strip(): float(weight)
+    for client, _, weight in (item.partition("=") for item in _env_list("SCHEDULER_WEIGHTS"))
+    if weight
+}
+
+# -----------------------------------------------------------------------------
+# BROKER
+# -----------------------------------------------------------------------------
+# Empty: each API process loads the models and generates itself. Set, e.g.
+# "sqlite:///jobs.sqlite3", the API only enqueues jobs there and waits for the
+# results, and `python -m app.worker run` processes do the inference.
+BROKER_URL = os.getenv("BROKER_URL", "")
+# How often the API checks a job and a worker checks for new jobs
+BROKER_POLL_SECONDS = float(os.getenv("BROKER_POLL_SECONDS", "0.2"))
+# A request fails with 504 when its job has not finished in this time
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "900"))
+# Finished jobs and their events are kept this long for GET /jobs/{id}
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+# Job kinds a worker takes by default, and how many it runs at once
+WORKER_KINDS = _env_list("WORKER_KINDS", "prepare,generate,generate_more,batch")
+WORKER_THREADS = int(os.getenv("WORKER_THREADS", "1"))
+# A worker renews its running jobs' leases; a job whose lease runs out is
+# queued again, and a worker not seen for this long counts as gone
+WORKER_LEASE_SECONDS = float(os.getenv("WORKER_LEASE_SECONDS", "30"))
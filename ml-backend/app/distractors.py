@@ -0,0 +1,342 @@
+"""
+distractors.py - Memory-mapped nearest-neighbour index for MCQ distractors.
+
+Questgen picks distractors with sense2vec most_similar(), one answer at a
+time, over a vector table that every worker process loads into RAM. It then
+filters the neighbours with per-pair Python Levenshtein loops. This module
+replaces both steps:
+
+- `build` converts the sense2vec table once into plain .npy files: L2-normalised
+  float16 vectors (one row per phrase, its most frequent sense), the phrase
+  of each row, and a sorted phrase -> row lookup. Every file is opened with
+  mmap, so all workers share one copy through the page cache.
+- `DistractorIndex.distractors()` serves every answer of a request in one
+  call. One blockwise matrix product gives the top-k neighbours of all
+  answers. The normalised Levenshtein distances of all candidate pairs are
+  then computed in one vectorized pass, and near-spellings of the answer and
+  of each other are dropped.
+
+`Sense2VecView` puts the index in place of Questgen's sense2vec object, so
+Questgen's keyword check and option step run unchanged on top of it. The
+generator primes it with every keyword of a request before decoding, so all
+distractors come from one distractors() call.
+
+Usage (from ml-backend/):
+    python -m app.distractors build                   # model_cache/s2v_old -> model_cache/distractors
+    python -m app.distractors query mitochondria photosynthesis
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence
+
+from . import config
+
+NEIGHBOURS = 20  # candidates per answer before filtering, as Questgen's most_similar(n=20)
+DISTRACTORS = 10  # kept per answer, as Questgen's filter_phrases(..., 10)
+MIN_DISTANCE = 0.7  # normalised Levenshtein distance below which two phrases count as the same
+BLOCK_ROWS = 65536  # vectors multiplied per block, bounding the temporary score matrix
+MAX_PHRASE_BYTES = 64
+
+_FILES = ("vectors.npy", "phrases.npy", "lookup.npy", "lookup_rows.npy", "meta.json")
+
+
+def _normalise(phrase: str) -> str:
+    return phrase.strip().lower().replace(" ", "_")
+
+
+def _display(phrase: str) -> str:
+    return phrase.replace("_", " ").title()
+
+
+# -----------------------------------------------------------------------------
+# STRING DISTANCE
+# -----------------------------------------------------------------------------
+def normalized_levenshtein(left: Sequence[str], right: Sequence[str]):
+    """
+    Element-wise normalised Levenshtein distance of left[i] and right[i], all
+    pairs at once. Each DP row is computed for every pair together: the
+    insertion chain dp[i][j-1] + 1 becomes a running minimum
+    (np.minimum.accumulate) over the row.
+    """
+    import numpy as np
+
+    pairs = len(left)
+    if pairs == 0:
+        return np.zeros(0)
+    left_lengths = np.array([len(s) for s in left])
+    right_lengths = np.array([len(s) for s in right])
+    width_left, width_right = max(1, left_lengths.max()), max(1, right_lengths.max())
+    a = np.full((pairs, width_left), -1, dtype=np.int32)
+    b = np.full((pairs, width_right), -2, dtype=np.int32)
+    for index, (x, y) in enumerate(zip(left, right)):
+        a[index, :len(x)] = [ord(c) for c in x]
+        b[index, :len(y)] = [ord(c) for c in y]
+
+    columns = np.arange(width_right + 1)
+    previous = np.tile(columns, (pairs, 1))
+    distance = right_lengths.astype(np.int64)  # pairs with an empty left string
+    for i in range(1, width_left + 1):
+        candidate = np.empty_like(previous)
+        candidate[:, 0] = i
+        cost = (a[:, i - 1:i] != b).astype(np.int64)
+        candidate[:, 1:] = np.minimum(previous[:, 1:] + 1, previous[:, :-1] + cost)
+        row = np.minimum.accumulate(candidate - columns, axis=1) + columns
+        finished = left_lengths == i
+        distance[finished] = row[finished, right_lengths[finished]]
+        previous = row
+    return distance / np.maximum(1, np.maximum(left_lengths, right_lengths))
+
+
+# -----------------------------------------------------------------------------
+# INDEX
+# -----------------------------------------------------------------------------
+class DistractorIndex:
+    """Read-only, memory-mapped phrase vectors with batched top-k neighbour search."""
+
+    def __init__(self, directory: str):
+        import numpy as np
+
+        self.directory = directory
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.phrases = np.load(os.path.join(directory, "phrases.npy"), mmap_mode="r")
+        self.lookup = np.load(os.path.join(directory, "lookup.npy"), mmap_mode="r")
+        self.lookup_rows = np.load(os.path.join(directory, "lookup_rows.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as handle:
+            self.meta = json.load(handle)
+
+    @staticmethod
+    def exists(directory: str) -> bool:
+        return all(os.path.isfile(os.path.join(directory, name)) for name in _FILES)
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    def row(self, phrase: str) -> Optional[int]:
+        """Row of the phrase (case-insensitive, spaces or underscores), or None."""
+        import numpy as np
+
+        key = _normalise(phrase).encode("utf-8")
+        if not key or len(key) > MAX_PHRASE_BYTES:
+            return None
+        position = int(np.searchsorted(self.lookup, key))
+        if position < len(self.lookup) and self.lookup[position] == key:
+            return int(self.lookup_rows[position])
+        return None
+
+    def neighbours(self, rows: List[int], k: int = NEIGHBOURS):
+        """(rows, scores) of the k most similar vectors for each query row, best first, excluding itself."""
+        import numpy as np
+
+        queries = np.asarray(self.vectors[rows], dtype=np.float32)
+        best_scores = np.full((len(rows), k), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(rows), k), dtype=np.int64)
+        own = np.asarray(rows)[:, None]
+        for start in range(0, len(self.vectors), BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + BLOCK_ROWS], dtype=np.float32)
+            scores = queries @ block.T
+            if scores.shape[1] > k:
+                top = np.argpartition(scores, -k, axis=1)[:, -k:]
+            else:
+                top = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+            top_scores = np.take_along_axis(scores, top, axis=1)
+            top_rows = top + start
+            top_scores[top_rows == own] = -np.inf
+
+            merged_scores = np.concatenate([best_scores, top_scores], axis=1)
+            merged_rows = np.concatenate([best_rows, top_rows], axis=1)
+            keep = np.argpartition(merged_scores, -k, axis=1)[:, -k:]
+            best_scores = np.take_along_axis(merged_scores, keep, axis=1)
+            best_rows = np.take_along_axis(merged_rows, keep, axis=1)
+
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def distractors(self, answers: List[str], count: int = DISTRACTORS) -> Dict[str, List[str]]:
+        """Up to `count` distractors per answer, for all answers in one pass; unknown answers get []."""
+        import numpy as np
+
+        result = {answer: [] for answer in answers}
+        known = [(answer, row) for answer in result for row in [self.row(answer)] if row is not None]
+        if not known:
+            return result
+        rows, scores = self.neighbours([row for _, row in known])
+
+        # Candidate phrases per answer, then every (earlier phrase, later phrase) pair in one distance call
+        candidates = []
+        for (answer, _), neighbour_rows, neighbour_scores in zip(known, rows, scores):
+            phrases = [answer.lower()]
+            for row, score in zip(neighbour_rows, neighbour_scores):
+                phrase = self.phrases[row].decode("utf-8").replace("_", " ").lower()
+                if np.isfinite(score) and phrase not in phrases:
+                    phrases.append(phrase)
+            candidates.append(phrases)
+        left, right = [], []
+        for phrases in candidates:
+            for later in range(1, len(phrases)):
+                for earlier in range(later):
+                    left.append(phrases[earlier])
+                    right.append(phrases[later])
+        distances = iter(normalized_levenshtein(left, right))
+
+        for (answer, _), phrases in zip(known, candidates):
+            kept = [0]  # the answer itself
+            for later in range(1, len(phrases)):
+                far = [next(distances) >= MIN_DISTANCE for _ in range(later)]
+                if all(far[index] for index in kept) and len(kept) <= count:
+                    kept.append(later)
+            result[answer] = [_display(phrases[index]) for index in kept[1:]]
+        return result
+
+
+class Sense2VecView:
+    """
+    Stand-in for Questgen's sense2vec object, backed by the index. prime()
+    computes the distractors of every answer about to be decoded in one
+    batch; most_similar() then answers from that cache, in sense2vec's
+    (key, score) format, and falls back to a single-answer lookup on a miss.
+    """
+
+    CACHE_SIZE = 4096
+
+    def __init__(self, index: DistractorIndex):
+        self.index = index
+        self._cache: "OrderedDict[str, List[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def prime(self, answers: List[str]) -> None:
+        wanted = [a for a in dict.fromkeys(answers) if _normalise(a) not in self._cache]
+        if wanted:
+            self._remember(self.index.distractors(wanted))
+
+    def _remember(self, found: Dict[str, List[str]]) -> None:
+        with self._lock:
+            for answer, options in found.items():
+                self._cache[_normalise(answer)] = options
+                self._cache.move_to_end(_normalise(answer))
+            while len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def get_best_sense(self, word: str, *args, **kwargs) -> Optional[str]:
+        return word if self.index.row(word) is not None else None
+
+    def most_similar(self, sense: str, n: int = NEIGHBOURS, **kwargs) -> list:
+        key = _normalise(sense.split("|")[0])
+        with self._lock:
+            options = self._cache.get(key)
+        if options is None:
+            self.prime([key])
+            options = self._cache.get(key, [])
+        # Questgen strips the sense, replaces underscores and title-cases again
+        return [(option.replace(" ", "_") + "|NOUN", 1.0) for option in options[:n]]
+
+
+@functools.lru_cache(maxsize=1)
+def load_index(directory: Optional[str] = None) -> Optional[DistractorIndex]:
+    """The index built under DISTRACTOR_INDEX_DIR, or None when it has not been built."""
+    directory = directory or config.DISTRACTOR_INDEX_DIR
+    if not DistractorIndex.exists(directory):
+        return None
+    index = DistractorIndex(directory)
+    print(f"🧲 Distractor index: {len(index):,} phrases memory-mapped from {directory}")
+    return index
+
+
+# -----------------------------------------------------------------------------
+# BUILD
+# -----------------------------------------------------------------------------
+def write_index(directory: str, phrases: List[str], vectors, frequencies: List[int]) -> int:
+    """
+    Write an index from parallel phrase / vector / frequency lists. Phrases
+    that differ only in case or sense keep their most frequent entry. Returns
+    the number of rows written.
+    """
+    import numpy as np
+
+    best: Dict[str, int] = {}
+    for position, (phrase, frequency) in enumerate(zip(phrases, frequencies)):
+        key = _normalise(phrase)
+        if not key or len(key.encode("utf-8")) > MAX_PHRASE_BYTES:
+            continue
+        if key not in best or frequency > frequencies[best[key]]:
+            best[key] = position
+    # Most frequent first, so the blocks scanned first hold the common phrases
+    order = sorted(best.values(), key=lambda position: -frequencies[position])
+
+    os.makedirs(directory, exist_ok=True)
+    dimensions = len(vectors[0]) if order else 0
+    matrix = np.lib.format.open_memmap(
+        os.path.join(directory, "vectors.npy"), mode="w+", dtype=np.float16, shape=(len(order), dimensions)
+    )
+    for start in range(0, len(order), BLOCK_ROWS):
+        block = np.asarray([vectors[position] for position in order[start:start + BLOCK_ROWS]], dtype=np.float32)
+        block /= np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+        matrix[start:start + len(block)] = block
+    matrix.flush()
+    del matrix
+
+    row_phrases = [phrases[position].split("|")[0].encode("utf-8") for position in order]
+    np.save(os.path.join(directory, "phrases.npy"), np.array(row_phrases, dtype=f"S{MAX_PHRASE_BYTES}"))
+    keys = sorted((_normalise(phrases[position]).encode("utf-8"), row) for row, position in enumerate(order))
+    np.save(os.path.join(directory, "lookup.npy"), np.array([key for key, _ in keys], dtype=f"S{MAX_PHRASE_BYTES}"))
+    np.save(os.path.join(directory, "lookup_rows.npy"), np.array([row for _, row in keys], dtype=np.int32))
+    with open(os.path.join(directory, "meta.json"), "w", encoding="utf-8") as handle:
+        json.dump({"rows": len(order), "dimensions": dimensions, "built_at": time.time()}, handle)
+    return len(order)
+
+
+def build_from_sense2vec(source: str, directory: str, limit: int = 0) -> int:
+    """Convert a sense2vec directory (Questgen's s2v_old) into an index."""
+    from sense2vec import Sense2Vec
+
+    s2v = Sense2Vec().from_disk(source)
+    phrases, vectors, frequencies = [], [], []
+    for key, vector in s2v.items():
+        phrases.append(key.split("|")[0])
+        vectors.append(vector)
+        frequencies.append(s2v.get_freq(key) or 0)
+    if limit:
+        keep = sorted(range(len(phrases)), key=lambda i: -frequencies[i])[:limit]
+        phrases, vectors, frequencies = ([values[i] for i in keep] for values in (phrases, vectors, frequencies))
+    return write_index(directory, phrases, vectors, frequencies)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("build", "query"))
+    parser.add_argument("answers", nargs="*", help="query: answers to find distractors for")
+    parser.add_argument("--source", default=os.path.join(config.MODEL_CACHE_DIR, "s2v_old"),
+                        help="build: sense2vec directory")
+    parser.add_argument("--index", default=config.DISTRACTOR_INDEX_DIR, help="Index directory")
+    parser.add_argument("--limit", type=int, default=0, help="build: keep only the most frequent N keys")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        started = time.perf_counter()
+        rows = build_from_sense2vec(args.source, args.index, args.limit)
+        print(f"Built {rows:,} phrases into {args.index} in {time.perf_counter() - started:.1f}s")
+        return 0
+
+    if not DistractorIndex.exists(args.index):
+        print(f"No distractor index at {args.index}; run `python -m app.distractors build`")
+        return 1
+    index = DistractorIndex(args.index)
+    started = time.perf_counter()
+    found = index.distractors(args.answers)
+    elapsed = time.perf_counter() - started
+    for answer, options in found.items():
+        print(f"{answer}: {', '.join(options) or '(not in index)'}")
+    print(f"{len(args.answers)} answer(s) in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""
+document_registry.py - Uploaded documents, processed once and kept by id.
+
+POST /documents/ extracts, cleans and segments a file once and stores the
+result here under a document_id. The id is derived from the file's content,
+so uploading the same file again returns the existing entry without
+processing it again. Generation requests pass the id instead of the file, so
+changing the question count, mix or decoding tier skips upload, parse and
+clean.
+
+Each row keeps the extracted text (needed again only when the planner
+chooses to summarize), the cleaned text with its sentence spans, the
+cleaning diagnostics and the parser metadata. Entries unused for
+DOCUMENT_RETENTION_DAYS are pruned when new documents are registered.
+
+Usage:
+    registry = DocumentRegistry("documents.sqlite3")
+    registry.put(document_id, filename, content_type, metadata, text, cleaned, diagnostics)
+    stored = registry.get(document_id)      # None when unknown or pruned
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Optional
+
+from .utils.segmentation import SegmentedText
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    raw_text TEXT NOT NULL,
+    cleaned_text TEXT NOT NULL,
+    spans BLOB NOT NULL,
+    diagnostics TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS documents_by_last_use ON documents(last_used_at);
+"""
+
+
+def document_id_for(content: bytes) -> str:
+    """Content-derived id: the same bytes always map to the same document."""
+    return hashlib.sha256(content).hexdigest()[:32]
+
+
+def _pack_spans(document: SegmentedText) -> bytes:
+    return array("I", (offset for span in document.spans for offset in span)).tobytes()
+
+
+def _unpack_spans(blob: bytes) -> list:
+    offsets = array("I")
+    offsets.frombytes(blob)
+    return list(zip(offsets[0::2], offsets[1::2]))
+
+
+@dataclass
+class StoredDocument:
+    document_id: str
+    filename: str
+    content_type: str
+    metadata: dict
+    raw_text: str
+    cleaned: SegmentedText
+    diagnostics: dict
+    created_at: float
+
+    def describe(self) -> dict:
+        return {
+            "document_id": self.document_id,
+            "filename": self.filename,
+            "content_type": self.content_type,
+            "page_count": self.metadata.get("page_count"),
+            "word_count": self.cleaned.word_count(),
+            "sentence_count": len(self.cleaned),
+            "created_at": self.created_at,
+        }
+
+
+class DocumentRegistry:
+    """SQLite store of processed uploads; one connection per call, so safe across threads."""
+
+    def __init__(self, path: str, retention_days: float = 0):
+        self.path = path
+        self.retention_days = retention_days
+        self._initialized = False
+
+    @contextlib.contextmanager
+    def _connect(self):
+        if not self._initialized:
+            self.initialize()
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def initialize(self) -> None:
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        try:
+            with connection:
+                connection.execute("PRAGMA journal_mode = WAL")
+                connection.executescript(_SCHEMA)
+        finally:
+            connection.close()
+        self._initialized = True
+
+    def put(
+        self,
+        document_id: str,
+        filename: str,
+        content_type: str,
+        metadata: dict,
+        raw_text: str,
+        cleaned: SegmentedText,
+        diagnostics: dict,
+    ) -> StoredDocument:
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO documents (document_id, filename, content_type, metadata, raw_text,"
+                " cleaned_text, spans, diagnostics, created_at, last_used_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (document_id, filename, content_type, json.dumps(metadata), raw_text, cleaned.text,
+                 _pack_spans(cleaned), json.dumps(diagnostics), now, now),
+            )
+        self.prune()
+        return StoredDocument(document_id, filename, content_type, metadata, raw_text, cleaned, diagnostics, now)
+
+    def get(self, document_id: str) -> Optional[StoredDocument]:
+        """The stored document, marking it used; None when unknown."""
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT filename, content_type, metadata, raw_text, cleaned_text, spans, diagnostics, created_at"
+                " FROM documents WHERE document_id = ?",
+                (document_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE documents SET last_used_at = ? WHERE document_id = ?", (time.time(), document_id))
+        filename, content_type, metadata, raw_text, cleaned_text, spans, diagnostics, created_at = row
+        return StoredDocument(
+            document_id, filename, content_type, json.loads(metadata), raw_text,
+            SegmentedText(cleaned_text, _unpack_spans(spans)), json.loads(diagnostics), created_at,
+        )
+
+    def delete(self, document_id: str) -> bool:
+        with self._connect() as connection:
+            return connection.execute("DELETE FROM documents WHERE document_id = ?", (document_id,)).rowcount > 0
+
+    def prune(self) -> int:
+        """Drop documents unused for retention_days (0 keeps everything); returns how many were dropped."""
+        if not self.retention_days:
+            return 0
+        cutoff = time.time() - self.retention_days * 86400
+        with self._connect() as connection:
+            removed = connection.execute("DELETE FROM documents WHERE last_used_at < ?", (cutoff,)).rowcount
+        if removed:
+            print(f"🧹 Pruned {removed} document(s) unused for {self.retention_days:g} days")
+        return removed
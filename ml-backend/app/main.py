@@ -1,13 +1,69 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+import asyncio
+import contextvars
+import functools
 import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from io import BytesIO
+from typing import List, Optional
+
+from . import config
+from .artifacts import prepare_runtime
+from .broker import TERMINAL, open_broker
+from .document_registry import DocumentRegistry, document_id_for
+from .question_bank import QUESTION_TYPES, QuestionBank
+from .utils.topology import apply_environment
+
+# Point transformers, NLTK and Questgen at the prefetched artifacts before any of them is imported
+prepare_runtime()
+# Same for the OpenMP/BLAS thread counts, which are read when torch loads
+apply_environment()
 
 # Import services and utilities
 from .services.pdf_text_cleaner import PDFTextCleaner, ProcessingMode
-from .services.questgen_service import questgen_instance
-from .utils.file_parser import FileParser  # Updated import
-from .models import GeneratedQuestionsResponse, TextGenerationRequest
+from .services.model_manager import model_manager
+from .services.planner import generation_cost, job_cost, order_sentences, summarize_cost, text_cost
+from .services.questgen_service import (
+    GenerationSession, deduplicate_questions, get_questgen, questgen_loaded, sentence_window
+)
+from .utils.cancellation import CancelToken, RequestCancelled, cancel_on_disconnect
+from .utils.coalescing import SingleFlight, request_key, shuffled_questions
+from .utils.decoding import decoding_tier, resolve_tier
+from .utils.file_parser import ARCHIVE_TYPES, FileParser  # Updated import
+from .utils.metrics import (
+    COALESCED_REQUESTS,
+    REQUESTS_IN_FLIGHT,
+    STARTUP_DURATION,
+    Gauge,
+    process_uptime_seconds,
+    registry as metrics_registry,
+    stage_timer,
+)
+from .utils.profiling import ProfileSession, RequestProfiler, is_valid_request_id
+from .utils.scheduling import FairScheduler
+from .utils.segmentation import SegmentedText
+from .utils.sessions import SessionStore
+from .models import (
+    BatchGeneratedQuestionsResponse,
+    DocumentGenerationRequest,
+    DocumentInfo,
+    DocumentQuestions,
+    GenerateMoreRequest,
+    GeneratedQuestionsResponse,
+    QuestionBankDocument,
+    QuestionBankSample,
+    TextGenerationRequest,
+)
 
 # Initialize services
 app = FastAPI(title="EduHive Questgen AI Backend")
@@ -20,6 +76,34 @@ pdf_cleaner = PDFTextCleaner({
     "sentence_chunking": True
 })
 
+profiler = RequestProfiler(
+    config.PROFILE_DIR, config.PROFILE_ALLOWLIST, config.PROFILE_SAMPLE_INTERVAL, config.PROFILE_TOKENS
+)
+inflight = SingleFlight()  # Identical concurrent generation requests share one pipeline run
+# One generate call at a time on the shared Questgen models, in fair order per client, short jobs first
+scheduler = FairScheduler(config.SCHEDULER_WEIGHTS)
+question_bank = QuestionBank(config.QUESTION_BANK_PATH)
+documents = DocumentRegistry(config.DOCUMENT_STORE_PATH, config.DOCUMENT_RETENTION_DAYS)
+sessions = SessionStore(config.SESSION_TTL_SECONDS, config.MAX_GENERATION_SESSIONS)
+# With BROKER_URL set this process loads no models: requests become jobs for `python -m app.worker`
+broker = open_broker(config.BROKER_URL) if config.BROKER_URL else None
+if broker is not None:
+    metrics_registry.register(Gauge(
+        "eduhive_broker_jobs", "Jobs in the broker by kind and status.", ["kind", "status"], collect=broker.counts
+    ))
+# Parses the documents of a batch in parallel
+BATCH_PARSE_WORKERS = 8
+# How long GET /jobs/{id}/events waits for a job that has not been submitted yet
+EVENT_STREAM_WAIT_SECONDS = 30
+# How often a generate-more request checks whether its session is free again
+SESSION_LOCK_POLL_SECONDS = 0.05
+
+def _seconds_since_start() -> float:
+    uptime = process_uptime_seconds()
+    return uptime if uptime is not None else time.perf_counter() - _IMPORT_STARTED
+
+STARTUP_DURATION.set(_seconds_since_start(), phase="app_import")
+
 # CORS configuration
 origins = ["http://localhost:3000"]
 app.add_middleware(
@@ -30,74 +114,333 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _load_models():
+    """Load the Questgen models in the background once the server is up"""
+    started = time.perf_counter()
+    try:
+        get_questgen()
+    except Exception as e:
+        print(f"💥 Model warm-up failed, retrying on first request: {e}")
+        return
+    STARTUP_DURATION.set(time.perf_counter() - started, phase="models")
+    STARTUP_DURATION.set(_seconds_since_start(), phase="ready")
+    print(f"✅ Models ready {_seconds_since_start():.1f}s after process start")
+
+@app.on_event("startup")
+async def start_up():
+    """Record time-to-bind and start model loading without holding up the port bind"""
+    # uvicorn binds its socket right after the startup hooks return, so keep this cheap
+    bind = _seconds_since_start()
+    STARTUP_DURATION.set(bind, phase="bind")
+    print(f"🚀 Serving {bind:.1f}s after process start")
+    if config.PRELOAD_MODELS and broker is None:
+        threading.Thread(target=_load_models, name="model-warmup", daemon=True).start()
+    model_manager.start_idle_sweeper()
+
+current_request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+class RequestTracking:
+    """
+    Assign request and client ids and keep the in-flight request gauge up to date.
+    Plain ASGI rather than @app.middleware("http"): Starlette's BaseHTTPMiddleware
+    hides client disconnects from the endpoints, and cancellation relies on them.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        request_id = request.headers.get("x-request-id")
+        if not is_valid_request_id(request_id):
+            request_id = uuid.uuid4().hex
+        request.state.request_id = request_id
+        current_request_id.set(request_id)
+        # The scheduler's fair share is per client: an explicit id, else the address
+        request.state.client_id = request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+
+app.add_middleware(RequestTracking)
+
 async def process_and_generate(
     context: str,
     total_questions: int,
     distribution: dict,
-    file_metadata: dict = None
+    file_metadata: dict = None,
+    tier: Optional[str] = None,
+    coalesce: bool = True,
+    cleaned: tuple = None,
+    client: str = "unknown",
+    cancel_token: Optional[CancelToken] = None,
+    profile: Optional[ProfileSession] = None
 ) -> GeneratedQuestionsResponse:
+    """
+    Run the pipeline, or attach to an identical one that is already running.
+    Callers that share a run get their own shuffled copy of its questions.
+    cleaned: (SegmentedText, diagnostics) of a registered document, to skip cleaning.
+    cancel_token: stops the run once cancelled (a shared run: once every caller's is).
+    profile: records the run in this request's profile (pass coalesce=False with it).
+    In broker mode the run is a "generate" job on an inference worker.
+    """
+    share = coalesce and config.COALESCE_REQUESTS
+    if broker is not None:
+        job = {
+            "context": context, "total_questions": total_questions, "distribution": distribution,
+            "file_metadata": file_metadata, "tier": tier, "cleaned": _pack_cleaned(cleaned),
+        }
+        cost = text_cost(context, total_questions, (file_metadata or {}).get('processing_plan'))
+        run = lambda run_token: _dispatch("generate", job, run_token, client, cost)
+    else:
+        # Waits for the background warm-up (off the event loop) if it is still running
+        questgen = await run_in_threadpool(get_questgen)
+        args = (questgen, context, total_questions, distribution, file_metadata, tier, cleaned, client)
+        # Work in the threadpool, waits for the models on the event loop, so a queue holds no threads
+        run = lambda run_token: _run_pipeline_scheduled(run_token, profile, *args)
+
+    key = request_key(context, total_questions, distribution, file_metadata, resolve_tier(tier).name)
+    return await _attach(key if share else None, run, cancel_token)
+
+async def _attach(key: Optional[str], run, cancel_token: Optional[CancelToken]) -> GeneratedQuestionsResponse:
+    """Start run(token), or share an identical in-flight one for the same key (None: never share)."""
+    if key is None:
+        return GeneratedQuestionsResponse(**await run(cancel_token or CancelToken()))
+    # Coalesced runs leave the event loop free, so identical requests can attach while one runs
+    payload, shared = await inflight.run(key, run, cancel_token)
+    if shared:
+        COALESCED_REQUESTS.inc()
+        print("Attached to an identical in-flight request")
+        # The session belongs to the caller that ran the pipeline; two callers continuing it would interleave
+        payload = {**payload, 'questions': shuffled_questions(payload['questions']), 'session_id': None}
+    return GeneratedQuestionsResponse(**payload)
+
+async def _dispatch(
+    kind: str,
+    payload: dict,
+    token: CancelToken,
+    client: str,
+    cost: float,
+    data: Optional[bytes] = None,
+    target: Optional[str] = None
+) -> dict:
+    """
+    Broker mode: queue a job for the inference workers and wait for its result.
+    The job is prioritized by its fair-queuing finish tag, so workers take jobs
+    in the order this process's scheduler would run them; cancelling the token
+    cancels the job. The worker's HTTP errors are raised here unchanged.
+    """
+    tag = scheduler.tag(client, cost)
+    submit = functools.partial(broker.submit, kind, payload, data, priority=tag.finish, client=client, target=target)
+    try:
+        # The request id doubles as job id, so clients can follow GET /jobs/{X-Request-ID}/events
+        job_id = await run_in_threadpool(submit, job_id=current_request_id.get())
+    except ValueError:
+        job_id = await run_in_threadpool(submit)
+    # The callback may run on the event loop (client disconnect); keep the SQLite write off it
+    loop = asyncio.get_running_loop()
+    token.add_callback(lambda: loop.call_soon_threadsafe(loop.run_in_executor, None, broker.cancel, job_id))
+
+    deadline = time.monotonic() + config.JOB_TIMEOUT_SECONDS
+    started = False
+    while True:
+        # The worker stops at its next check; the request ends now
+        if token.cancelled:
+            token.raise_if_cancelled("worker" if started else "queue")
+        job = await run_in_threadpool(broker.get, job_id)
+        if job.status != "queued" and not started:
+            scheduler.started(tag)
+            started = True
+        if job.finished:
+            break
+        if time.monotonic() > deadline:
+            await run_in_threadpool(broker.cancel, job_id)
+            raise HTTPException(status_code=504, detail="Timed out waiting for an inference worker")
+        await asyncio.sleep(config.BROKER_POLL_SECONDS)
+
+    if job.status == "done":
+        return job.result
+    raise HTTPException(status_code=job.status_code or 500, detail=job.error or "Inference job failed")
+
+async def _scheduled(client: str, token: CancelToken, cost: float, func, *args):
+    """
+    Wait on the event loop for the scheduler to admit a job, then run
+    func(*args, schedule) in the threadpool. schedule(cost) enters the admitted
+    job, like functools.partial(scheduler.run, client) would after waiting in the thread.
+    """
+    job = await scheduler.admit(client, cost, token)
+    try:
+        return await run_in_threadpool(func, *args, functools.partial(scheduler.run, client, job=job))
+    finally:
+        scheduler.release(job)
+
+def _pack_cleaned(cleaned: Optional[tuple]) -> Optional[dict]:
+    """(SegmentedText, diagnostics) as JSON for a job payload."""
+    if cleaned is None:
+        return None
+    document, diagnostics = cleaned
+    return {"text": document.text, "spans": document.spans, "diagnostics": diagnostics}
+
+def _unpack_cleaned(packed: Optional[dict]) -> Optional[tuple]:
+    if packed is None:
+        return None
+    return SegmentedText(packed["text"], [tuple(span) for span in packed["spans"]]), packed["diagnostics"]
+
+def _run_pipeline(
+    questgen,
+    context: str,
+    total_questions: int,
+    distribution: dict,
+    file_metadata: dict = None,
+    tier: Optional[str] = None,
+    cleaned: tuple = None,
+    client: str = "unknown"
+) -> dict:
     """
     Enhanced processing pipeline:
-    1. Clean text with PDFTextCleaner
+    1. Clean text with PDFTextCleaner (skipped for a registered document's cleaned form)
     2. Generate questions with Questgen
     3. Include comprehensive metadata
+    Waits for the scheduler in this thread; the API uses _run_pipeline_scheduled.
     """
+    with _pipeline_errors():
+        prepared = _prepare_pipeline(context, file_metadata, cleaned)
+        return _generate_pipeline(questgen, context, prepared, total_questions, distribution, file_metadata, tier, client)
+
+async def _run_pipeline_scheduled(
+    token: CancelToken,
+    profile: Optional[ProfileSession],
+    questgen,
+    context: str,
+    total_questions: int,
+    distribution: dict,
+    file_metadata: dict = None,
+    tier: Optional[str] = None,
+    cleaned: tuple = None,
+    client: str = "unknown"
+) -> dict:
+    """_run_pipeline for the API: each step in the threadpool, the wait for the models on the event loop."""
+    bind = lambda func: token.bind(profile.bind(func) if profile else func)
+    with _pipeline_errors():
+        prepared = await run_in_threadpool(bind(_prepare_pipeline), context, file_metadata, cleaned)
+        cost = job_cost(prepared[0], total_questions, prepared[2])
+        return await _scheduled(
+            client, token, cost, bind(_generate_pipeline),
+            questgen, context, prepared, total_questions, distribution, file_metadata, tier, client
+        )
+
+@contextmanager
+def _pipeline_errors():
+    """HTTP errors pass through; anything else is logged and becomes a 500."""
     try:
-        # STEP 1: Clean the text
+        yield
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Pipeline error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Processing failed")
+
+def _prepare_pipeline(context: str, file_metadata: dict = None, cleaned: tuple = None) -> tuple:
+    """Step 1: (cleaned SegmentedText in generation order, diagnostics, plan)."""
+    if cleaned is None:
         print("Step 1: Cleaning text with PDFTextCleaner...")
-        cleaned_context, diagnostics = pdf_cleaner.clean_text(context)
-        
-        # Include file metadata if available
-        if file_metadata:
-            diagnostics.file_metadata = file_metadata
-            if file_metadata.get('was_summarized', False):
-                print(f"Used summarized content from {file_metadata['page_count']} page document")
-
-        # STEP 2: Generate questions
-        print("Step 2: Generating questions...")
-        payload = questgen_instance.generate_questions(
-            context=cleaned_context,
+        cleaned_document, diagnostics_data = _clean(context)
+    else:
+        print("Step 1: Using the registered document's cleaned text")
+        cleaned_document, diagnostics_data = cleaned
+
+    # Include file metadata if available
+    if file_metadata:
+        if file_metadata.get('was_summarized', False):
+            print(f"Used summarized content from {file_metadata.get('page_count', '?')} page document")
+    plan = (file_metadata or {}).get('processing_plan')
+    return order_sentences(cleaned_document, plan), diagnostics_data, plan
+
+def _generate_pipeline(
+    questgen,
+    context: str,
+    prepared: tuple,
+    total_questions: int,
+    distribution: dict,
+    file_metadata: dict = None,
+    tier: Optional[str] = None,
+    client: str = "unknown",
+    schedule=None
+) -> dict:
+    """Steps 2 and 3 on _prepare_pipeline's output; schedule as in FileParser.summarize, else scheduler.run."""
+    cleaned_document, diagnostics_data, plan = prepared
+
+    # STEP 2: Generate questions
+    print("Step 2: Generating questions...")
+    # Kept server-side afterwards so "generate more" continues where this run stopped
+    session = GenerationSession.from_context(cleaned_document) if sessions.enabled else None
+    cost = job_cost(cleaned_document, total_questions, plan)
+    with (schedule or functools.partial(scheduler.run, client))(cost), decoding_tier(tier):
+        payload = questgen.generate_questions(
+            context=cleaned_document,
             total_questions=total_questions,
-            question_distribution=distribution
+            question_distribution=distribution,
+            session=session
         )
 
-        # Prepare diagnostics
-        diagnostics_data = {
-            'original_length': diagnostics.original_length,
-            'cleaned_length': diagnostics.cleaned_length,
-            'headers_removed': diagnostics.removed_headers,
-            'citations_removed': diagnostics.removed_citations,
-            'equations_preserved': diagnostics.equations_preserved,
-            'reading_time_min': diagnostics.reading_time_min,
-            'avg_sentence_length': diagnostics.avg_sentence_length,
-            **({'file_metadata': file_metadata} if file_metadata else {})
-        }
+    payload.update({
+        'source_text': context[:1000] + "..." if len(context) > 1000 else context,
+        'cleaning_diagnostics': {**diagnostics_data, **({'file_metadata': file_metadata} if file_metadata else {})},
+        'plan': plan
+    })
 
-        payload.update({
-            'source_text': context[:1000] + "..." if len(context) > 1000 else context,
-            'cleaning_diagnostics': diagnostics_data
-        })
+    if not payload['questions']:
+        raise HTTPException(
+            status_code=404, 
+            detail="No questions could be generated from the provided text."
+        )
 
-        if not payload['questions']:
-            raise HTTPException(
-                status_code=404, 
-                detail="No questions could be generated from the provided text."
-            )
+    if session is not None and session.has_more:
+        payload['session_id'] = sessions.create(
+            {'generation': session, 'source_text': payload['source_text'], 'lock': threading.Lock()}
+        )
 
-        print("Step 3: Pipeline complete")
-        return GeneratedQuestionsResponse(**payload)
+    print("Step 3: Pipeline complete")
+    return payload
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        print(f"Pipeline error: {str(e)}")
-        raise HTTPException(status_code=500, detail="Processing failed")
+def _clean(text: str) -> tuple:
+    """Clean and segment once; returns (SegmentedText, diagnostics dict)."""
+    with stage_timer("clean"):
+        # Segmented once here; the generator reuses the sentence spans
+        cleaned_document, diagnostics = pdf_cleaner.clean_document(text)
+    return cleaned_document, {
+        'original_length': diagnostics.original_length,
+        'cleaned_length': diagnostics.cleaned_length,
+        'headers_removed': diagnostics.removed_headers,
+        'citations_removed': diagnostics.removed_citations,
+        'equations_preserved': diagnostics.equations_preserved,
+        'reading_time_min': diagnostics.reading_time_min,
+        'avg_sentence_length': diagnostics.avg_sentence_length,
+    }
 
 @app.post("/generate-from-text/", response_model=GeneratedQuestionsResponse, tags=["Question Generation"])
-async def create_questions_from_text(request: TextGenerationRequest):
+async def create_questions_from_text(
+    request: TextGenerationRequest,
+    http_request: Request,
+    response: Response
+):
     """Endpoint for direct text input"""
     if len(request.text_input) < 150:
         raise HTTPException(status_code=400, detail="Input text too short (min 150 chars)")
+    try:
+        tier = resolve_tier(request.decoding_tier).name
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     distribution = {
         "mcq": request.mcq_percentage,
@@ -105,43 +448,194 @@ async def create_questions_from_text(request: TextGenerationRequest):
         "fill_in": request.fill_in_percentage
     }
     
-    return await process_and_generate(
-        context=request.text_input,
-        total_questions=request.total_questions,
-        distribution=distribution
-    )
+    with profiler.session(http_request, http_request.state.request_id) as profile:
+        async with cancel_on_disconnect(http_request, CancelToken()) as token:
+            result = await process_and_generate(
+                context=request.text_input,
+                total_questions=request.total_questions,
+                distribution=distribution,
+                tier=tier,
+                coalesce=profile.mode is None,
+                client=http_request.state.client_id,
+                cancel_token=token,
+                profile=profile
+            )
+    response.headers.update(profile.headers())
+    return result
+
+@app.post("/generate-more/", response_model=GeneratedQuestionsResponse, tags=["Question Generation"])
+async def generate_more_questions(request: GenerateMoreRequest, http_request: Request):
+    """
+    More questions for a document from an earlier response's session_id, without
+    resending it: unserved questions first, then generation continues from the
+    sentence where the previous run stopped. 404 when the session has expired.
+    In broker mode the session lives on the worker that ran the first request,
+    so the follow-up goes to that worker; 404 once it has gone away.
+    """
+    try:
+        tier = resolve_tier(request.decoding_tier).name
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    distribution = {
+        "mcq": request.mcq_percentage,
+        "true_false": request.true_false_percentage,
+        "fill_in": request.fill_in_percentage
+    }
+    client = http_request.state.client_id
+    async with cancel_on_disconnect(http_request, CancelToken()) as token:
+        if broker is None:
+            payload = await _continue_session_scheduled(
+                request.session_id, request.total_questions, distribution, tier, client, token
+            )
+        else:
+            # Worker session ids are "<worker id>~<session id>"
+            worker, _, session_id = request.session_id.rpartition("~")
+            live = await run_in_threadpool(broker.live_workers, config.WORKER_LEASE_SECONDS)
+            if worker not in live:
+                raise HTTPException(status_code=404, detail="Generation session expired or unknown; resend the document")
+            job = {"session_id": session_id, "total_questions": request.total_questions,
+                   "distribution": distribution, "tier": tier}
+            # The remaining sentences are only known on the worker; charge a full window
+            cost = generation_cost(sentence_window(request.total_questions), request.total_questions)
+            payload = await _dispatch("generate_more", job, token, client, cost, target=worker)
+    return GeneratedQuestionsResponse(**payload)
+
+def _continue_session(session_id: str, total_questions: int, distribution: dict, tier: Optional[str], client: str) -> dict:
+    """
+    The generate-more pipeline: questions from a stored session, as a GeneratedQuestionsResponse dict.
+    Waits for the session and the scheduler in this thread; the API uses _continue_session_scheduled.
+    """
+    entry = _session_entry(session_id)
+    # One continuation at a time: generation advances the session's cursor, leftovers and
+    # dedup indexes, and a run preempted at a checkpoint must not interleave with another
+    with entry['lock']:
+        return _continue_locked(session_id, entry, total_questions, distribution, tier, client)
+
+async def _continue_session_scheduled(
+    session_id: str,
+    total_questions: int,
+    distribution: dict,
+    tier: Optional[str],
+    client: str,
+    token: CancelToken
+) -> dict:
+    """_continue_session for the API: waits for the session and the models on the event loop."""
+    entry = _session_entry(session_id)
+    lock = entry['lock']
+    # Polled rather than waited for in a thread, so a continuation queued behind another holds none
+    while not lock.acquire(blocking=False):
+        token.raise_if_cancelled("queue")
+        await asyncio.sleep(SESSION_LOCK_POLL_SECONDS)
+    try:
+        session = entry['generation']
+        cost = generation_cost(len(session.sentences) - session.cursor, total_questions)
+        return await _scheduled(
+            client, token, cost, token.bind(_continue_locked),
+            session_id, entry, total_questions, distribution, tier, client
+        )
+    finally:
+        lock.release()
+
+def _session_entry(session_id: str) -> dict:
+    entry = sessions.get(session_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Generation session expired or unknown; resend the document")
+    return entry
+
+def _continue_locked(
+    session_id: str,
+    entry: dict,
+    total_questions: int,
+    distribution: dict,
+    tier: Optional[str],
+    client: str,
+    schedule=None
+) -> dict:
+    """_continue_session with entry['lock'] held; schedule as in FileParser.summarize, else scheduler.run."""
+    session = entry['generation']
+    if not session.has_more:
+        raise HTTPException(status_code=404, detail="Generation session expired or unknown; resend the document")
+    questgen = get_questgen()
+    cost = generation_cost(len(session.sentences) - session.cursor, total_questions)
+    with (schedule or functools.partial(scheduler.run, client))(cost), decoding_tier(tier):
+        payload = questgen.generate_questions(
+            context=None,
+            total_questions=total_questions,
+            question_distribution=distribution,
+            session=session
+        )
+    if not session.has_more:
+        sessions.discard(session_id)
+    if not payload['questions']:
+        raise HTTPException(status_code=404, detail="No more questions could be generated from this document.")
+    return {
+        'source_text': entry['source_text'],
+        'questions': payload['questions'],
+        'session_id': session_id if session.has_more else None
+    }
 
 @app.post("/generate-from-file/", response_model=GeneratedQuestionsResponse, tags=["Question Generation"])
 async def create_questions_from_file(
+    http_request: Request,
+    response: Response,
     file: UploadFile = File(...),
     total_questions: int = Form(10),
     question_distribution_json: str = Form('{"mcq": 0.5, "true_false": 0.5, "fill_in": 0.0}'),
     summarize_large_files: bool = Form(True),
-    page_threshold: int = Form(5)
+    page_threshold: int = Form(5),
+    decoding_tier_name: Optional[str] = Form(None, alias="decoding_tier"),
+    latency_target_s: Optional[float] = Form(None)
 ):
-    """Enhanced file processing endpoint"""
+    """
+    Enhanced file processing endpoint. The planner picks how the document is
+    processed (full text, sections, extracted sentences or a summary) for the
+    latency target; the response's plan field shows the choice and estimates.
+    summarize_large_files=false rules out the summary; page_threshold is ignored.
+    """
     try:
         # Parse distribution
         distribution = json.loads(question_distribution_json)
         if abs(sum(distribution.values()) - 1.0) > 0.001:  # Account for floating point precision
             raise ValueError("Question distribution must sum to 1.0")
+        tier = resolve_tier(decoding_tier_name).name
 
-        # Process file (includes optional summarization)
-        text, file_metadata = await file_parser.parse_file(
-            file,
-            summarize_large_files=summarize_large_files,
-            page_threshold=page_threshold
-        )
-        
-        if not text or len(text) < 150:
-            raise ValueError("Text from file is too short or could not be extracted")
+        if broker is not None:
+            return await _prepare_on_worker(
+                http_request, file, distribution, tier, total_questions, summarize_large_files, latency_target_s
+            )
 
-        return await process_and_generate(
-            context=text,
-            total_questions=total_questions,
-            distribution=distribution,
-            file_metadata=file_metadata
-        )
+        with profiler.session(http_request, http_request.state.request_id) as profile:
+            async with cancel_on_disconnect(http_request, CancelToken()) as token:
+                # Process file (includes optional summarization)
+                with decoding_tier(tier):
+                    text, file_metadata = await file_parser.parse_file(
+                        file,
+                        summarize_large_files=summarize_large_files,
+                        page_threshold=page_threshold,
+                        total_questions=total_questions,
+                        latency_target_s=latency_target_s,
+                        cancel_token=token,
+                        profile=profile,
+                        scheduled=functools.partial(_scheduled, http_request.state.client_id, token)
+                    )
+
+                if not text or len(text) < 150:
+                    raise ValueError("Text from file is too short or could not be extracted")
+
+                result = await process_and_generate(
+                    context=text,
+                    total_questions=total_questions,
+                    distribution=distribution,
+                    file_metadata=file_metadata,
+                    tier=tier,
+                    coalesce=profile.mode is None,
+                    client=http_request.state.client_id,
+                    cancel_token=token,
+                    profile=profile
+                )
+        response.headers.update(profile.headers())
+        return result
         
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid distribution format")
@@ -152,6 +646,436 @@ async def create_questions_from_file(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"File processing failed: {str(e)}")
 
+async def _prepare_on_worker(
+    http_request: Request,
+    file: UploadFile,
+    distribution: dict,
+    tier: str,
+    total_questions: int,
+    summarize_large_files: bool,
+    latency_target_s: Optional[float]
+) -> GeneratedQuestionsResponse:
+    """Broker mode for /generate-from-file/: one job that a worker parses, then generates from."""
+    if file.content_type not in file_parser.supported_types:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type: {file.content_type}. Supported types: {list(file_parser.supported_types.keys())}"
+        )
+    content = await file.read()
+    job = {
+        "content_type": file.content_type, "summarize_large_files": summarize_large_files,
+        "total_questions": total_questions, "latency_target_s": latency_target_s,
+        "distribution": distribution, "tier": tier,
+    }
+    # Only the worker sees the text; estimate its words from the upload size for the fair-queuing tag
+    cost = generation_cost(sentence_window(total_questions), total_questions, len(content) // 6)
+    key = request_key(document_id_for(content), total_questions, distribution, summarize_large_files, latency_target_s, tier)
+    client = http_request.state.client_id
+    async with cancel_on_disconnect(http_request, CancelToken()) as token:
+        return await _attach(
+            key if config.COALESCE_REQUESTS else None,
+            lambda run_token: _dispatch("prepare", job, run_token, client, cost, data=content),
+            token
+        )
+
+@app.post("/generate-batch/", response_model=BatchGeneratedQuestionsResponse, tags=["Question Generation"])
+async def create_questions_from_batch(
+    http_request: Request,
+    response: Response,
+    files: List[UploadFile] = File(...),
+    total_questions: int = Form(10),
+    question_distribution_json: str = Form('{"mcq": 0.5, "true_false": 0.5, "fill_in": 0.0}'),
+    summarize_large_files: bool = Form(True),
+    page_threshold: int = Form(5),
+    decoding_tier_name: Optional[str] = Form(None, alias="decoding_tier"),
+    latency_target_s: Optional[float] = Form(None)
+):
+    """
+    Multi-document endpoint: accepts several files and/or zip archives.
+    total_questions is per document; combined_questions is deduplicated across documents.
+    Each document is planned separately against latency_target_s.
+    """
+    try:
+        distribution = json.loads(question_distribution_json)
+        if abs(sum(distribution.values()) - 1.0) > 0.001:
+            raise ValueError("Question distribution must sum to 1.0")
+        tier = resolve_tier(decoding_tier_name).name
+
+        # Collect (filename, content_type, content) for every document
+        documents = []
+        for upload in files:
+            content_type = file_parser.content_type_for(upload.filename, upload.content_type)
+            content = await upload.read()
+            if content_type in ARCHIVE_TYPES:
+                documents.extend(file_parser.expand_archive(content))
+            elif content_type in file_parser.supported_types:
+                documents.append((upload.filename, content_type, content))
+            else:
+                raise ValueError(f"Unsupported file type: {upload.content_type} ({upload.filename})")
+        if not documents:
+            raise ValueError("No supported documents were uploaded")
+
+        args = (documents, total_questions, distribution, tier, summarize_large_files, latency_target_s)
+        client = http_request.state.client_id
+        with profiler.session(http_request, http_request.state.request_id) as profile:
+            async with cancel_on_disconnect(http_request, CancelToken()) as token:
+                if broker is not None:
+                    # Files travel as one blob; the payload records where each one ends
+                    job = {
+                        "documents": [[filename, content_type, len(content)] for filename, content_type, content in documents],
+                        "total_questions": total_questions, "distribution": distribution, "tier": tier,
+                        "summarize_large_files": summarize_large_files, "latency_target_s": latency_target_s,
+                    }
+                    data = b"".join(content for _, _, content in documents)
+                    cost = len(documents) * generation_cost(sentence_window(total_questions), total_questions, len(data) // 6)
+                    payload = await _dispatch("batch", job, token, client, cost, data=data)
+                else:
+                    payload = await _generate_batch_scheduled(token, profile, *args, client)
+
+        response.headers.update(profile.headers())
+        return BatchGeneratedQuestionsResponse(**payload)
+
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid distribution format")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Batch pipeline error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Batch processing failed: {str(e)}")
+
+def _generate_batch(
+    documents: List[tuple],
+    total_questions: int,
+    distribution: dict,
+    tier: str,
+    summarize_large_files: bool,
+    latency_target_s: Optional[float],
+    client: str
+) -> dict:
+    """
+    The batch pipeline for (filename, content_type, content) documents, as a BatchGeneratedQuestionsResponse dict.
+    Waits for the scheduler in this thread; the API uses _generate_batch_scheduled.
+    """
+    texts, plans, errors = _plan_batch(documents, total_questions, tier, summarize_large_files, latency_target_s)
+    # One summarizer, so sequentially
+    with decoding_tier(tier):
+        for doc_id in [doc_id for doc_id, plan in plans.items() if plan['path'] == 'abstractive']:
+            text, metadata = texts[doc_id]
+            texts[doc_id] = file_parser.summarize(text, metadata, functools.partial(scheduler.run, client)), metadata
+    contexts = _clean_batch(texts, plans, errors)
+    generated = _generate_for_batch(contexts, plans, total_questions, distribution, tier, client)
+    return _batch_response(documents, generated, errors, plans)
+
+async def _generate_batch_scheduled(
+    token: CancelToken,
+    profile: ProfileSession,
+    documents: List[tuple],
+    total_questions: int,
+    distribution: dict,
+    tier: str,
+    summarize_large_files: bool,
+    latency_target_s: Optional[float],
+    client: str
+) -> dict:
+    """_generate_batch for the API: each step in the threadpool, the waits for the models on the event loop."""
+    bind = lambda func: profile.bind(token.bind(func))
+    texts, plans, errors = await run_in_threadpool(
+        bind(_plan_batch), documents, total_questions, tier, summarize_large_files, latency_target_s
+    )
+    with decoding_tier(tier):
+        for doc_id in [doc_id for doc_id, plan in plans.items() if plan['path'] == 'abstractive']:
+            text, metadata = texts[doc_id]
+            summary = await _scheduled(client, token, summarize_cost(plans[doc_id]), bind(file_parser.summarize), text, metadata)
+            texts[doc_id] = summary, metadata
+    contexts = await run_in_threadpool(bind(_clean_batch), texts, plans, errors)
+    cost = sum(job_cost(contexts[doc_id], total_questions, plans[doc_id]) for doc_id in contexts)
+    generated = await _scheduled(
+        client, token, cost, bind(_generate_for_batch), contexts, plans, total_questions, distribution, tier, client
+    )
+    return await run_in_threadpool(_batch_response, documents, generated, errors, plans)
+
+def _plan_batch(
+    documents: List[tuple],
+    total_questions: int,
+    tier: str,
+    summarize_large_files: bool,
+    latency_target_s: Optional[float]
+) -> tuple:
+    """Parse every document in parallel and plan each; ({doc_id: (text, metadata)}, {doc_id: plan}, {doc_id: error})."""
+    # STEP 1: Parse all documents in parallel worker threads, with the request's cancel token
+    with ThreadPoolExecutor(max_workers=min(BATCH_PARSE_WORKERS, len(documents))) as executor:
+        futures = [
+            executor.submit(contextvars.copy_context().run, file_parser.extract_text, content, content_type)
+            for _, content_type, content in documents
+        ]
+    parsed = [future.exception() or future.result() for future in futures]
+
+    # STEP 2: Plan each document; the caller summarizes where planned
+    texts, plans, errors = {}, {}, {}
+    for index, outcome in enumerate(parsed):
+        doc_id = str(index)
+        if isinstance(outcome, BaseException):
+            if isinstance(outcome, RequestCancelled):
+                raise outcome
+            errors[doc_id] = str(outcome)
+            continue
+        text, metadata = outcome
+        with decoding_tier(tier):
+            plans[doc_id] = file_parser.plan(
+                text, metadata, total_questions, summarize_large_files, latency_target_s
+            )
+        texts[doc_id] = text, metadata
+    return texts, plans, errors
+
+def _clean_batch(texts: dict, plans: dict, errors: dict) -> dict:
+    """Clean each (possibly summarized) document; {doc_id: SegmentedText}, too-short ones recorded in errors."""
+    contexts = {}
+    for doc_id, (text, _) in texts.items():
+        with stage_timer("clean"):
+            cleaned_document, _ = pdf_cleaner.clean_document(text)
+        if len(cleaned_document.text) < 150:
+            errors[doc_id] = "Text from file is too short or could not be extracted"
+            continue
+        contexts[doc_id] = order_sentences(cleaned_document, plans[doc_id])
+    return contexts
+
+def _generate_for_batch(
+    contexts: dict,
+    plans: dict,
+    total_questions: int,
+    distribution: dict,
+    tier: str,
+    client: str,
+    schedule=None
+) -> dict:
+    """STEP 3: generate for all documents with shared, batched model calls; schedule as in _generate_pipeline."""
+    print(f"Batch: generating for {len(contexts)} documents")
+    questgen = get_questgen()
+    cost = sum(job_cost(contexts[doc_id], total_questions, plans[doc_id]) for doc_id in contexts)
+    with (schedule or functools.partial(scheduler.run, client))(cost), decoding_tier(tier):
+        return questgen.generate_questions_batch(contexts, total_questions, distribution)
+
+def _batch_response(documents: List[tuple], generated: dict, errors: dict, plans: dict) -> dict:
+    """Per-document results plus the deduplicated combined questions, as a BatchGeneratedQuestionsResponse dict."""
+    document_results, all_questions = [], []
+    for index, (filename, _, _) in enumerate(documents):
+        doc_id = str(index)
+        questions = generated.get(doc_id, {}).get("questions", [])
+        for question in questions:
+            question['source_document'] = filename
+        all_questions.extend(questions)
+        document_results.append(DocumentQuestions(
+            filename=filename, questions=questions, error=errors.get(doc_id), plan=plans.get(doc_id)
+        ).dict())
+
+    if not all_questions:
+        raise HTTPException(
+            status_code=404,
+            detail="No questions could be generated from the provided documents."
+        )
+    return {'documents': document_results, 'combined_questions': deduplicate_questions(all_questions)}
+
+@app.post("/documents/", response_model=DocumentInfo, tags=["Documents"])
+async def register_document(file: UploadFile = File(...)):
+    """
+    Upload a file once: it is extracted, cleaned and segmented now, and later
+    generations pass the returned document_id to /generate-from-document/.
+    Uploading the same file again returns the existing document.
+    """
+    content_type = file_parser.content_type_for(file.filename, file.content_type)
+    if content_type not in file_parser.supported_types:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type: {file.content_type}. Supported types: {list(file_parser.supported_types.keys())}"
+        )
+    content = await file.read()
+    document_id = document_id_for(content)
+    stored = await run_in_threadpool(documents.get, document_id)
+    if stored is not None:
+        return DocumentInfo(**stored.describe(), reused=True)
+
+    def process() -> dict:
+        text, metadata = file_parser.extract_text(content, content_type)
+        cleaned_document, diagnostics_data = _clean(text)
+        if len(cleaned_document.text) < 150:
+            raise ValueError("Text from file is too short or could not be extracted")
+        return documents.put(
+            document_id, file.filename or document_id, content_type, metadata, text, cleaned_document, diagnostics_data
+        ).describe()
+
+    try:
+        return DocumentInfo(**await run_in_threadpool(process))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/documents/{document_id}", response_model=DocumentInfo, tags=["Documents"])
+def get_document(document_id: str):
+    stored = documents.get(document_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail="Document not found; upload it again")
+    return DocumentInfo(**stored.describe())
+
+@app.delete("/documents/{document_id}", tags=["Documents"])
+def delete_document(document_id: str):
+    if not documents.delete(document_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"deleted": document_id}
+
+@app.post("/generate-from-document/", response_model=GeneratedQuestionsResponse, tags=["Question Generation"])
+async def create_questions_from_document(
+    request: DocumentGenerationRequest,
+    http_request: Request,
+    response: Response
+):
+    """
+    Like /generate-from-file/, for a document registered with POST /documents/:
+    no upload, parse or clean. Only a summarizing plan reprocesses the stored text.
+    An unknown or pruned document_id is 410, so clients can tell it from the 404
+    of a document nothing could be generated from, and upload it again.
+    """
+    stored = await run_in_threadpool(documents.get, request.document_id)
+    if stored is None:
+        raise HTTPException(status_code=410, detail="Document not found; upload it again")
+    try:
+        tier = resolve_tier(request.decoding_tier).name
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    distribution = {
+        "mcq": request.mcq_percentage,
+        "true_false": request.true_false_percentage,
+        "fill_in": request.fill_in_percentage
+    }
+    file_metadata = dict(stored.metadata)
+    with profiler.session(http_request, http_request.state.request_id) as profile:
+        async with cancel_on_disconnect(http_request, CancelToken()) as token:
+            with decoding_tier(tier):
+                plan = file_parser.plan(
+                    stored.raw_text, file_metadata, request.total_questions,
+                    request.summarize_large_files, request.latency_target_s
+                )
+                if plan['path'] == 'abstractive' and broker is not None:
+                    # The summarizer runs on a worker too: a "prepare" job that summarizes, then generates
+                    job = {
+                        "text": stored.raw_text, "metadata": file_metadata, "total_questions": request.total_questions,
+                        "distribution": distribution, "tier": tier,
+                    }
+                    key = request_key(stored.document_id, request.total_questions, distribution, plan, tier)
+                    cost = text_cost(stored.raw_text, request.total_questions, plan)
+                    client = http_request.state.client_id
+                    return await _attach(
+                        key if config.COALESCE_REQUESTS else None,
+                        lambda run_token: _dispatch("prepare", job, run_token, client, cost),
+                        token
+                    )
+                if plan['path'] == 'abstractive':
+                    summarize = profile.bind(token.bind(file_parser.summarize))
+                    text = await _scheduled(
+                        http_request.state.client_id, token, summarize_cost(plan), summarize, stored.raw_text, file_metadata
+                    )
+                    cleaned = None
+                else:
+                    text, cleaned = stored.raw_text, (stored.cleaned, stored.diagnostics)
+
+            result = await process_and_generate(
+                context=text,
+                total_questions=request.total_questions,
+                distribution=distribution,
+                file_metadata=file_metadata,
+                tier=tier,
+                coalesce=profile.mode is None,
+                cleaned=cleaned,
+                client=http_request.state.client_id,
+                cancel_token=token,
+                profile=profile
+            )
+    response.headers.update(profile.headers())
+    return result
+
+@app.get("/jobs/{job_id}", tags=["Jobs"])
+def get_job(job_id: str):
+    """Status of a broker job; its id is the X-Request-ID of the request that submitted it"""
+    job = broker.get(job_id) if broker is not None else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.describe()
+
+@app.get("/jobs/{job_id}/events", tags=["Jobs"])
+async def stream_job_events(job_id: str, request: Request):
+    """
+    Progress of a broker job as newline-delimited JSON (queued, started,
+    prepared, done with the result, failed or cancelled), ending with the
+    final event. Can be opened before the job is submitted, e.g. with the
+    X-Request-ID the client is about to send.
+    """
+    if broker is None:
+        raise HTTPException(status_code=404, detail="Jobs are only used with an inference broker (BROKER_URL)")
+
+    async def follow():
+        after, waiting_since = 0, time.monotonic()
+        while not await request.is_disconnected():
+            events = await run_in_threadpool(broker.events, job_id, after)
+            for after, event in events:
+                yield json.dumps(event) + "\n"
+                if event["event"] in TERMINAL:
+                    return
+            if after == 0 and time.monotonic() - waiting_since > EVENT_STREAM_WAIT_SECONDS:
+                yield json.dumps({"event": "unknown", "detail": "Job not found"}) + "\n"
+                return
+            await asyncio.sleep(config.BROKER_POLL_SECONDS)
+
+    return StreamingResponse(follow(), media_type="application/x-ndjson")
+
+@app.get("/question-bank/documents", response_model=List[QuestionBankDocument], tags=["Question Bank"])
+def list_question_bank():
+    """Documents with precomputed questions (built with `python -m app.question_bank build`)"""
+    if not question_bank.exists():
+        raise HTTPException(status_code=404, detail="No question bank has been built")
+    return question_bank.documents()
+
+@app.get("/question-bank/sample", response_model=QuestionBankSample, tags=["Question Bank"])
+def sample_question_bank(
+    document_id: str,
+    total_questions: int = Query(10, ge=1, le=200),
+    question_type: Optional[List[str]] = Query(None)
+):
+    """Random precomputed questions for one document, optionally limited to some question types"""
+    if question_type and not set(question_type) <= set(QUESTION_TYPES):
+        raise HTTPException(status_code=400, detail=f"question_type must be one of: {', '.join(QUESTION_TYPES)}")
+    if not question_bank.exists():
+        raise HTTPException(status_code=404, detail="No question bank has been built")
+    try:
+        with stage_timer("question_bank"):
+            questions = question_bank.sample(document_id, total_questions, question_type)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Document '{document_id}' is not in the question bank")
+    return QuestionBankSample(document_id=document_id, questions=questions)
+
+@app.get("/metrics", response_class=PlainTextResponse, tags=["Monitoring"])
+def metrics():
+    """Prometheus text exposition of in-process pipeline metrics"""
+    return PlainTextResponse(
+        metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@app.get("/models", tags=["Monitoring"])
+def model_diagnostics():
+    """Loaded models, their measured memory, last use and load/eviction counts, against the memory budget"""
+    return model_manager.state()
+
+@app.get("/profiles/{artifact}", tags=["Monitoring"])
+def download_profile(artifact: str, request: Request):
+    """Download a stored profile artifact, e.g. /profiles/<request_id>.pstats"""
+    if not profiler.is_allowed(request):
+        raise HTTPException(status_code=403, detail="Profiling is not enabled for this client")
+    path = profiler.artifact_path(artifact)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile artifact not found")
+    return FileResponse(path, filename=artifact)
+
 @app.get("/", tags=["Health Check"])
 def health_check():
     return {
@@ -162,6 +1086,20 @@ def health_check():
         }
     }
 
+@app.get("/ready", tags=["Health Check"])
+def readiness_check(response: Response):
+    """Readiness probe: 503 until the question generation models are loaded (broker mode: a worker is up)"""
+    if broker is not None:
+        workers = broker.live_workers(config.WORKER_LEASE_SECONDS)
+        if not any("generate" in kinds for kinds in workers.values()):
+            response.status_code = 503
+            return {"status": "waiting for workers"}
+        return {"status": "ready", "workers": len(workers)}
+    if not questgen_loaded():
+        response.status_code = 503
+        return {"status": "loading"}
+    return {"status": "ready"}
+
 @app.get("/health", tags=["Health Check"])
 def health_check_render():
     """Health check endpoint specifically for Render deployment"""
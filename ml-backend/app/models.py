@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 
 # This file should now contain both models
 class CleaningDiagnostics(BaseModel):
@@ -18,11 +18,69 @@ class Question(BaseModel):
     answer: Union[str, bool]
     options: Optional[List[str]] = None
     context: Optional[str] = None
+    source_document: Optional[str] = None
+
+class PathEstimate(BaseModel):
+    """The planner's estimate for one processing path."""
+    path: str
+    latency_s: float
+    benefit: float
+    candidate_sentences: int
+    coverage: float
+    within_target: bool
+    summarize_s: float = 0.0  # summarizer seconds within latency_s
+
+class PipelinePlan(BaseModel):
+    """How an uploaded document was processed, and the estimates behind the choice."""
+    path: str  # full, sections, extractive or abstractive
+    reason: str
+    latency_target_s: float
+    sentence_budget: int
+    document: Dict[str, int]
+    estimates: List[PathEstimate]
 
 class GeneratedQuestionsResponse(BaseModel):
     """This is the main response model that our API will return."""
     source_text: str
     questions: List[Question]
+    session_id: Optional[str] = None  # pass to /generate-more/ for further questions from the same document
+    plan: Optional[PipelinePlan] = None  # file uploads only
+
+class DocumentQuestions(BaseModel):
+    """Questions generated for one document of a batch request."""
+    filename: str
+    questions: List[Question]
+    error: Optional[str] = None
+    plan: Optional[PipelinePlan] = None
+
+class BatchGeneratedQuestionsResponse(BaseModel):
+    """Per-document question sets plus one set deduplicated across documents."""
+    documents: List[DocumentQuestions]
+    combined_questions: List[Question]
+
+class QuestionBankDocument(BaseModel):
+    """A document with precomputed questions in the question bank."""
+    document_id: str
+    filename: str
+    question_count: int
+    question_types: Dict[str, int]
+    built_at: float
+
+class QuestionBankSample(BaseModel):
+    """Questions sampled from the question bank for one document."""
+    document_id: str
+    questions: List[Question]
+
+class DocumentInfo(BaseModel):
+    """A processed upload in the document registry; pass document_id to /generate-from-document/."""
+    document_id: str
+    filename: str
+    content_type: str
+    page_count: Optional[int] = None
+    word_count: int
+    sentence_count: int
+    created_at: float
+    reused: bool = False  # the same file was already registered and was not processed again
 
 # --- ADD THIS NEW MODEL ---
 class TextGenerationRequest(BaseModel):
@@ -33,4 +91,25 @@ class TextGenerationRequest(BaseModel):
     total_questions: int = 10
     mcq_percentage: float = 0.5
     true_false_percentage: float = 0.5
-    fill_in_percentage: float = 0.0
\ No newline at end of file
+    fill_in_percentage: float = 0.0
+    decoding_tier: Optional[str] = None  # fast, balanced or thorough; server default when omitted
+
+class DocumentGenerationRequest(BaseModel):
+    """Generation from a registered document instead of an uploaded file."""
+    document_id: str
+    total_questions: int = 10
+    mcq_percentage: float = 0.5
+    true_false_percentage: float = 0.5
+    fill_in_percentage: float = 0.0
+    decoding_tier: Optional[str] = None
+    summarize_large_files: bool = True
+    latency_target_s: Optional[float] = None
+
+class GenerateMoreRequest(BaseModel):
+    """Follow-up request for more questions from an earlier response's session."""
+    session_id: str
+    total_questions: int = 10
+    mcq_percentage: float = 0.5
+    true_false_percentage: float = 0.5
+    fill_in_percentage: float = 0.0
+    decoding_tier: Optional[str] = None
@@ -0,0 +1,307 @@
+"""
+question_bank.py - Precomputed questions for known course material.
+
+`build` walks a directory of documents and runs parse -> clean -> generate on
+each of them in a pool of worker processes. Every distinct question the
+generator produced is stored, including the overgenerated candidates beyond
+the requested count, in a SQLite file indexed by document and question type.
+The API samples from that file with no model in the loop.
+
+Documents are keyed by their path relative to the scanned directory. A
+document whose content hash has not changed since the last build is skipped.
+
+Usage (from ml-backend/):
+    python -m app.question_bank build course_material/ --questions 30 --overgeneration 3
+    python -m app.question_bank list
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from . import config
+
+QUESTION_TYPES = ("mcq", "true_false", "fill_in")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    document_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    question_count INTEGER NOT NULL,
+    built_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    document_id TEXT NOT NULL REFERENCES documents(document_id) ON DELETE CASCADE,
+    question_type TEXT NOT NULL,
+    question_statement TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    options TEXT,
+    context TEXT
+);
+CREATE INDEX IF NOT EXISTS questions_by_document_type ON questions(document_id, question_type);
+"""
+
+
+# -----------------------------------------------------------------------------
+# STORE
+# -----------------------------------------------------------------------------
+class QuestionBank:
+    """SQLite store of precomputed questions; safe to read while a build writes (WAL)."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def exists(self) -> bool:
+        return os.path.isfile(self.path)
+
+    @contextlib.contextmanager
+    def _connect(self, readonly: bool = False):
+        if readonly:
+            connection = sqlite3.connect(f"{Path(self.path).absolute().as_uri()}?mode=ro", uri=True)
+        else:
+            connection = sqlite3.connect(self.path)
+            connection.execute("PRAGMA foreign_keys = ON")
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def initialize(self) -> None:
+        with self._connect() as connection:
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.executescript(_SCHEMA)
+
+    def content_hashes(self) -> Dict[str, str]:
+        with self._connect(readonly=True) as connection:
+            return dict(connection.execute("SELECT document_id, content_hash FROM documents"))
+
+    def store(self, document_id: str, filename: str, content_hash: str, questions: Dict[str, List[dict]]) -> int:
+        """Replace everything stored for one document; returns the number of questions written."""
+        rows = [
+            (
+                document_id,
+                question_type,
+                question["question_statement"],
+                str(question.get("answer", "")),
+                json.dumps(question["options"]) if question.get("options") else None,
+                question.get("context"),
+            )
+            for question_type, items in questions.items()
+            for question in items
+        ]
+        with self._connect() as connection:
+            connection.execute("DELETE FROM documents WHERE document_id = ?", (document_id,))
+            connection.execute(
+                "INSERT INTO documents (document_id, filename, content_hash, question_count, built_at) VALUES (?, ?, ?, ?, ?)",
+                (document_id, filename, content_hash, len(rows), time.time()),
+            )
+            connection.executemany(
+                "INSERT INTO questions (document_id, question_type, question_statement, answer, options, context)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def documents(self) -> List[dict]:
+        with self._connect(readonly=True) as connection:
+            cursor = connection.execute(
+                "SELECT d.document_id, d.filename, d.question_count, d.built_at, q.question_type, COUNT(q.id)"
+                " FROM documents d LEFT JOIN questions q ON q.document_id = d.document_id"
+                " GROUP BY d.document_id, q.question_type ORDER BY d.document_id"
+            )
+            documents: Dict[str, dict] = {}
+            for document_id, filename, count, built_at, question_type, type_count in cursor:
+                entry = documents.setdefault(document_id, {
+                    "document_id": document_id, "filename": filename, "question_count": count,
+                    "built_at": built_at, "question_types": {},
+                })
+                if question_type:
+                    entry["question_types"][question_type] = type_count
+        return list(documents.values())
+
+    def sample(self, document_id: str, total_questions: int, question_types: Optional[List[str]] = None) -> List[dict]:
+        """Random questions of the given types for one document; raises KeyError for an unknown document."""
+        question_types = list(question_types or QUESTION_TYPES)
+        placeholders = ", ".join("?" for _ in question_types)
+        with self._connect(readonly=True) as connection:
+            if connection.execute("SELECT 1 FROM documents WHERE document_id = ?", (document_id,)).fetchone() is None:
+                raise KeyError(document_id)
+            rows = connection.execute(
+                "SELECT question_type, question_statement, answer, options, context FROM questions"
+                f" WHERE document_id = ? AND question_type IN ({placeholders}) ORDER BY random() LIMIT ?",
+                (document_id, *question_types, total_questions),
+            ).fetchall()
+        questions = []
+        for question_type, statement, answer, options, context in rows:
+            options = json.loads(options) if options else None
+            if options and question_type != "true_false":
+                random.shuffle(options)
+            questions.append({
+                "question_statement": statement,
+                "question_type": question_type,
+                "answer": answer,
+                "options": options,
+                "context": context,
+            })
+        return questions
+
+
+# -----------------------------------------------------------------------------
+# BUILD
+# -----------------------------------------------------------------------------
+_worker: Dict[str, object] = {}
+
+
+def discover(root: str) -> List[Tuple[str, str, str]]:
+    """(document_id, path, content_type) for every supported document under root."""
+    from .utils.file_parser import EXTENSION_TYPES
+
+    found = []
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories[:] = sorted(d for d in subdirectories if not d.startswith("."))
+        for filename in sorted(filenames):
+            content_type = EXTENSION_TYPES.get(filename.rsplit(".", 1)[-1].lower())
+            if filename.startswith(".") or content_type is None:
+                continue
+            path = os.path.join(directory, filename)
+            found.append((Path(os.path.relpath(path, root)).as_posix(), path, content_type))
+    return found
+
+
+def _init_worker(workers: int, verbose: bool) -> None:
+    """Runs once per spawned process: model cache, thread split, then the models themselves."""
+    if not verbose:
+        sys.stdout = open(os.devnull, "w")
+    from .artifacts import prepare_runtime
+    from .utils.topology import apply_environment, current_topology
+
+    prepare_runtime()
+    # Workers share the CPUs the way app.serve splits them between uvicorn workers
+    config.WORKERS = str(workers)
+    current_topology.cache_clear()
+    apply_environment()
+
+    from .services.pdf_text_cleaner import PDFTextCleaner, ProcessingMode
+    from .services.questgen_service import QuestgenService
+    from .utils.file_parser import FileParser
+
+    _worker["parser"] = FileParser()
+    _worker["cleaner"] = PDFTextCleaner({
+        "processing_mode": ProcessingMode.ACADEMIC,
+        "remove_citations": True,
+    })
+    _worker["questgen"] = QuestgenService()
+
+
+def _build_document(path: str, content_type: str, total_questions: int, distribution: dict,
+                    overgeneration: float) -> Dict[str, List[dict]]:
+    with open(path, "rb") as handle:
+        text, _ = _worker["parser"].extract_text(handle.read(), content_type)
+    document, _ = _worker["cleaner"].clean_document(text)
+    return _worker["questgen"].generate_candidates(document, total_questions, distribution, overgeneration)
+
+
+def build(
+    root: str,
+    bank: QuestionBank,
+    total_questions: int,
+    distribution: dict,
+    overgeneration: float,
+    workers: int,
+    force: bool = False,
+    verbose: bool = False,
+) -> Tuple[int, List[str]]:
+    """Generate questions for new or changed documents under root; returns (documents built, failures)."""
+    bank.initialize()
+    known = {} if force else bank.content_hashes()
+    pending = []
+    for document_id, path, content_type in discover(root):
+        with open(path, "rb") as handle:
+            content_hash = hashlib.sha256(handle.read()).hexdigest()
+        if known.get(document_id) == content_hash:
+            print(f"= {document_id} (unchanged)")
+            continue
+        pending.append((document_id, path, content_type, content_hash))
+
+    if not pending:
+        return 0, []
+
+    built, failures = 0, []
+    workers = max(1, min(workers, len(pending)))
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(workers, verbose)) as pool:
+        futures = {
+            pool.submit(_build_document, path, content_type, total_questions, distribution, overgeneration):
+                (document_id, path, content_hash)
+            for document_id, path, content_type, content_hash in pending
+        }
+        for future in as_completed(futures):
+            document_id, path, content_hash = futures[future]
+            try:
+                questions = future.result()
+            except Exception as e:
+                failures.append(document_id)
+                print(f"✗ {document_id}: {e}")
+                continue
+            count = bank.store(document_id, os.path.basename(path), content_hash, questions)
+            built += 1
+            by_type = ", ".join(f"{t}: {len(items)}" for t, items in questions.items())
+            print(f"✓ {document_id}: {count} questions ({by_type})")
+    return built, failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from .utils.topology import current_topology
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=("build", "list"))
+    parser.add_argument("directory", nargs="?", help="build: directory of documents to scan")
+    parser.add_argument("--bank", default=config.QUESTION_BANK_PATH, help="SQLite file to write")
+    parser.add_argument("--questions", type=int, default=30, help="Questions requested per document")
+    parser.add_argument("--distribution", default='{"mcq": 0.4, "true_false": 0.4, "fill_in": 0.2}')
+    parser.add_argument("--overgeneration", type=float, default=3.0, help="Distinct candidates kept per requested question")
+    parser.add_argument("--workers", type=int, default=current_topology().workers,
+                        help="Worker processes, each with its own models (default: WEB_CONCURRENCY)")
+    parser.add_argument("--force", action="store_true", help="Rebuild documents whose content is unchanged")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's own console output")
+    args = parser.parse_args(argv)
+
+    bank = QuestionBank(args.bank)
+    if args.command == "list":
+        if not bank.exists():
+            print(f"No question bank at {args.bank}")
+            return 1
+        for document in bank.documents():
+            by_type = ", ".join(f"{t}: {n}" for t, n in document["question_types"].items())
+            print(f"{document['document_id']}  {document['question_count']} questions ({by_type})")
+        return 0
+
+    if not args.directory or not os.path.isdir(args.directory):
+        parser.error("build needs an existing directory")
+    started = time.perf_counter()
+    built, failures = build(
+        args.directory, bank, args.questions, json.loads(args.distribution), args.overgeneration,
+        args.workers, force=args.force, verbose=args.verbose,
+    )
+    print(f"Built {built} document(s) into {args.bank} in {time.perf_counter() - started:.1f}s"
+          + (f"; {len(failures)} failed" if failures else ""))
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,29 @@
+"""
+serve.py - Production entry point: uvicorn with a CPU-aware worker topology.
+
+Runs uvicorn with the worker count from app.utils.topology. It exports the
+per-worker OpenMP/BLAS thread counts before any worker imports torch, so
+workers x threads matches the container's CPU quota.
+
+Usage (from ml-backend/):
+    python -m app.serve
+    WEB_CONCURRENCY=2 TORCH_THREADS=3 python -m app.serve
+"""
+
+import uvicorn
+
+from . import config
+from .utils.topology import apply_environment
+
+
+def main():
+    topology = apply_environment()
+    print(
+        f"🧮 {topology.cpus} CPUs: {topology.workers} worker(s) x {topology.torch_threads} torch threads, "
+        f"{topology.cleaner_workers} cleaner threads"
+    )
+    uvicorn.run("app.main:app", host=config.HOST, port=config.PORT, workers=topology.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+fill_in.py - Fill-in-the-blank questions from spaCy analysis, without T5 calls.
+
+Candidate sentences are analysed in batches with one nlp.pipe() call each.
+Only the components the blanks need run: tagger and attribute ruler for part
+of speech, parser for noun chunks, and ner. The lemmatizer and any other
+component are disabled. Each sentence gets one blank, chosen in this order:
+
+1. a named entity (person, organisation, place, event, law, work, ...)
+2. a numeric fact (date, quantity, percentage, amount, count)
+3. a noun chunk headed by a noun, without its leading determiner
+
+Within a class the longest candidate wins; ties go to the earliest one.
+Candidates that cover most of the sentence are skipped, so there is always
+enough context left to answer from.
+
+Usage:
+    engine = FillInGenerator()
+    questions = engine.generate(sentences)    # one list of questions per sentence
+"""
+
+from __future__ import annotations
+
+from typing import Iterable, List, Optional, Tuple
+
+from .model_manager import model_manager
+
+SPACY_MODEL = "en_core_web_sm"
+# Components the blanks are chosen from; everything else in the pipeline is disabled
+PIPES_USED = ("tok2vec", "tagger", "attribute_ruler", "parser", "ner")
+PIPE_BATCH_SIZE = 64
+
+BLANK = "_____"
+ENTITY_LABELS = {"PERSON", "NORP", "FAC", "ORG", "GPE", "LOC", "PRODUCT", "EVENT", "WORK_OF_ART", "LAW", "LANGUAGE"}
+NUMERIC_LABELS = {"DATE", "TIME", "PERCENT", "MONEY", "QUANTITY", "CARDINAL"}
+# Blanks longer than this share of the sentence's tokens leave too little to answer from
+MAX_BLANK_SHARE = 0.5
+MAX_BLANK_TOKENS = 6
+_LEADING_POS = {"DET", "PRON", "ADP", "CCONJ", "PUNCT"}
+
+
+def _load_nlp():
+    import spacy
+
+    return spacy.load(SPACY_MODEL)
+
+
+def _trimmed_chunk(chunk) -> Optional[Tuple[int, int]]:
+    """Token bounds of a noun chunk without leading determiners and pronouns, if it is headed by a noun."""
+    if chunk.root.pos_ not in ("NOUN", "PROPN"):
+        return None
+    start = chunk.start
+    while start < chunk.end and chunk.doc[start].pos_ in _LEADING_POS:
+        start += 1
+    tokens = chunk.doc[start:chunk.end]
+    if not tokens or all(token.is_stop for token in tokens):
+        return None
+    return start, chunk.end
+
+
+def _candidates(doc) -> Iterable[Tuple[int, int, int]]:
+    """(priority, start token, end token) for every possible blank in the sentence."""
+    for ent in doc.ents:
+        if ent.label_ in ENTITY_LABELS:
+            yield 3, ent.start, ent.end
+        elif ent.label_ in NUMERIC_LABELS:
+            yield 2, ent.start, ent.end
+    for token in doc:
+        # Numbers the entity recognizer missed, e.g. "9.81" in a formula
+        if token.like_num and not token.ent_type_ and any(c.isdigit() for c in token.text):
+            yield 2, token.i, token.i + 1
+    for chunk in doc.noun_chunks:
+        bounds = _trimmed_chunk(chunk)
+        if bounds:
+            yield 1, bounds[0], bounds[1]
+
+
+def blank_sentence(doc) -> Optional[dict]:
+    """The best fill-in question for one analysed sentence, or None."""
+    limit = min(MAX_BLANK_TOKENS, max(1, int(len(doc) * MAX_BLANK_SHARE)))
+    best = None
+    for priority, start, end in _candidates(doc):
+        if end - start > limit:
+            continue
+        key = (priority, end - start, -start)
+        if best is None or key > best[0]:
+            best = (key, start, end)
+    if best is None:
+        return None
+
+    _, start, end = best
+    span = doc[start:end]
+    answer = span.text.strip(".,;:!?\"'()")
+    if not answer:
+        return None
+    text = doc.text
+    statement = (text[:span.start_char] + BLANK + text[span.end_char:]).strip()
+    return {
+        'question_statement': statement,
+        'question_type': 'fill_in',
+        'options': [],
+        'answer': answer,
+        'context': text.strip(),
+    }
+
+
+class FillInGenerator:
+    """Batched spaCy analysis turned into one blanked-out question per sentence."""
+
+    def __init__(self):
+        # Owned by the model manager like the T5 models; reloaded after idle eviction
+        model_manager.register("spacy", _load_nlp)
+
+    @property
+    def nlp(self):
+        return model_manager.get("spacy")
+
+    def generate(self, sentences: List[str]) -> List[List[dict]]:
+        """One list (empty or with one question) per input sentence, in order."""
+        nlp = self.nlp
+        disabled = [name for name in nlp.pipe_names if name not in PIPES_USED]
+        questions = []
+        for doc in nlp.pipe(sentences, batch_size=PIPE_BATCH_SIZE, disable=disabled):
+            question = blank_sentence(doc)
+            questions.append([question] if question else [])
+        return questions
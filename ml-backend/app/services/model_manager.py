@@ -0,0 +1,244 @@
+"""
+model_manager.py - One owner for every loaded model, under a memory budget.
+
+Services register a loader for each model (the three Questgen models and the
+BART summarizer) and fetch the model with get() every time they use it. The
+manager loads a model on first use, records its memory footprint and last
+use, and unloads idle models:
+
+- when loading a model would push the resident total over
+  MODEL_MEMORY_BUDGET_MB, the least recently used idle models are evicted
+  first (the footprint measured at the previous load is used as the
+  estimate), and again after the load with the measured size
+- when MODEL_IDLE_SECONDS is set, a background sweeper unloads models that
+  have not been used for that long
+
+Models inside a pinned() block are never evicted, so a generate call always
+keeps the models it is using. An evicted model is reloaded on its next get().
+
+Usage:
+    model_manager.register("summarizer", load_bart)
+    with model_manager.pinned("summarizer"):
+        summary = model_manager.get("summarizer")(text)
+"""
+
+from __future__ import annotations
+
+import ctypes
+import gc
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .. import config
+from ..utils.metrics import MODEL_EVICTIONS, MODEL_LOADS, MODEL_RESIDENT_BYTES, process_rss_bytes
+
+
+@dataclass
+class _Entry:
+    name: str
+    loader: Callable[[], Any]
+    model: Any = None
+    bytes: int = 0  # footprint measured at the last load; kept after eviction as an estimate
+    last_used: float = 0.0
+    loads: int = 0
+    evictions: int = 0
+    pins: int = 0
+    load_lock: threading.Lock = field(default_factory=threading.Lock)
+
+    @property
+    def loaded(self) -> bool:
+        return self.model is not None
+
+
+def _tensor_bytes(obj: Any) -> int:
+    """Parameter and buffer bytes of torch modules on the object or one attribute level down."""
+    candidates = [obj, getattr(obj, "model", None)]
+    candidates.extend(vars(obj).values() if hasattr(obj, "__dict__") else ())
+    total, seen = 0, set()
+    for candidate in candidates:
+        if candidate is None or id(candidate) in seen or not callable(getattr(candidate, "parameters", None)):
+            continue
+        seen.add(id(candidate))
+        try:
+            tensors = list(candidate.parameters()) + list(candidate.buffers())
+            total += sum(t.numel() * t.element_size() for t in tensors)
+        except (AttributeError, TypeError):
+            continue
+    return total
+
+
+def _release_memory() -> None:
+    """Hand freed memory back to the OS so the budget reflects real RSS."""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass  # not glibc
+
+
+class ModelManager:
+    """Loads models on demand and evicts idle ones to stay within a memory budget."""
+
+    def __init__(self, budget_bytes: int = 0, idle_seconds: float = 0):
+        self.budget_bytes = budget_bytes
+        self.idle_seconds = idle_seconds
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.RLock()
+        self._sweeper: Optional[threading.Thread] = None
+
+    # -------------------------------------------------------------------------
+    # Registration and access
+    # -------------------------------------------------------------------------
+    def register(self, name: str, loader: Callable[[], Any]) -> None:
+        """Declare how to load a model; re-registering keeps an already loaded model."""
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                self._entries[name] = _Entry(name, loader)
+            else:
+                entry.loader = loader
+
+    def is_loaded(self, name: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(name)
+            return entry is not None and entry.loaded
+
+    def get(self, name: str) -> Any:
+        """The loaded model, loading it (and making room for it) if needed."""
+        entry = self._entries[name]
+        with self._lock:
+            if entry.loaded:
+                entry.last_used = time.monotonic()
+                return entry.model
+
+        with entry.load_lock:
+            # Checked and returned under one acquisition, so the sweeper cannot evict in between
+            with self._lock:
+                if entry.loaded:
+                    entry.last_used = time.monotonic()
+                    return entry.model
+            return self._load(entry)
+
+    @contextmanager
+    def pinned(self, *names: str) -> Iterator[None]:
+        """Keep the named models from being evicted inside the block."""
+        with self._lock:
+            for name in names:
+                self._entries[name].pins += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                for name in names:
+                    self._entries[name].pins -= 1
+
+    # -------------------------------------------------------------------------
+    # Loading and eviction
+    # -------------------------------------------------------------------------
+    def _load(self, entry: _Entry) -> Any:
+        if self.budget_bytes and entry.bytes:
+            with self._lock:
+                self._evict_for(self.budget_bytes - entry.bytes, keep=entry.name)
+
+        started, rss_before = time.perf_counter(), process_rss_bytes()
+        model = entry.loader()
+        footprint = max(process_rss_bytes() - rss_before, _tensor_bytes(model))
+
+        with self._lock:
+            entry.model, entry.bytes = model, footprint
+            entry.last_used = time.monotonic()
+            entry.loads += 1
+            MODEL_LOADS.inc(model=entry.name)
+            MODEL_RESIDENT_BYTES.set(footprint, model=entry.name)
+            print(f"📥 Loaded model {entry.name} ({footprint / 1_048_576:,.0f} MiB) in {time.perf_counter() - started:.1f}s")
+            if self.budget_bytes:
+                self._evict_for(self.budget_bytes, keep=entry.name)
+            return model
+
+    def _evict_for(self, limit: int, keep: str) -> None:
+        """Evict idle models, least recently used first, until the resident total is within limit."""
+        candidates = sorted(
+            (e for e in self._entries.values() if e.loaded and e.pins == 0 and e.name != keep),
+            key=lambda e: e.last_used,
+        )
+        for entry in candidates:
+            if self.resident_bytes() <= limit:
+                return
+            self._evict(entry, reason="budget")
+        if self.resident_bytes() > limit:
+            print(f"⚠️ Model memory {self.resident_bytes() / 1_048_576:,.0f} MiB is over budget; remaining models are in use")
+
+    def _evict(self, entry: _Entry, reason: str) -> None:
+        entry.model = None
+        entry.evictions += 1
+        MODEL_EVICTIONS.inc(model=entry.name, reason=reason)
+        MODEL_RESIDENT_BYTES.set(0, model=entry.name)
+        print(f"📤 Evicted model {entry.name} ({reason})")
+        _release_memory()
+
+    def evict_idle(self, idle_seconds: Optional[float] = None) -> List[str]:
+        """Unload every unpinned model unused for idle_seconds (default MODEL_IDLE_SECONDS)."""
+        idle_seconds = self.idle_seconds if idle_seconds is None else idle_seconds
+        now, evicted = time.monotonic(), []
+        with self._lock:
+            for entry in self._entries.values():
+                if entry.loaded and entry.pins == 0 and now - entry.last_used >= idle_seconds:
+                    self._evict(entry, reason="idle")
+                    evicted.append(entry.name)
+        return evicted
+
+    def start_idle_sweeper(self) -> None:
+        """Evict idle models in the background; does nothing when MODEL_IDLE_SECONDS is 0."""
+        if not self.idle_seconds or self._sweeper is not None:
+            return
+
+        def sweep():
+            while True:
+                time.sleep(max(1.0, min(60.0, self.idle_seconds / 4)))
+                self.evict_idle()
+
+        self._sweeper = threading.Thread(target=sweep, name="model-idle-sweeper", daemon=True)
+        self._sweeper.start()
+
+    # -------------------------------------------------------------------------
+    # Diagnostics
+    # -------------------------------------------------------------------------
+    def resident_bytes(self) -> int:
+        with self._lock:
+            return sum(e.bytes for e in self._entries.values() if e.loaded)
+
+    def state(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            models = [
+                {
+                    "name": e.name,
+                    "loaded": e.loaded,
+                    "bytes": e.bytes,
+                    "idle_seconds": round(now - e.last_used, 1) if e.last_used else None,
+                    "loads": e.loads,
+                    "evictions": e.evictions,
+                    "in_use": e.pins > 0,
+                }
+                for e in self._entries.values()
+            ]
+            return {
+                "budget_bytes": self.budget_bytes or None,
+                "idle_eviction_seconds": self.idle_seconds or None,
+                "resident_bytes": self.resident_bytes(),
+                "process_rss_bytes": process_rss_bytes(),
+                "models": models,
+            }
+
+
+model_manager = ModelManager(
+    budget_bytes=int(config.MODEL_MEMORY_BUDGET_MB * 1_048_576),
+    idle_seconds=config.MODEL_IDLE_SECONDS,
+)
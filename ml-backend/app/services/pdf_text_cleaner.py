@@ -10,6 +10,7 @@ Features:
 ✓ Comprehensive Diagnostics & Logging  
 ✓ Customizable for Different Domains (STEM, Legal, Medical)  
 ✓ Optimized for MCQ Generation Pipelines  
+✓ Linear Time in Input Size, Even on Hostile Text (benchmarks/adversarial_cleaning.py)  
 
 Usage:
     from pdf_text_cleaner import PDFTextCleaner, ProcessingMode
@@ -23,23 +24,27 @@ Usage:
 
 from __future__ import annotations
 
+import os
 import re
 import html
 import logging
 import hashlib
+import importlib.util
 import unicodedata
 from collections import Counter
 from dataclasses import dataclass
 from enum import Enum, auto
 from typing import Dict, List, Optional, Tuple, Callable
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 
-try:
-    import nltk
-    from nltk.tokenize import sent_tokenize
-    NLTK_AVAILABLE = True
-except ImportError:
-    NLTK_AVAILABLE = False
+from ..artifacts import OFFLINE_ENV
+from ..utils.cancellation import check_cancelled
+from ..utils.metrics import CACHE_LOOKUPS
+from ..utils.segmentation import SegmentedText, segment
+from ..utils.topology import current_topology
+
+# NLTK itself is imported on first use; only check that it is installed
+NLTK_AVAILABLE = importlib.util.find_spec("nltk") is not None
 
 # -----------------------------------------------------------------------------
 # CONSTANTS & CONFIGURATION
@@ -66,18 +71,36 @@ DEFAULT_CONFIG = {
     "processing_mode": ProcessingMode.ACADEMIC,
 }
 
+# Protected in this order; (opener, closer, minimum characters between them)
+EQUATION_DELIMITERS = [
+    ("$", "$", 1),                                # Inline $...$
+    ("\\(", "\\)", 0),                            # \(...\)
+    ("\\[", "\\]", 0),                            # \[...\]
+    ("\\begin{equation}", "\\end{equation}", 0),  # LaTeX environments
+]
+EQUATION_PLACEHOLDER = re.compile(r'<<EQ_\d+>>')
+
 # -----------------------------------------------------------------------------
 # LOGGING SETUP
 # -----------------------------------------------------------------------------
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("pdf_cleaning.log"),
-        logging.StreamHandler(),
-    ],
-)
 logger = logging.getLogger("PDFTextCleaner")
+_logging_configured = False
+
+
+def configure_logging():
+    """Attach the file and console handlers once, when the first cleaner is created."""
+    global _logging_configured
+    if _logging_configured:
+        return
+    _logging_configured = True
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        handlers=[
+            logging.FileHandler("pdf_cleaning.log", delay=True),
+            logging.StreamHandler(),
+        ],
+    )
 
 # -----------------------------------------------------------------------------
 # DATA STRUCTURES
@@ -109,21 +132,27 @@ class PDFTextCleaner:
         self.config = {**DEFAULT_CONFIG, **(config or {})}
         self._pattern_cache: Dict[str, re.Pattern] = {}
         self._common_headers_cache: Dict[str, set] = {}
-        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.executor = ThreadPoolExecutor(max_workers=current_topology().cleaner_workers)
+        configure_logging()
 
-        # Initialize NLTK if available
-        if NLTK_AVAILABLE:
-            self._ensure_nltk_data()
+        # NLTK data is checked on the first clean, not at construction
+        self._nltk_checked = False
         
         # Mode-specific adjustments
         self._setup_processing_mode()
 
     def _ensure_nltk_data(self):
         """Ensure required NLTK data is downloaded."""
-        for pkg in ["punkt", "stopwords"]:
+        import nltk
+
+        # punkt_tab is what PunktTokenizer loads on nltk >= 3.8.2; punkt serves older versions
+        for pkg, kind in [("punkt", "tokenizers"), ("punkt_tab", "tokenizers"), ("stopwords", "corpora")]:
             try:
-                nltk.data.find(f"tokenizers/{pkg}" if pkg == "punkt" else f"corpora/{pkg}")
+                nltk.data.find(f"{kind}/{pkg}")
             except LookupError:
+                if os.getenv(OFFLINE_ENV):
+                    logger.warning(f"NLTK package {pkg} missing from the offline model cache")
+                    continue
                 nltk.download(pkg, quiet=True)
 
     def _setup_processing_mode(self):
@@ -149,7 +178,31 @@ class PDFTextCleaner:
         Returns:
             Tuple of (cleaned_text, diagnostics)
         """
+        document, diagnostics = self.clean_document(raw_text, **overrides)
         config = {**self.config, **overrides}
+        if config["sentence_chunking"] and not diagnostics.processing_errors:
+            cleaned_text = self._chunk_sentences(document, config["max_chunk_size"])
+            diagnostics.cleaned_length = len(cleaned_text)
+            return cleaned_text, diagnostics
+        return document.text, diagnostics
+
+    def clean_document(
+        self, raw_text: str, **overrides
+    ) -> Tuple[SegmentedText, CleaningDiagnostics]:
+        """
+        Clean PDF-extracted text and segment it into sentences once.
+
+        The returned SegmentedText is what the question generator consumes;
+        sentence chunking is not applied, since its spans replace it.
+
+        Returns:
+            Tuple of (segmented_text, diagnostics)
+        """
+        config = {**self.config, **overrides, "sentence_chunking": False}
+        check_cancelled("clean")
+        if NLTK_AVAILABLE and not self._nltk_checked:
+            self._ensure_nltk_data()
+            self._nltk_checked = True
         diagnostics = CleaningDiagnostics(
             original_length=len(raw_text),
             cleaned_length=0,
@@ -162,14 +215,15 @@ class PDFTextCleaner:
                 cleaned_text = self._process_text_chunk(raw_text, config, diagnostics)
             
             diagnostics.cleaned_length = len(cleaned_text)
-            self._finalize_diagnostics(cleaned_text, diagnostics)
+            document = segment(cleaned_text)
+            self._finalize_diagnostics(document, diagnostics)
             
-            return cleaned_text, diagnostics
+            return document, diagnostics
             
         except Exception as e:
             logger.error(f"Critical cleaning failure: {str(e)}", exc_info=True)
             diagnostics.processing_errors += 1
-            return raw_text, diagnostics
+            return segment(raw_text), diagnostics
 
     # -------------------------------------------------------------------------
     # CORE PROCESSING PIPELINE
@@ -177,15 +231,18 @@ class PDFTextCleaner:
     def _process_large_text(self, text: str, config: Dict) -> str:
         """Process large documents in parallel chunks."""
         chunks = self._split_text(text, config["max_text_length"])
-        futures = []
-        
-        with ThreadPoolExecutor(max_workers=4) as executor:
-            for chunk in chunks:
-                future = executor.submit(self._process_text_chunk, chunk, config)
-                futures.append(future)
-            
-            results = [f.result() for f in as_completed(futures)]
-            return "\n".join(results)
+        futures = [self.executor.submit(self._process_text_chunk, chunk, config) for chunk in chunks]
+        # Joined in submission order so the document keeps its original sequence
+        parts = []
+        try:
+            for future in futures:
+                parts.append(future.result())
+                check_cancelled("clean")
+        finally:
+            # Chunks not started yet are dropped when the request was cancelled
+            for future in futures:
+                future.cancel()
+        return "\n".join(parts)
 
     def _process_text_chunk(
         self, text: str, config: Dict, diagnostics: Optional[CleaningDiagnostics] = None
@@ -213,6 +270,10 @@ class PDFTextCleaner:
     # -------------------------------------------------------------------------
     # PROCESSING STAGE IMPLEMENTATIONS
     # -------------------------------------------------------------------------
+    # Every stage is linear in the text length. Patterns anchored at line
+    # starts only match horizontal whitespace ([^\S\n]): a \s* there lets each
+    # of n blank lines rescan all the lines after it. Other quantifiers are
+    # bounded, or can only start once per run of the characters they repeat.
     def _normalize_encoding(self, text: str) -> str:
         """Normalize Unicode, HTML entities, and control characters."""
         text = unicodedata.normalize("NFKC", text)
@@ -226,7 +287,10 @@ class PDFTextCleaner:
         lines = text.splitlines()
         sig = hashlib.md5(text.encode()).hexdigest()
         
-        if sig not in self._common_headers_cache:
+        if sig in self._common_headers_cache:
+            CACHE_LOOKUPS.inc(cache="common_headers", result="hit")
+        else:
+            CACHE_LOOKUPS.inc(cache="common_headers", result="miss")
             counts = Counter(line.strip() for line in lines if line.strip())
             common = {
                 line for line, count in counts.items()
@@ -240,11 +304,11 @@ class PDFTextCleaner:
         # Remove other structural artifacts
         text = "\n".join(kept_lines)
         patterns = [
-            (r'^\s*\d+\s*$', re.MULTILINE),  # Page numbers
-            (r'\.{3,}\s*\d+\s*$', re.MULTILINE),  # TOC entries
-            (r'^\s*\d+/\d+\s*$', re.MULTILINE),  # Page X/Y
-            (r'^\s*©.*\d{4}\s*$', re.MULTILINE),  # Copyright
-            (r'^\s*confidential\s*$', re.MULTILINE | re.IGNORECASE),
+            (r'^[^\S\n]*\d+[^\S\n]*$', re.MULTILINE),  # Page numbers
+            (r'(?<!\.)\.{3,}\s*\d+\s*$', re.MULTILINE),  # TOC entries, matched from the first dot only
+            (r'^[^\S\n]*\d+/\d+[^\S\n]*$', re.MULTILINE),  # Page X/Y
+            (r'^[^\S\n]*©.*\d{4}[^\S\n]*$', re.MULTILINE),  # Copyright
+            (r'^[^\S\n]*confidential[^\S\n]*$', re.MULTILINE | re.IGNORECASE),
         ]
         
         for pat, flags in patterns:
@@ -312,38 +376,48 @@ class PDFTextCleaner:
         return "\n\n".join(paragraphs)
 
     def _apply_final_formatting(self, text: str, config: Dict) -> str:
-        """Apply final formatting and optional sentence chunking."""
+        """Apply final whitespace formatting (sentence chunking happens after segmentation)."""
         # Normalize whitespace
         text = re.sub(r'[ \t]+', ' ', text)
         text = re.sub(r'\n{3,}', '\n\n', text)
         
-        # Optional sentence chunking
-        if config["sentence_chunking"]:
-            text = self._chunk_sentences(text, config["max_chunk_size"])
-        
         return text
 
     # -------------------------------------------------------------------------
     # SPECIALIZED CLEANING COMPONENTS
     # -------------------------------------------------------------------------
     def _protect_equations(self, text: str) -> Tuple[str, Dict[str, str]]:
-        """Protect equations with placeholders before destructive operations."""
-        eq_patterns = [
-            r'\$[^$]+\$',       # Inline $...$
-            r'\\\(.*?\\\)',      # \(...\)
-            r'\\\[.*?\\\]',      # \[...\]
-            r'\\begin\{equation\}.*?\\end\{equation\}',  # LaTeX environments
-        ]
-        
+        """
+        Protect equations with placeholders before destructive operations.
+
+        One forward scan per delimiter pair. A lazy DOTALL pattern such as
+        \\(.*?\\) rescans to the end of the text from every opener that is
+        never closed, which is quadratic in the number of openers.
+        """
         eq_map = {}
-        def replacer(match: re.Match) -> str:
-            key = f"<<EQ_{len(eq_map)}>>"
-            eq_map[key] = match.group(0)
-            return key
-        
-        for pattern in eq_patterns:
-            text = re.sub(pattern, replacer, text, flags=re.DOTALL)
-            
+        for opener, closer, min_inner in EQUATION_DELIMITERS:
+            parts, position = [], 0
+            while True:
+                start = text.find(opener, position)
+                if start < 0:
+                    break
+                end = text.find(closer, start + len(opener))
+                if end < 0:
+                    break  # Nothing closes this opener, so nothing closes a later one either
+                if end - start - len(opener) < min_inner:
+                    # "$$" opens nothing; the second "$" may open the next equation
+                    parts.append(text[position:start + 1])
+                    position = start + 1
+                    continue
+                end += len(closer)
+                key = f"<<EQ_{len(eq_map)}>>"
+                # Equations found by earlier delimiters are expanded here, so placeholders never nest
+                eq_map[key] = self._restore_protected_content(text[start:end], eq_map)
+                parts.extend((text[position:start], key))
+                position = end
+            parts.append(text[position:])
+            text = "".join(parts)
+
         return text, eq_map
 
     def _remove_citations(self, text: str) -> Tuple[str, int]:
@@ -364,7 +438,7 @@ class PDFTextCleaner:
     def _fix_hyphenation(self, text: str) -> str:
         """Fix hyphenated words broken across lines."""
         text = text.replace("\u00AD", "")  # Remove soft hyphens
-        text = re.sub(r'(\w)-\s*\n\s*(\w)', r'\1\2', text)  # Rejoin split words
+        text = re.sub(r'(\w)-[^\S\n]*\n\s*(\w)', r'\1\2', text)  # Rejoin split words
         text = re.sub(r'-{2,}', '—', text)  # Convert multiple hyphens to em-dash
         return text
 
@@ -376,8 +450,8 @@ class PDFTextCleaner:
         """Remove various bullet point formats."""
         patterns = [
             r'^[\u2022•▪\-*+]\s+',  # Bullet characters
-            r'^\s*\d+\.\s+',        # Numbered lists
-            r'^\s*[a-z]\.\s+',      # Lettered lists
+            r'^[^\S\n]*\d+\.\s+',  # Numbered lists
+            r'^[^\S\n]*[a-z]\.\s+',  # Lettered lists
         ]
         
         for pattern in patterns:
@@ -386,31 +460,18 @@ class PDFTextCleaner:
         return text
 
     def _restore_protected_content(self, text: str, content_map: Dict[str, str]) -> str:
-        """Restore protected content (equations, tables, etc.) after cleaning."""
-        for placeholder, original in content_map.items():
-            text = text.replace(placeholder, original)
-        return text
+        """Restore protected content (equations, tables, etc.) after cleaning, in one pass."""
+        if not content_map:
+            return text
+        return EQUATION_PLACEHOLDER.sub(lambda match: content_map.get(match.group(0), match.group(0)), text)
 
-    def _chunk_sentences(self, text: str, chunk_size: int) -> str:
+    def _chunk_sentences(self, document: SegmentedText, chunk_size: int) -> str:
         """Group sentences into meaningful chunks."""
         try:
-            sentences = sent_tokenize(text) if NLTK_AVAILABLE else re.split(r'(?<=[.!?])\s+', text)
-            chunks = []
-            current_chunk = []
-            
-            for sent in sentences:
-                current_chunk.append(sent)
-                if len(current_chunk) >= chunk_size:
-                    chunks.append(" ".join(current_chunk))
-                    current_chunk = []
-            
-            if current_chunk:
-                chunks.append(" ".join(current_chunk))
-                
-            return "\n\n".join(chunks)
+            return document.chunks(chunk_size)
         except Exception:
             logger.warning("Sentence chunking failed, using paragraph fallback")
-            return text
+            return document.text
 
     def _split_text(self, text: str, max_len: int) -> List[str]:
         """Split text into chunks while preserving paragraphs."""
@@ -434,13 +495,10 @@ class PDFTextCleaner:
             
         return chunks
 
-    def _finalize_diagnostics(self, text: str, diagnostics: CleaningDiagnostics):
-        """Calculate final diagnostic metrics."""
-        words = text.split()
-        sentences = sent_tokenize(text) if NLTK_AVAILABLE else re.split(r'(?<=[.!?])\s+', text)
-        
-        diagnostics.reading_time_min = len(words) / 200.0  # 200 wpm
-        diagnostics.avg_sentence_length = sum(len(s.split()) for s in sentences) / max(1, len(sentences))
+    def _finalize_diagnostics(self, document: SegmentedText, diagnostics: CleaningDiagnostics):
+        """Calculate final diagnostic metrics from the already segmented text."""
+        diagnostics.reading_time_min = document.word_count() / 200.0  # 200 wpm
+        diagnostics.avg_sentence_length = document.avg_sentence_length()
 
 
 # Example usage when run directly
@@ -0,0 +1,250 @@
+"""
+planner.py - Choose how each document is processed before generation.
+
+The generator reads sentence_window(total_questions) candidate sentences per
+run, starting from the top of the document. Four ways to feed it:
+
+    full         the cleaned document as is
+    sections     evenly spaced windows of consecutive sentences across the document
+    extractive   the most salient sentences (document term frequency), in document order
+    abstractive  a BART summary of the document's first 1024 tokens
+
+plan_document() estimates every path's latency and benefit from the word,
+token and sentence counts of the extracted text and the number of questions
+requested, then picks the path with the highest benefit that fits the latency
+target. When none fits, it picks the fastest one. On equal benefit, the
+earlier path in the list above wins, because it changes the document least.
+
+    benefit = sufficiency x coverage x fidelity
+
+- sufficiency: candidate sentences available / sentences the generator wants
+- coverage: the share of the document those sentences are drawn from
+- fidelity: 1 for the author's sentences in context, less for sentences lifted
+  out of context (extractive) and for paraphrases (abstractive)
+
+The cost constants are rough estimates for the production models on a
+multi-core CPU, not measurements: benchmarks/run.py only runs stub models.
+Only their ratios matter for choosing a path, but the scheduler charges them
+as seconds. To calibrate them on the serving hardware, divide the median
+latency of `python -m benchmarks.tiers --backend real` by the sentences
+the generator reads (sentence_window) for GENERATE_SECONDS_PER_SENTENCE, and
+time Summarizer.summarize on a 1024-token input, cold and warm, for the
+summarizer constants.
+
+Usage:
+    plan = plan_document(text, total_questions=10, page_count=12)
+    document = order_sentences(cleaned_document, plan)
+    seconds = job_cost(document, total_questions=10, plan=plan)    # for the scheduler
+    seconds = summarize_cost(plan)                                  # the summary's own slot
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from dataclasses import asdict, dataclass
+from typing import List, Optional
+
+from .. import config
+from ..utils.decoding import active_tier
+from ..utils.segmentation import SegmentedText
+from .questgen_service import is_candidate_sentence, sentence_window
+
+# Estimates, see the module docstring. Seconds per candidate sentence run through the question models
+GENERATE_SECONDS_PER_SENTENCE = 1.5
+# One BART call on a full 1024-token input, and loading BART when it is not resident
+SUMMARIZE_SECONDS = 12.0
+SUMMARIZER_LOAD_SECONDS = 20.0
+SUMMARIZER_INPUT_TOKENS = 1024
+CLEAN_WORDS_PER_SECOND = 300_000
+SELECT_WORDS_PER_SECOND = 500_000
+
+TOKENS_PER_WORD = 1.3
+WORDS_PER_SUMMARY_SENTENCE = 20
+# Sentences read per window on the sections path
+SECTION_SENTENCES = 5
+# Sentences selected per sentence the generator reads; questions are dropped as duplicates or fail to decode
+SELECTION_HEADROOM = 1.5
+# Candidate sentences per section when the document has no page count
+SENTENCES_PER_SECTION = 40
+
+FIDELITY = {"full": 1.0, "sections": 1.0, "extractive": 0.95, "abstractive": 0.85}
+
+_SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+_WORD = re.compile(r"[a-z][a-z'-]{3,}")
+
+
+@dataclass
+class DocumentFeatures:
+    words: int
+    tokens: int
+    sentences: int
+    candidate_sentences: int
+    sections: int
+
+
+@dataclass
+class PathEstimate:
+    path: str
+    latency_s: float
+    benefit: float
+    candidate_sentences: int
+    coverage: float
+    within_target: bool = True
+    summarize_s: float = 0.0
+
+
+def document_features(text: str, page_count: Optional[int] = None) -> DocumentFeatures:
+    """Counts from a punctuation split; cheap enough to run before cleaning."""
+    sentences = [s for s in _SENTENCE_BOUNDARY.split(text) if s.strip()]
+    candidates = sum(1 for s in sentences if is_candidate_sentence(s))
+    words = len(text.split())
+    return DocumentFeatures(
+        words=words,
+        tokens=int(words * TOKENS_PER_WORD),
+        sentences=len(sentences),
+        candidate_sentences=candidates,
+        sections=page_count or max(1, candidates // SENTENCES_PER_SECTION),
+    )
+
+
+def _estimates(features: DocumentFeatures, total_questions: int, summarizer_loaded: bool) -> List[PathEstimate]:
+    needed = sentence_window(total_questions)
+    budget = math.ceil(needed * SELECTION_HEADROOM)
+    available = features.candidate_sentences
+    clean_s = features.words / CLEAN_WORDS_PER_SECOND
+
+    def estimate(path: str, sentences: int, coverage: float, latency_s: float, summarize_s: float = 0.0) -> PathEstimate:
+        sufficiency = min(1.0, sentences / needed)
+        latency_s += summarize_s + min(sentences, needed) * GENERATE_SECONDS_PER_SENTENCE
+        return PathEstimate(path, round(latency_s, 1), round(sufficiency * coverage * FIDELITY[path], 3),
+                            sentences, round(coverage, 3), summarize_s=round(summarize_s, 1))
+
+    windows = math.ceil(budget / SECTION_SENTENCES)
+    summarized_words = min(features.words, SUMMARIZER_INPUT_TOKENS / TOKENS_PER_WORD)
+    summary_tokens = min(active_tier().summary_max_tokens, max(100, summarized_words * 0.3))
+    summary_sentences = int(summary_tokens / TOKENS_PER_WORD / WORDS_PER_SUMMARY_SENTENCE)
+    summarize_s = SUMMARIZE_SECONDS * summarized_words * TOKENS_PER_WORD / SUMMARIZER_INPUT_TOKENS
+    if not summarizer_loaded:
+        summarize_s += SUMMARIZER_LOAD_SECONDS
+
+    return [
+        # The generator stops after `needed` sentences from the top
+        estimate("full", available, min(1.0, needed / available) if available else 0.0, clean_s),
+        estimate("sections", min(available, windows * SECTION_SENTENCES),
+                 min(1.0, windows / features.sections) if available else 0.0, clean_s),
+        estimate("extractive", min(available, budget), 1.0 if available else 0.0,
+                 clean_s + features.words / SELECT_WORDS_PER_SECOND),
+        estimate("abstractive", summary_sentences, summarized_words / max(1, features.words),
+                 summary_tokens / TOKENS_PER_WORD / CLEAN_WORDS_PER_SECOND, summarize_s),
+    ]
+
+
+def plan_document(
+    text: str,
+    total_questions: int,
+    page_count: Optional[int] = None,
+    latency_target_s: Optional[float] = None,
+    allow_abstractive: bool = True,
+    summarizer_loaded: bool = False,
+) -> dict:
+    """The chosen path with the features and per-path estimates behind it (JSON-ready)."""
+    target = config.PIPELINE_LATENCY_TARGET_S if latency_target_s is None else latency_target_s
+    features = document_features(text, page_count)
+    estimates = _estimates(features, total_questions, summarizer_loaded)
+    if not allow_abstractive:
+        estimates = [e for e in estimates if e.path != "abstractive"]
+    for estimate in estimates:
+        estimate.within_target = estimate.latency_s <= target
+
+    feasible = [e for e in estimates if e.within_target]
+    if feasible:
+        # max() keeps the first of equal benefits, i.e. the least invasive path
+        chosen = max(feasible, key=lambda e: e.benefit)
+        reason = f"highest benefit within {target:g}s"
+    else:
+        chosen = min(estimates, key=lambda e: e.latency_s)
+        reason = f"no path fits {target:g}s; fastest"
+
+    print(f"🧭 Plan: {chosen.path} ({reason}; ~{chosen.latency_s:g}s, benefit {chosen.benefit:g})")
+    return {
+        "path": chosen.path,
+        "reason": reason,
+        "latency_target_s": target,
+        "sentence_budget": math.ceil(sentence_window(total_questions) * SELECTION_HEADROOM),
+        "document": asdict(features),
+        "estimates": [asdict(e) for e in estimates],
+    }
+
+
+def job_cost(document: SegmentedText, total_questions: int, plan: Optional[dict] = None) -> float:
+    """
+    Estimated pipeline seconds of a generation request, for the scheduler: the
+    planned path's estimate when there is a plan (it accounts for the page count),
+    otherwise cleaning plus the sentences the generator reads. A summary is not
+    included; it runs in a slot of its own, see summarize_cost().
+    """
+    if plan:
+        return _planned_cost(plan) - summarize_cost(plan)
+    return generation_cost(len(document), total_questions, document.word_count())
+
+
+def text_cost(text: str, total_questions: int, plan: Optional[dict] = None) -> float:
+    """Seconds of the whole pipeline, summary included, for text that has not been cleaned and segmented yet."""
+    if plan:
+        return _planned_cost(plan)
+    features = document_features(text)
+    return generation_cost(features.candidate_sentences, total_questions, features.words)
+
+
+def summarize_cost(plan: Optional[dict]) -> float:
+    """Estimated summarizer seconds of the planned path, for the scheduler (0 unless abstractive)."""
+    if not plan:
+        return 0.0
+    # Plans stored before the estimate had summarize_s count as no summary
+    return next(e.get("summarize_s", 0.0) for e in plan["estimates"] if e["path"] == plan["path"])
+
+
+def _planned_cost(plan: dict) -> float:
+    return next(e["latency_s"] for e in plan["estimates"] if e["path"] == plan["path"])
+
+
+def generation_cost(sentences: int, total_questions: int, words: int = 0) -> float:
+    """Seconds to clean `words` words and generate from up to `sentences` sentences."""
+    return words / CLEAN_WORDS_PER_SECOND + min(sentences, sentence_window(total_questions)) * GENERATE_SECONDS_PER_SENTENCE
+
+
+def order_sentences(document: SegmentedText, plan: Optional[dict]) -> SegmentedText:
+    """
+    The cleaned document with the sentences the plan's path selects moved to
+    the front. Generation reads from the top, so a run uses the selection and
+    "generate more" continues with the remaining sentences in document order.
+    """
+    if not plan or plan["path"] not in ("sections", "extractive"):
+        return document
+    spans = document.spans
+    candidates = [i for i, sentence in enumerate(document.sentences()) if is_candidate_sentence(sentence)]
+    budget = plan["sentence_budget"]
+    if len(candidates) <= budget:
+        return document
+
+    if plan["path"] == "sections":
+        windows = math.ceil(budget / SECTION_SENTENCES)
+        stride = (len(candidates) - SECTION_SENTENCES) / max(1, windows - 1)
+        chosen = []
+        for window in range(windows):
+            start = round(window * stride)
+            chosen.extend(c for c in candidates[start:start + SECTION_SENTENCES] if not chosen or c > chosen[-1])
+    else:
+        sentences = [document.text[spans[i][0]:spans[i][1]] for i in candidates]
+        words = [_WORD.findall(sentence.lower()) for sentence in sentences]
+        frequency = Counter(word for sentence_words in words for word in sentence_words)
+        # Mean log frequency of content words: sentences about the document's recurring terms
+        scores = [sum(math.log1p(frequency[w]) for w in ws) / max(1, len(ws)) for ws in words]
+        top = sorted(range(len(candidates)), key=lambda k: scores[k], reverse=True)[:budget]
+        chosen = [candidates[k] for k in sorted(top)]
+
+    selected = set(chosen)
+    rest = [i for i in range(len(spans)) if i not in selected]
+    return SegmentedText(document.text, [spans[i] for i in chosen + rest])
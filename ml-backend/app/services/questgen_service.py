@@ -1,228 +1,542 @@
-import nltk
-import spacy
-from Questgen import main
+import functools
 import random
 import re
+import math
+import os
+import threading
+from collections import defaultdict
+from typing import Union
 
-# Monkey-patch for spacy.load() to fix incompatibility with the old Questgen library
-original_spacy_load = spacy.load
-def patched_spacy_load(*args, **kwargs):
-    kwargs.pop('quiet', None)
-    return original_spacy_load(*args, **kwargs)
-spacy.load = patched_spacy_load
+from .. import config
+from ..artifacts import OFFLINE_ENV
+from ..distractors import Sense2VecView, load_index
+from ..utils.decoding import install_generate_overrides
+from ..utils.dedup import NearDuplicateIndex
+from ..utils.cancellation import RequestCancelled, check_cancelled
+from ..utils.metrics import MODEL_CALLS, QUESTION_YIELD, StageTimings
+from ..utils.scheduling import checkpoint
+from ..utils.segmentation import SegmentedText, segment
+from ..utils.topology import configure_torch
+from .fill_in import FillInGenerator
+from .model_manager import model_manager
 
-# Helper to ensure NLTK data is downloaded on startup
+QUESTION_TYPES = ("mcq", "true_false", "fill_in")
+QUESTGEN_MODELS = ("qgen", "boolq", "spacy")
+
+# Document-level MCQ path: sentences considered for keyphrase extraction, and
+# keywords decoded together in one T5 generate call
+KEYWORD_CONTEXT_SENTENCES = 300
+MCQ_DECODE_BATCH = 8
+# Fill-in questions come from spaCy, not T5: sentences analysed per nlp.pipe batch
+FILL_IN_BATCH = 64
+
+
+def sentence_window(total_questions: int) -> int:
+    """Candidate sentences one generation run reads for a request of this size."""
+    return max(total_questions * 3, 15)
+
+
+def is_candidate_sentence(sentence: str) -> bool:
+    """A reasonable length for question generation and not itself a question."""
+    words = len(sentence.split())
+    return 8 < words < 100 and '?' not in sentence
+
+# torch, transformers, spaCy, NLTK and Questgen are only imported when the
+# models are first loaded (get_questgen), so importing this module is cheap.
+
+def patch_spacy_load():
+    """Monkey-patch spacy.load() to fix incompatibility with the old Questgen library"""
+    import spacy
+
+    if getattr(spacy.load, '_drops_quiet', False):
+        return
+    original_spacy_load = spacy.load
+    def patched_spacy_load(*args, **kwargs):
+        kwargs.pop('quiet', None)
+        return original_spacy_load(*args, **kwargs)
+    patched_spacy_load._drops_quiet = True
+    spacy.load = patched_spacy_load
+
+# Helper to ensure NLTK data is downloaded before the models load
 def download_nltk_package(package_name: str, package_type: str):
+    import nltk
+
     try:
         nltk.data.find(f'{package_type}/{package_name}')
     except LookupError:
+        if os.getenv(OFFLINE_ENV):
+            print(f"⚠️ NLTK package {package_name} is not in the model cache; rerun `python -m app.artifacts prefetch`")
+            return
         nltk.download(package_name, quiet=True)
 
-# Call the helper for all needed NLTK packages
-download_nltk_package('stopwords', 'corpora')
-download_nltk_package('punkt', 'tokenizers')
 
-def get_all_sentences(text: str) -> list[str]:
+def get_all_sentences(text: Union[str, SegmentedText]) -> list[str]:
     """
     Splits a block of text into sentences and filters them for quality.
+    Already segmented text (from PDFTextCleaner.clean_document) is not re-tokenized.
     """
-    sentences = nltk.sent_tokenize(text)
+    document = text if isinstance(text, SegmentedText) else segment(text)
     good_sentences = []
-    for sentence in sentences:
-        # Filter for sentences that are a reasonable length and not questions
-        if len(sentence.split()) > 8 and len(sentence.split()) < 100 and '?' not in sentence:
+    for sentence in document.sentences():
+        if is_candidate_sentence(sentence):
             good_sentences.append(sentence.strip())
     return good_sentences
 
 
+def _dedup_answer(question: dict):
+    """The answer that tells near-duplicate statements apart; True/False answers flip at random, so none."""
+    return None if question.get('question_type') == 'true_false' else question.get('answer')
+
+
+def deduplicate_questions(questions: list) -> list:
+    """Drop questions that are near duplicates of an earlier one."""
+    index = NearDuplicateIndex()
+    return [q for q in questions if index.add(q['question_statement'], _dedup_answer(q))]
+
+
+class QuestionPool:
+    """
+    Distinct questions of one type. Each incoming question is checked against a
+    near-duplicate index, so the pool only holds usable questions and generation
+    can stop as soon as it has enough of them.
+    """
+
+    def __init__(self, target: int, overgeneration: float = 1.0, slack: int = 0, index: NearDuplicateIndex = None):
+        self.target = target
+        self.capacity = math.ceil(target * overgeneration) + (slack if target else 0)
+        self.questions = []
+        self.rejected = 0
+        # A session passes its own index so questions from earlier requests count as seen
+        self._index = index if index is not None else NearDuplicateIndex()
+
+    @property
+    def full(self) -> bool:
+        return len(self.questions) >= self.capacity
+
+    @property
+    def missing(self) -> int:
+        return max(0, self.capacity - len(self.questions))
+
+    def add(self, questions: list) -> None:
+        for question in questions:
+            if self._index.add(question['question_statement'], _dedup_answer(question)):
+                self.questions.append(question)
+            else:
+                self.rejected += 1
+
+
+def _with_decoding_tiers(component):
+    # Requests pick a decoding tier; it reaches Questgen's fixed generate() calls through this wrapper
+    install_generate_overrides(getattr(component, 'model', None))
+    return component
+
+
+_sense2vec_patch_lock = threading.Lock()
+
+
+def build_qgen():
+    """
+    Questgen's QGen. With the memory-mapped distractor index built, QGen is
+    constructed without loading its sense2vec table (the whole table in every
+    worker's RAM, and its load time), and serves options from the index.
+    """
+    from Questgen import main
+
+    index = load_index()
+    if index is None:
+        return main.QGen()
+    try:
+        from sense2vec import Sense2Vec
+    except ImportError:
+        # Nothing to skip without sense2vec installed (e.g. the benchmark stubs)
+        qgen = main.QGen()
+    else:
+        # QGen.__init__ runs Sense2Vec().from_disk('s2v_old'); keep the empty table instead
+        with _sense2vec_patch_lock:
+            from_disk = Sense2Vec.from_disk
+            Sense2Vec.from_disk = lambda self, *args, **kwargs: self
+            try:
+                qgen = main.QGen()
+            finally:
+                Sense2Vec.from_disk = from_disk
+    qgen.s2v = Sense2VecView(index)
+    return qgen
+
+
+def _pinning_models(method):
+    """Keep the generation models loaded while the method runs."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with model_manager.pinned(*QUESTGEN_MODELS):
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class GenerationSession:
+    """
+    Where generation for one document stopped, so that a follow-up request
+    ("generate more") can continue instead of starting again at sentence 0:
+    the candidate sentences and a cursor into them (fill-in questions keep
+    their own cursor, since they are produced in batches), the distinct questions
+    not served yet, MCQ keywords extracted but not decoded yet, and the
+    near-duplicate state of every question generated so far.
+    """
+
+    def __init__(self, sentences: list):
+        self.sentences = sentences
+        self.cursor = 0
+        self.fill_in_cursor = 0
+        self.leftovers = {t: [] for t in QUESTION_TYPES}
+        self.indexes = {t: NearDuplicateIndex() for t in QUESTION_TYPES}
+        self.keyword_items = []
+        self.keywords_requested = 0
+        self.keywords_seen = set()
+        self.keywords_exhausted = False
+
+    @classmethod
+    def from_context(cls, context: Union[str, SegmentedText]) -> "GenerationSession":
+        return cls(get_all_sentences(context))
+
+    @property
+    def has_more(self) -> bool:
+        return (self.cursor < len(self.sentences) or self.fill_in_cursor < len(self.sentences)
+                or bool(self.keyword_items)
+                or any(self.leftovers.values()))
+
+    def take_leftovers(self, pools: dict) -> None:
+        """Seed each pool with unserved questions from earlier requests."""
+        for t, pool in pools.items():
+            pool.questions.extend(self.leftovers[t][:pool.capacity])
+            self.leftovers[t] = self.leftovers[t][pool.capacity:]
+
+    def keep_leftovers(self, pools: dict, selected: list) -> None:
+        """Keep the pooled questions that were not served for the next request."""
+        served = {id(question) for question in selected}
+        for t, pool in pools.items():
+            self.leftovers[t] = [q for q in pool.questions if id(q) not in served] + self.leftovers[t]
+
+
 class QuestgenService:
     def __init__(self):
-        self.qgen = main.QGen()
-        self.boolq = main.BoolQGen()
-        self.answergen = main.AnswerPredictor()
-        print("✅ Questgen models (QGen, BoolQGen, AnswerPredictor) loaded successfully.")
+        # Call the helper for all needed NLTK packages
+        download_nltk_package('stopwords', 'corpora')
+        download_nltk_package('punkt', 'tokenizers')
+        # punkt_tab is what PunktTokenizer loads on nltk >= 3.8.2; punkt serves older versions
+        download_nltk_package('punkt_tab', 'tokenizers')
+        patch_spacy_load()
 
-    def generate_questions(self, context: str, total_questions: int, question_distribution: dict):
-        all_mcqs, all_bools, all_fillins = [], [], []
+        from Questgen import main
+        configure_torch()
+        try:
+            from Questgen.mcq import mcq as questgen_mcq
+        except ImportError:
+            questgen_mcq = None
 
-        # Use our helper to get a master list of high-quality sentences
-        candidate_sentences = get_all_sentences(context)
-        
-        if not candidate_sentences:
+        # The model manager owns the models and may unload idle ones; they reload on next use
+        model_manager.register("qgen", lambda: _with_decoding_tiers(build_qgen()))
+        model_manager.register("boolq", lambda: _with_decoding_tiers(main.BoolQGen()))
+        self.fill_in = FillInGenerator()
+        for name in QUESTGEN_MODELS:
+            model_manager.get(name)
+        self.mcq = questgen_mcq
+        # Keywords are extracted once per document unless Questgen's internals are unavailable
+        self.document_mcq = questgen_mcq is not None and hasattr(self.qgen, 'nlp')
+        # Distinct questions kept per requested question; 1.0 stops each type at its target
+        self.overgeneration = config.QUESTION_OVERGENERATION
+        print("✅ Questgen models (QGen, BoolQGen) and spaCy fill-in pipeline loaded successfully.")
+
+    @property
+    def qgen(self):
+        return model_manager.get("qgen")
+
+    @property
+    def boolq(self):
+        return model_manager.get("boolq")
+
+    def generate_questions(
+        self, context: Union[str, SegmentedText], total_questions: int, question_distribution: dict,
+        session: GenerationSession = None
+    ):
+        """
+        Generate questions for the context. With a session, the context is ignored
+        and generation continues the session: its unserved questions first, then
+        new ones from the sentence where it stopped. The session is updated in place.
+        """
+        print(f"📊 DEBUG: Distribution received: {question_distribution}")
+        if session is None:
+            session = GenerationSession.from_context(context)
+        if not session.has_more:
             return {"questions": []}
 
-        target_mcq = int(total_questions * question_distribution.get("mcq", 0))
-        target_bool = int(total_questions * question_distribution.get("true_false", 0))
-        target_fillin = int(total_questions * question_distribution.get("fill_in", 0))
-        
-        max_sentences_to_process = min(len(candidate_sentences), max(total_questions * 3, 15))
-        sentences_to_process = candidate_sentences[:max_sentences_to_process]
+        targets = self._targets(total_questions, question_distribution)
+        pools = self._fill_pools(session, total_questions, targets, self.overgeneration)
+
+        # Return a dictionary with the final list of questions, enforcing the total count
+        selected = self._select_questions(pools, targets, total_questions)
+        session.keep_leftovers(pools, selected)
+        return {"questions": selected}
+
+    def generate_candidates(
+        self, context: Union[str, SegmentedText], total_questions: int, question_distribution: dict,
+        overgeneration: float
+    ) -> dict:
+        """
+        Every distinct question generated for the document, by type, without the
+        final selection. Each type keeps up to `overgeneration` times its target.
+        Used to build the offline question bank.
+        """
+        session = GenerationSession.from_context(context)
+        if not session.sentences:
+            return {t: [] for t in QUESTION_TYPES}
+        targets = self._targets(total_questions, question_distribution)
+        pools = self._fill_pools(session, total_questions, targets, overgeneration)
+        return {t: list(pool.questions) for t, pool in pools.items()}
+
+    @_pinning_models
+    def _fill_pools(self, session: GenerationSession, total_questions: int, targets: dict, overgeneration: float) -> dict:
+        """Fill one pool per question type, leftovers first, then from the session's sentence cursor."""
+        timings = StageTimings()
+        candidate_sentences = session.sentences
+
+        start = session.cursor
+        end = min(len(candidate_sentences), start + sentence_window(total_questions))
         
-        print(f"🔍 DEBUG: Processing {len(sentences_to_process)} sentences (out of {len(candidate_sentences)} available)")
-        print(f"🎯 DEBUG: Target: {target_mcq} MCQs, {target_bool} Boolean, {target_fillin} Fill-in questions")
-        print(f"📊 DEBUG: Distribution received: {question_distribution}")
+        print(f"🔍 DEBUG: Processing sentences {start + 1}-{end} (out of {len(candidate_sentences)} available)")
+        print(f"🎯 DEBUG: Target: {targets['mcq']} MCQs, {targets['true_false']} Boolean, {targets['fill_in']} Fill-in questions")
 
-        for i, sentence in enumerate(sentences_to_process):
-            print(f"\n--- Processing sentence {i+1}: {sentence[:100]}...")
-            
-            if target_mcq > 0 and len(all_mcqs) < target_mcq * 3:
-                try:
-                    print(f"🔄 Attempting MCQ generation...")
-                    mcq_payload = {"input_text": sentence}
-                    mcq_result = self.qgen.predict_mcq(mcq_payload)
-                    print(f"📝 MCQ result type: {type(mcq_result)}")
-                    print(f"📝 MCQ result: {mcq_result}")
-                    
-                    if mcq_result and 'questions' in mcq_result:
-                        for q in mcq_result['questions']:
-                            q['question_type'] = 'mcq'
-                        all_mcqs.extend(mcq_result['questions'])
-                        print(f"✅ Generated {len(mcq_result['questions'])} MCQs from sentence {i+1}")
-                    else:
-                        print(f"❌ No MCQs generated from sentence {i+1}")
-                except Exception as e:
-                    print(f"💥 Error generating MCQs from sentence {i+1}: {e}")
-
-            if target_bool > 0 and len(all_bools) < target_bool * 3:
-                try:
-                    print(f"🔄 Attempting Boolean question generation...")
-                    bool_payload = {"input_text": sentence}
-                    bool_result = self.boolq.predict_boolq(bool_payload)
-                    print(f"📝 Boolean result type: {type(bool_result)}")
-                    print(f"📝 Boolean result: {bool_result}")
-                    
-                    if bool_result and isinstance(bool_result, dict):
-                        # Handle the format: {'Text': '...', 'Count': 4, 'Boolean Questions': ['question1', 'question2']}
-                        if 'Boolean Questions' in bool_result and bool_result['Boolean Questions']:
-                            boolean_questions = []
-                            for question_text in bool_result['Boolean Questions']:
-                                # Determine if question should be true or false based on content analysis
-                                should_be_true = self._analyze_boolean_question(question_text, sentence)
-                                
-                                # Randomly decide if we want to keep the natural answer or flip it
-                                if random.choice([True, False]):  # 50% chance to flip
-                                    correct_answer = 'True' if should_be_true else 'False'
-                                else:
-                                    # Flip the question logic and answer
-                                    question_text = self._flip_boolean_question(question_text)
-                                    correct_answer = 'False' if should_be_true else 'True'
-                                
-                                # Create question object in the expected format
-                                question_obj = {
-                                    'question_statement': question_text,
-                                    'question_type': 'true_false',
-                                    'options': ['True', 'False'],
-                                    'answer': correct_answer
-                                }
-                                boolean_questions.append(question_obj)
-                            
-                            all_bools.extend(boolean_questions)
-                            print(f"✅ Generated {len(boolean_questions)} Boolean questions from sentence {i+1}")
-                        else:
-                            print(f"❌ No Boolean questions in result from sentence {i+1}")
-                            print(f"🔍 Boolean result keys: {bool_result.keys() if bool_result else 'None'}")
-                    else:
-                        print(f"❌ Invalid Boolean result format from sentence {i+1}")
-                        print(f"🔍 Boolean result keys: {bool_result.keys() if bool_result else 'None'}")
-                except Exception as e:
-                    print(f"💥 Error generating Boolean questions from sentence {i+1}: {e}")
-                    import traceback
-                    print(f"🔍 Full traceback: {traceback.format_exc()}")
-
-            if target_fillin > 0 and len(all_fillins) < target_fillin * 3:
-                try:
-                    print(f"🔄 Attempting Fill-in question generation...")
-                    fillin_payload = {"input_question": [sentence]}
-                    fillin_result = self.answergen.predict_answer(fillin_payload)
-                    print(f"📝 Fill-in result type: {type(fillin_result)}")
-                    print(f"📝 Fill-in result: {fillin_result}")
-                    
-                    if fillin_result:
-                        fillin_questions = []
-                        
-                        if isinstance(fillin_result, list):
-                            print(f"🔍 Fill-in result is a list with {len(fillin_result)} items")
-                            for item in fillin_result:
-                                if isinstance(item, str):
-                                    # Convert sentence to fill-in-the-blank format
-                                    # Find important words to blank out
-                                    words = item.split()
-                                    if len(words) > 5:  # Only process sentences with enough words
-                                        # Find nouns, adjectives, or important words to blank out
-                                        important_words = []
-                                        for word in words:
-                                            # Simple heuristic: words longer than 4 characters that aren't common words
-                                            if (len(word) > 4 and 
-                                                word.lower() not in ['the', 'and', 'that', 'with', 'have', 'this', 'will', 'from', 'they', 'know', 'want', 'been', 'good', 'much', 'some', 'time', 'very', 'when', 'come', 'here', 'just', 'like', 'long', 'make', 'many', 'over', 'such', 'take', 'than', 'them', 'well', 'were']):
-                                                important_words.append(word)
-                                        
-                                        if important_words:
-                                            # Pick a random important word to blank out
-                                            word_to_blank = random.choice(important_words)
-                                            answer = word_to_blank.strip('.,!?;:')
-                                            question_text = item.replace(word_to_blank, '_____', 1)
-                                            
-                                            question_obj = {
-                                                'question_statement': question_text,
-                                                'question_type': 'fill_in',  # Changed from 'fill_in_blank' to 'fill_in'
-                                                'options': [],
-                                                'answer': answer
-                                            }
-                                            fillin_questions.append(question_obj)
-                                            print(f"🔍 Created fill-in question: {question_text[:50]}... (Answer: {answer})")
-                        
-                        elif isinstance(fillin_result, dict):
-                            # Format 1: {'sentences': [{'blanks_ques': [...]}]}
-                            if 'sentences' in fillin_result and fillin_result['sentences']:
-                                print(f"🔍 Found 'sentences' key with {len(fillin_result['sentences'])} items")
-                                for sentence_data in fillin_result['sentences']:
-                                    if isinstance(sentence_data, dict) and 'blanks_ques' in sentence_data:
-                                        for blank_q in sentence_data['blanks_ques']:
-                                            question_obj = {
-                                                'question_statement': blank_q.get('question_statement', blank_q.get('question', str(blank_q))),
-                                                'question_type': 'fill_in',  # Changed from 'fill_in_blank' to 'fill_in'
-                                                'options': [],
-                                                'answer': blank_q.get('answer', blank_q.get('ans', ''))
-                                            }
-                                            fillin_questions.append(question_obj)
-                            
-                            # Format 2: Direct list of questions
-                            elif 'questions' in fillin_result:
-                                for q in fillin_result['questions']:
-                                    question_obj = {
-                                        'question_statement': q.get('question_statement', q.get('question', str(q))),
-                                        'question_type': 'fill_in',  # Changed from 'fill_in_blank' to 'fill_in'
-                                        'options': [],
-                                        'answer': q.get('answer', q.get('ans', ''))
-                                    }
-                                    fillin_questions.append(question_obj)
-                        
-                        if fillin_questions:
-                            all_fillins.extend(fillin_questions)
-                            print(f"✅ Generated {len(fillin_questions)} Fill-in questions from sentence {i+1}")
-                        else:
-                            print(f"❌ No Fill-in questions extracted from sentence {i+1}")
-                    else:
-                        print(f"❌ No Fill-in result from sentence {i+1}")
-                        
-                except Exception as e:
-                    print(f"💥 Error generating Fill-in questions from sentence {i+1}: {e}")
-                    import traceback
-                    print(f"🔍 Full traceback: {traceback.format_exc()}")
-
-            if len(all_mcqs) >= target_mcq * 2 and len(all_bools) >= target_bool * 2 and len(all_fillins) >= target_fillin * 2:
-                print(f"⏹️ Early termination at sentence {i+1} - sufficient questions generated")
-                break
-
-        all_mcqs = list({q['question_statement']: q for q in all_mcqs}.values())
-        all_bools = list({q['question_statement']: q for q in all_bools}.values())
-        all_fillins = list({q['question_statement']: q for q in all_fillins}.values())
+        pools = self._new_pools(targets, total_questions, overgeneration, session)
+        session.take_leftovers(pools)
+        try:
+            if not pools["mcq"].full and self.document_mcq:
+                self._queue_keywords(session, targets["mcq"] * 3, timings)
+                self._prime_distractors([keyword for keyword, _ in session.keyword_items], timings)
+                items = [(None, keyword, snippet) for keyword, snippet in session.keyword_items]
+                remaining = self._decode_mcqs(items, {None: pools["mcq"]}, timings)
+                session.keyword_items = [(keyword, snippet) for _, keyword, snippet in remaining]
+            session.fill_in_cursor = self._fill_blanks(session.sentences, pools["fill_in"], timings, session.fill_in_cursor)
+
+            for i in range(start, end):
+                if pools["mcq"].full and pools["true_false"].full:
+                    print(f"⏹️ Early termination at sentence {i+1} - sufficient distinct questions generated")
+                    break
+
+                # Between sentences the request may have been abandoned, or a shorter one may go first
+                check_cancelled("generate")
+                checkpoint()
+                sentence = candidate_sentences[i]
+                print(f"\n--- Processing sentence {i+1}: {sentence[:100]}...")
+                self._generate_for_sentence(sentence, i, pools, timings)
+                session.cursor = i + 1
+        except RequestCancelled:
+            # A retry of the same session gets what this run had already generated
+            session.keep_leftovers(pools, [])
+            raise
+
+        timings.record()
+        self._report_pools(pools)
+        return pools
+
+    def _queue_keywords(self, session: GenerationSession, wanted: int, timings: StageTimings) -> None:
+        """Make sure the session has `wanted` undecoded MCQ keywords, extracting more if the document has them."""
+        if len(session.keyword_items) >= wanted or session.keywords_exhausted:
+            return
+        # Extraction is deterministic, so asking for more keywords returns the earlier ones plus new ones
+        max_keywords = session.keywords_requested + wanted
+        keyword_contexts = self._mcq_keyword_contexts(session.sentences, max_keywords, timings)
+        session.keywords_requested = max_keywords
+        new_items = [(k, snippet) for k, snippet in keyword_contexts.items() if k not in session.keywords_seen]
+        session.keywords_exhausted = not new_items
+        session.keywords_seen.update(k for k, _ in new_items)
+        session.keyword_items.extend(new_items)
+
+    @_pinning_models
+    def generate_questions_batch(self, contexts: dict, total_questions: int, question_distribution: dict) -> dict:
+        """
+        Generate questions for several documents in one pass.
+
+        Keyphrases are extracted once per document, then the MCQ decoding for
+        every document's keywords is shared: MCQ_DECODE_BATCH keywords, from
+        any mix of documents, go through one T5 generate call.
+        Returns {doc_id: {"questions": [...]}}.
+        """
+        timings = StageTimings()
+        targets = self._targets(total_questions, question_distribution)
+        results = {}
+
+        documents, pools = {}, {}
+        mcq_items = []
+        for doc_id, context in contexts.items():
+            candidate_sentences = get_all_sentences(context)
+            if not candidate_sentences:
+                results[doc_id] = {"questions": []}
+                continue
+            documents[doc_id] = candidate_sentences
+            pools[doc_id] = self._new_pools(targets, total_questions)
+            if not pools[doc_id]["mcq"].full and self.document_mcq:
+                keyword_contexts = self._mcq_keyword_contexts(candidate_sentences, targets["mcq"] * 3, timings)
+                mcq_items.extend((doc_id, keyword, snippet) for keyword, snippet in keyword_contexts.items())
+
+        if mcq_items:
+            self._prime_distractors([keyword for _, keyword, _ in mcq_items], timings)
+            self._decode_mcqs(mcq_items, {doc_id: doc_pools["mcq"] for doc_id, doc_pools in pools.items()}, timings)
+
+        for doc_id, candidate_sentences in documents.items():
+            max_sentences_to_process = min(len(candidate_sentences), sentence_window(total_questions))
+            sentences_to_process = candidate_sentences[:max_sentences_to_process]
+            print(f"📚 Batch document {doc_id}: {len(sentences_to_process)} sentences")
+            self._fill_blanks(candidate_sentences, pools[doc_id]["fill_in"], timings)
+
+            for i, sentence in enumerate(sentences_to_process):
+                if pools[doc_id]["mcq"].full and pools[doc_id]["true_false"].full:
+                    break
+                check_cancelled("generate")
+                checkpoint()
+                self._generate_for_sentence(sentence, i, pools[doc_id], timings)
+
+            self._report_pools(pools[doc_id])
+            results[doc_id] = {"questions": self._select_questions(pools[doc_id], targets, total_questions)}
+
+        timings.record()
+        return results
+
+    def _new_pools(
+        self, targets: dict, total_questions: int, overgeneration: float = None, session: GenerationSession = None
+    ) -> dict:
+        # Targets are rounded down, so leave room for the questions _select_questions tops up with
+        slack = max(0, total_questions - sum(targets.values()))
+        overgeneration = self.overgeneration if overgeneration is None else overgeneration
+        return {
+            t: QuestionPool(targets[t], overgeneration, slack, session.indexes[t] if session else None)
+            for t in QUESTION_TYPES
+        }
+
+    def _generate_for_sentence(self, sentence: str, i: int, pools: dict, timings: StageTimings) -> None:
+        """Run every question type that still needs questions on one sentence."""
+        if not self.document_mcq and not pools["mcq"].full:
+            pools["mcq"].add(self._generate_mcqs(sentence, i, timings))
+
+        if not pools["true_false"].full:
+            pools["true_false"].add(self._generate_bools(sentence, i, timings))
+
+    def _fill_blanks(self, sentences: list, pool: QuestionPool, timings: StageTimings, start: int = 0) -> int:
+        """
+        Fill the fill-in pool from sentences[start:], one spaCy batch at a time,
+        until it is full. Returns the index of the first sentence not used.
+        """
+        position = start
+        while not pool.full and position < len(sentences):
+            check_cancelled("generate")
+            checkpoint()
+            batch = sentences[position:position + FILL_IN_BATCH]
+            with timings.time("generate_fill_in"):
+                generated = self.fill_in.generate(batch)
+            for questions in generated:
+                position += 1
+                QUESTION_YIELD.observe(len(questions), question_type="fill_in")
+                pool.add(questions)
+                if pool.full:
+                    break
+        if position > start:
+            print(f"✅ Fill-in: {len(pool.questions)} distinct questions from sentences {start + 1}-{position}")
+        return position
+
+    def _report_pools(self, pools: dict) -> None:
+        summary = ", ".join(f"{t}: {len(pool.questions)}/{pool.capacity}" for t, pool in pools.items())
+        rejected = sum(pool.rejected for pool in pools.values())
+        print(f"♻️ Distinct questions {summary}; {rejected} near-duplicates rejected")
+
+    def _mcq_keyword_contexts(self, sentences: list, max_keywords: int, timings: StageTimings) -> dict:
+        """
+        Run Questgen's keyphrase extraction (spaCy, pke, sense2vec filtering) once
+        over the document and map each keyword to the sentences containing it.
+        Returns {keyword: context snippet}.
+        """
+        sentences = sentences[:KEYWORD_CONTEXT_SENTENCES]
+        text = " ".join(sentences)
+        try:
+            with timings.time("mcq_keywords"):
+                keywords = self.mcq.get_keywords(
+                    self.qgen.nlp, text, max_keywords, self.qgen.s2v, self.qgen.fdist,
+                    self.qgen.normalized_levenshtein, len(sentences)
+                )
+                keyword_sentences = self.mcq.get_sentences_for_keyword(keywords, sentences)
+        except Exception as e:
+            print(f"💥 Error extracting document keywords: {e}")
+            return {}
+
+        print(f"🔑 Extracted {len(keyword_sentences)} keywords from {len(sentences)} sentences")
+        # Same context predict_mcq builds: the three longest sentences containing the keyword
+        return {keyword: " ".join(found[:3]) for keyword, found in keyword_sentences.items()}
+
+    def _prime_distractors(self, keywords: list, timings: StageTimings) -> None:
+        """Look up the distractors of every keyword about to be decoded in one batch (distractor index only)."""
+        s2v = self.qgen.s2v
+        if keywords and isinstance(s2v, Sense2VecView):
+            with timings.time("distractors"):
+                s2v.prime(keywords)
+
+    def _decode_mcqs(self, items: list, pools: dict, timings: StageTimings) -> list:
+        """
+        Answer-conditioned MCQ generation for (tag, keyword, context) items, adding
+        results to pools[tag]. Up to MCQ_DECODE_BATCH keywords share one model call,
+        and a tag only contributes as many keywords as its pool is still missing.
+        Returns the items that were not decoded because their pool filled up.
+        """
+        pending, unused = list(items), []
+        while pending:
+            # Questgen keys a batch by keyword, so a keyword shared by two tags waits for the next batch
+            batch, deferred, taken = {}, [], defaultdict(int)
+            for tag, keyword, snippet in pending:
+                if pools[tag].full:
+                    unused.append((tag, keyword, snippet))
+                    continue
+                if keyword in batch or len(batch) >= MCQ_DECODE_BATCH or taken[tag] >= pools[tag].missing:
+                    deferred.append((tag, keyword, snippet))
+                else:
+                    batch[keyword] = (tag, snippet)
+                    taken[tag] += 1
+            pending = deferred
+            if not batch:
+                return unused + pending
+            check_cancelled("generate")
+            checkpoint()
+
+            try:
+                with timings.time("generate_mcq"):
+                    output = self.mcq.generate_questions_mcq(
+                        {keyword: snippet for keyword, (_, snippet) in batch.items()},
+                        self.qgen.device, self.qgen.tokenizer, self.qgen.model,
+                        self.qgen.s2v, self.qgen.normalized_levenshtein
+                    )
+                MODEL_CALLS.inc(model="qgen")
+            except Exception as e:
+                print(f"💥 Error generating MCQs for {len(batch)} keywords: {e}")
+                continue
+
+            for question in output.get("questions", []):
+                entry = batch.get(question.get("answer"))
+                if entry is None:
+                    continue
+                question['question_type'] = 'mcq'
+                pools[entry[0]].add([question])
+            print(f"✅ Generated {len(output.get('questions', []))} MCQs from {len(batch)} keywords")
+        return unused
+
+    def _targets(self, total_questions: int, question_distribution: dict) -> dict:
+        return {t: int(total_questions * question_distribution.get(t, 0)) for t in QUESTION_TYPES}
+
+    def _select_questions(self, pools: dict, targets: dict, total_questions: int) -> list:
+        """Pick the requested mix of question types from the (already distinct) pools."""
+        all_mcqs = list(pools["mcq"].questions)
+        all_bools = list(pools["true_false"].questions)
+        all_fillins = list(pools["fill_in"].questions)
         random.shuffle(all_mcqs)
         random.shuffle(all_bools)
         random.shuffle(all_fillins)
 
-        print(f"\n📊 After deduplication: {len(all_mcqs)} unique MCQs, {len(all_bools)} unique Boolean, {len(all_fillins)} unique Fill-in questions")
+        print(f"\n📊 Pooled: {len(all_mcqs)} distinct MCQs, {len(all_bools)} distinct Boolean, {len(all_fillins)} distinct Fill-in questions")
 
+        target_mcq, target_bool, target_fillin = targets["mcq"], targets["true_false"], targets["fill_in"]
         final_questions = []
         selected_mcqs = all_mcqs[:target_mcq]
         selected_bools = all_bools[:target_bool]
@@ -249,8 +563,81 @@ class QuestgenService:
         type_counts = {t: question_types.count(t) for t in set(question_types)}
         print(f"📊 Question type breakdown: {type_counts}")
         
-        # Return a dictionary with the final list of questions, enforcing the total count
-        return {"questions": final_questions[:total_questions]}
+        return final_questions[:total_questions]
+
+    def _generate_mcqs(self, sentence: str, i: int, timings: StageTimings) -> list:
+        try:
+            print(f"🔄 Attempting MCQ generation...")
+            mcq_payload = {"input_text": sentence}
+            with timings.time("generate_mcq"):
+                mcq_result = self.qgen.predict_mcq(mcq_payload)
+            MODEL_CALLS.inc(model="qgen")
+            print(f"📝 MCQ result type: {type(mcq_result)}")
+            print(f"📝 MCQ result: {mcq_result}")
+            
+            if mcq_result and 'questions' in mcq_result:
+                for q in mcq_result['questions']:
+                    q['question_type'] = 'mcq'
+                QUESTION_YIELD.observe(len(mcq_result['questions']), question_type="mcq")
+                print(f"✅ Generated {len(mcq_result['questions'])} MCQs from sentence {i+1}")
+                return mcq_result['questions']
+            else:
+                QUESTION_YIELD.observe(0, question_type="mcq")
+                print(f"❌ No MCQs generated from sentence {i+1}")
+        except Exception as e:
+            print(f"💥 Error generating MCQs from sentence {i+1}: {e}")
+        return []
+
+    def _generate_bools(self, sentence: str, i: int, timings: StageTimings) -> list:
+        try:
+            print(f"🔄 Attempting Boolean question generation...")
+            bool_payload = {"input_text": sentence}
+            with timings.time("generate_true_false"):
+                bool_result = self.boolq.predict_boolq(bool_payload)
+            MODEL_CALLS.inc(model="boolq")
+            print(f"📝 Boolean result type: {type(bool_result)}")
+            print(f"📝 Boolean result: {bool_result}")
+            
+            if bool_result and isinstance(bool_result, dict):
+                # Handle the format: {'Text': '...', 'Count': 4, 'Boolean Questions': ['question1', 'question2']}
+                if 'Boolean Questions' in bool_result and bool_result['Boolean Questions']:
+                    boolean_questions = []
+                    for question_text in bool_result['Boolean Questions']:
+                        # Determine if question should be true or false based on content analysis
+                        should_be_true = self._analyze_boolean_question(question_text, sentence)
+                        
+                        # Randomly decide if we want to keep the natural answer or flip it
+                        if random.choice([True, False]):  # 50% chance to flip
+                            correct_answer = 'True' if should_be_true else 'False'
+                        else:
+                            # Flip the question logic and answer
+                            question_text = self._flip_boolean_question(question_text)
+                            correct_answer = 'False' if should_be_true else 'True'
+                        
+                        # Create question object in the expected format
+                        question_obj = {
+                            'question_statement': question_text,
+                            'question_type': 'true_false',
+                            'options': ['True', 'False'],
+                            'answer': correct_answer
+                        }
+                        boolean_questions.append(question_obj)
+                    
+                    QUESTION_YIELD.observe(len(boolean_questions), question_type="true_false")
+                    print(f"✅ Generated {len(boolean_questions)} Boolean questions from sentence {i+1}")
+                    return boolean_questions
+                else:
+                    QUESTION_YIELD.observe(0, question_type="true_false")
+                    print(f"❌ No Boolean questions in result from sentence {i+1}")
+                    print(f"🔍 Boolean result keys: {bool_result.keys() if bool_result else 'None'}")
+            else:
+                print(f"❌ Invalid Boolean result format from sentence {i+1}")
+                print(f"🔍 Boolean result keys: {bool_result.keys() if bool_result else 'None'}")
+        except Exception as e:
+            print(f"💥 Error generating Boolean questions from sentence {i+1}: {e}")
+            import traceback
+            print(f"🔍 Full traceback: {traceback.format_exc()}")
+        return []
 
     def _analyze_boolean_question(self, question: str, context: str) -> bool:
         """
@@ -304,5 +691,20 @@ class QuestgenService:
             # If we can't flip it easily, add "not" before the main verb
             return f"Is it not true that {question.lower().replace('?', '')}?"
 
-# Create the singleton instance for the entire application to use
-questgen_instance = QuestgenService()
+# The singleton instance for the entire application, created on first use
+_questgen_instance = None
+_questgen_lock = threading.Lock()
+
+
+def get_questgen() -> QuestgenService:
+    """Return the shared QuestgenService, loading the models on the first call."""
+    global _questgen_instance
+    if _questgen_instance is None:
+        with _questgen_lock:
+            if _questgen_instance is None:
+                _questgen_instance = QuestgenService()
+    return _questgen_instance
+
+
+def questgen_loaded() -> bool:
+    return _questgen_instance is not None
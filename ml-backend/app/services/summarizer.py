@@ -1,24 +1,43 @@
-from transformers import pipeline
-import torch
-from pypdf import PdfReader
 from io import BytesIO
 
+from ..utils.cancellation import check_cancelled
+from ..utils.decoding import active_tier
+from ..utils.metrics import MODEL_CALLS
+from ..utils.topology import configure_torch
+from .model_manager import model_manager
+
 class Summarizer:
     def __init__(self):
-        self.model = None
         self.max_input_length = 1024  # BART's token limit
-        
+        # Loaded on first use; the model manager may unload it again when it sits idle
+        model_manager.register("summarizer", self._load_pipeline)
+
+    @property
+    def model(self):
+        return model_manager.get("summarizer")
+
     def load_model(self):
         """Lazy-load model to save memory"""
-        if not self.model:
-            self.model = pipeline(
-                "summarization",
-                model="facebook/bart-large-cnn",
-                device=0 if torch.cuda.is_available() else -1
-            )
+        return self.model
+
+    @staticmethod
+    def _load_pipeline():
+        # Imported here so parsing never pays for torch/transformers start-up
+        import torch
+        from transformers import pipeline
+
+        configure_torch()
+
+        return pipeline(
+            "summarization",
+            model="facebook/bart-large-cnn",
+            device=0 if torch.cuda.is_available() else -1
+        )
     
     def get_page_count(self, file_content: bytes) -> int:
         """Get exact page count from PDF file content"""
+        from pypdf import PdfReader
+
         try:
             with BytesIO(file_content) as pdf_file:
                 reader = PdfReader(pdf_file)
@@ -35,9 +54,6 @@ class Summarizer:
     
     def _truncate_text(self, text: str) -> str:
         """Truncate text to fit within BART's token limits"""
-        if not self.model:
-            self.load_model()
-        
         # Use the actual tokenizer to check length
         try:
             # Get the tokenizer from the pipeline
@@ -96,10 +112,12 @@ class Summarizer:
     def summarize(self, text: str) -> str:
         if not text or not text.strip():
             return ""
-            
-        if not self.model:
-            self.load_model()
-        
+
+        with model_manager.pinned("summarizer"):
+            return self._summarize(text)
+
+    def _summarize(self, text: str) -> str:
+        check_cancelled("summarize")
         # Truncate text to fit BART's limits
         processed_text = self._truncate_text(text)
         
@@ -118,18 +136,24 @@ class Summarizer:
             return processed_text
         
         try:
-            # Adjust summary length based on processed text length
-            max_summary_length = min(1200, max(100, int(word_count * 0.3)))  # At least 100 tokens
+            # Adjust summary length based on processed text length, capped by the request's decoding tier
+            tier = active_tier()
+            max_summary_length = min(tier.summary_max_tokens, max(100, int(word_count * 0.3)))  # At least 100 tokens
             min_summary_length = min(max_summary_length - 50, max(30, int(word_count * 0.1)))  # Ensure min < max
+            beam_settings = {'num_beams': tier.summary_num_beams} if tier.summary_num_beams else {}
             
-            print(f"Summarizing {word_count} words, target length: {min_summary_length}-{max_summary_length}")
+            print(f"Summarizing {word_count} words, target length: {min_summary_length}-{max_summary_length} ({tier.name})")
+            # Truncation runs the tokenizer repeatedly; check again before the expensive call
+            check_cancelled("summarize")
             
             result = self.model(
                 processed_text,
                 max_length=max_summary_length,
                 min_length=min_summary_length,
-                do_sample=False
+                do_sample=False,
+                **beam_settings
             )
+            MODEL_CALLS.inc(model="summarizer")
             
             # Better error handling for result structure
             if isinstance(result, list) and len(result) > 0:
@@ -211,6 +235,7 @@ class Summarizer:
         # Summarize each chunk
         summaries = []
         for i, chunk in enumerate(chunks):
+            check_cancelled("summarize")
             try:
                 summary = self.summarize(chunk)
                 if summary:
@@ -0,0 +1,145 @@
+"""
+cancellation.py - Stop a request's pipeline work once its client has gone away.
+
+A request gets a CancelToken. While the endpoint waits for its pipeline, a
+watcher polls the connection and cancels the token when the client
+disconnects, e.g. because the tab was closed or the request was retried. The
+pipeline stages call check_cancelled() at their natural boundaries: between
+PDF pages, between cleaning chunks, around each summarizer call, between
+sentences and model batches during generation, and while queued in the
+scheduler. The first check after the cancel raises RequestCancelled, which
+unwinds the worker thread and releases the models and the scheduler slot.
+
+RequestCancelled derives from BaseException, like asyncio.CancelledError,
+so the broad `except Exception` fallbacks in the pipeline and in Questgen do
+not swallow it and carry on.
+
+The token is found through a context variable; worker threads get it with
+token.bind(func). Identical coalesced requests share one run, which is only
+cancelled once every request attached to it has been cancelled.
+
+Usage:
+    token = CancelToken()
+    async with cancel_on_disconnect(request, token):     # 499 if the client went away
+        result = await run_in_threadpool(token.bind(pipeline), text)
+    check_cancelled("clean")    # inside the pipeline
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+from contextlib import asynccontextmanager
+from typing import Callable, List, Optional
+
+from fastapi import HTTPException
+
+from .metrics import CANCELLED_REQUESTS
+
+# Seconds between checks of the client connection
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+class RequestCancelled(BaseException):
+    """Raised inside the pipeline once its request has been cancelled."""
+
+
+class CancelToken:
+    """Thread-safe, one-way cancelled flag with callbacks."""
+
+    def __init__(self):
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self._counted = False
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def add_callback(self, callback: Callable[[], None]) -> None:
+        """Call `callback` on cancel, or now if the token is already cancelled."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def raise_if_cancelled(self, stage: str) -> None:
+        if not self._event.is_set():
+            return
+        with self._lock:
+            first, self._counted = not self._counted, True
+        if first:
+            # Counted once per request, at the stage where its work actually stopped
+            CANCELLED_REQUESTS.inc(stage=stage)
+            print(f"🛑 Request cancelled during {stage}: {self.reason}")
+        raise RequestCancelled(self.reason)
+
+    def bind(self, func: Callable) -> Callable:
+        """func, run with this token active; for run_in_threadpool and executors."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _current_token.set(self)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _current_token.reset(token)
+        return wrapper
+
+
+_current_token: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar("cancel_token", default=None)
+
+
+def current_token() -> Optional[CancelToken]:
+    return _current_token.get()
+
+
+def check_cancelled(stage: str) -> None:
+    """Raise RequestCancelled if the active request has been cancelled; a no-op without one."""
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled(stage)
+
+
+def cancel_when_all_cancelled(target: CancelToken, tokens: List[CancelToken]) -> Callable[[], None]:
+    """Callback for each of `tokens` that cancels `target` once all of them are cancelled."""
+    def check() -> None:
+        if tokens and all(token.cancelled for token in tokens):
+            target.cancel(tokens[0].reason or "cancelled")
+    return check
+
+
+@asynccontextmanager
+async def cancel_on_disconnect(request, token: CancelToken, interval: float = DISCONNECT_POLL_SECONDS):
+    """
+    Cancel `token` if the client disconnects while the block runs, and end the
+    request with 499 when the block stops on the cancel. Only use it once the
+    request body has been read: polling consumes ASGI messages.
+    """
+    async def watch() -> None:
+        while not await request.is_disconnected():
+            await asyncio.sleep(interval)
+        token.cancel("client disconnected")
+
+    watcher = asyncio.ensure_future(watch())
+    try:
+        yield token
+    except RequestCancelled as e:
+        # Nobody reads the response; this only ends the request without an error trace
+        raise HTTPException(status_code=499, detail=f"Request cancelled: {e}")
+    finally:
+        watcher.cancel()
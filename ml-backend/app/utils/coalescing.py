@@ -0,0 +1,102 @@
+"""
+coalescing.py - Single-flight execution for identical concurrent requests.
+
+When many clients submit the same text with the same parameters at once (a
+shared link in a classroom), only the first request runs the pipeline. Those
+that arrive while it is still running attach to the same task and receive
+its result. Nothing is cached: once the task finishes, the next identical
+request starts a fresh run.
+
+The shared task is shielded, so a caller that goes away does not cancel the
+work the other callers are waiting for. The run has its own CancelToken,
+cancelled only once the tokens of every caller attached to it are. A caller
+that arrives after that starts a fresh run under the key.
+
+Usage:
+    flights = SingleFlight()
+    key = request_key(text, total_questions, distribution)
+    result, shared = await flights.run(key, lambda token: pipeline(text, token), request_token)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import random
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .cancellation import CancelToken, cancel_when_all_cancelled
+
+
+def request_key(*parts: Any) -> str:
+    """Stable hash of the request content and every parameter that affects the output."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            digest.update(part.encode("utf-8"))
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """Runs at most one coroutine per key at a time; concurrent callers share its outcome."""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._callers: Dict[str, Tuple[CancelToken, List[CancelToken]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def run(
+        self, key: str, factory: Callable[[CancelToken], Awaitable[Any]], token: Optional[CancelToken] = None
+    ) -> Tuple[Any, bool]:
+        """
+        Return (result, shared); shared is True when another caller's run was reused.
+        factory receives the run's token; a caller without a token keeps the run alive.
+        """
+        task = self._calls.get(key)
+        if task is not None and self._callers[key][0].cancelled:
+            # Every earlier caller went away and the run is unwinding; don't inherit its cancellation
+            task = None
+        shared = task is not None
+        if task is None:
+            run_token = CancelToken()
+            self._callers[key] = (run_token, [])
+            task = asyncio.ensure_future(factory(run_token))
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        run_token, callers = self._callers[key]
+        if token is None:
+            # Never cancelled, so the run is never cancelled either
+            callers.append(CancelToken())
+        else:
+            callers.append(token)
+            token.add_callback(cancel_when_all_cancelled(run_token, callers))
+        return await asyncio.shield(task), shared
+
+    def _finish(self, key: str, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._callers[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller has gone away
+            task.exception()
+
+
+def shuffled_questions(questions: List[dict], rng: random.Random = None) -> List[dict]:
+    """A copy of the questions in a new order, each with its options reordered."""
+    rng = rng or random.Random()
+    copies = []
+    for question in questions:
+        question = dict(question)
+        if question.get("options") and question.get("question_type") != "true_false":
+            options = list(question["options"])
+            rng.shuffle(options)
+            question["options"] = options
+        copies.append(question)
+    rng.shuffle(copies)
+    return copies
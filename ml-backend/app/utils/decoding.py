@@ -0,0 +1,117 @@
+"""
+decoding.py - Named speed/quality tiers for model decoding.
+
+Questgen calls `model.generate(...)` with its own fixed settings: beam
+search with 10 beams and 3 returned sequences for boolean questions, and
+greedy decoding up to 150-256 tokens elsewhere. The summarizer asks BART
+for up to 1200 tokens. A tier overrides those settings for the requests
+that select it:
+
+    fast        greedy, short outputs, one sequence per input
+    balanced    small beams, moderate lengths
+    thorough    the models' original settings (the default)
+
+The tier is carried in a context variable, so one request's choice never
+leaks into another's. install_generate_overrides() wraps a loaded model's
+generate() once, at model load time.
+
+Usage:
+    with decoding_tier("fast"):
+        payload = questgen.generate_questions(text, 10, distribution)
+"""
+
+from __future__ import annotations
+
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+from .. import config
+
+
+@dataclass(frozen=True)
+class DecodingTier:
+    """None keeps the calling library's own value for that setting."""
+
+    name: str
+    num_beams: Optional[int] = None
+    max_new_tokens: Optional[int] = None
+    early_stopping: Optional[bool] = None
+    num_return_sequences: Optional[int] = None
+    summary_num_beams: Optional[int] = None
+    summary_max_tokens: int = 1200
+
+    def generate_kwargs(self, kwargs: dict) -> dict:
+        """Apply this tier to the keyword arguments of one generate() call."""
+        if self.num_beams is None and self.max_new_tokens is None and self.num_return_sequences is None:
+            return kwargs
+        kwargs = dict(kwargs)
+        if self.max_new_tokens is not None:
+            kwargs.pop("max_length", None)
+            kwargs["max_new_tokens"] = self.max_new_tokens
+        if self.num_beams is not None:
+            kwargs["num_beams"] = self.num_beams
+        # Only calls that asked for several sequences (boolean questions) get the tier's count
+        if self.num_return_sequences is not None and kwargs.get("num_return_sequences", 1) > 1:
+            kwargs["num_return_sequences"] = self.num_return_sequences
+
+        beams = kwargs.get("num_beams", 1)
+        kwargs["num_return_sequences"] = min(kwargs.get("num_return_sequences", 1), beams)
+        if beams == 1:
+            # Beam-only options make greedy decoding warn or fail
+            kwargs.pop("early_stopping", None)
+        elif self.early_stopping is not None:
+            kwargs["early_stopping"] = self.early_stopping
+        return kwargs
+
+
+TIERS = {
+    "fast": DecodingTier(
+        "fast", num_beams=1, max_new_tokens=48, early_stopping=False, num_return_sequences=1,
+        summary_num_beams=1, summary_max_tokens=300,
+    ),
+    "balanced": DecodingTier(
+        "balanced", num_beams=4, max_new_tokens=64, early_stopping=True, num_return_sequences=2,
+        summary_num_beams=2, summary_max_tokens=600,
+    ),
+    "thorough": DecodingTier("thorough"),
+}
+
+_active_tier: contextvars.ContextVar[Optional[DecodingTier]] = contextvars.ContextVar("decoding_tier", default=None)
+
+
+def resolve_tier(name: Optional[str]) -> DecodingTier:
+    """Look up a tier by name (None means config.DEFAULT_DECODING_TIER); raises ValueError if unknown."""
+    name = (name or config.DEFAULT_DECODING_TIER).lower()
+    if name not in TIERS:
+        raise ValueError(f"Unknown decoding tier '{name}'. Choose one of: {', '.join(TIERS)}")
+    return TIERS[name]
+
+
+def active_tier() -> DecodingTier:
+    return _active_tier.get() or resolve_tier(None)
+
+
+@contextmanager
+def decoding_tier(name: Optional[str]) -> Iterator[DecodingTier]:
+    """Make the named tier active for model calls made inside the block."""
+    tier = resolve_tier(name)
+    token = _active_tier.set(tier)
+    try:
+        yield tier
+    finally:
+        _active_tier.reset(token)
+
+
+def install_generate_overrides(model) -> None:
+    """Route model.generate() through the active tier; a no-op for objects without generate()."""
+    original = getattr(model, "generate", None)
+    if original is None or getattr(original, "_tiered", False):
+        return
+
+    def generate(*args, **kwargs):
+        return original(*args, **active_tier().generate_kwargs(kwargs))
+
+    generate._tiered = True
+    model.generate = generate
@@ -0,0 +1,127 @@
+"""
+dedup.py - Incremental near-duplicate detection for generated questions.
+
+Each question statement is reduced to a MinHash signature over character
+shingles of its normalized text. Signatures are banded into an LSH table, so
+checking a new question only compares it against the few earlier questions
+that share a band, not against the whole pool.
+
+The same statement (after normalization) is always a duplicate. Similar
+wording is not enough: two different statements are only near duplicates
+when they also have the same answer and the same numbers and ordinals. "Is
+the Treaty of Versailles signed in 1919?" and "... in 1920?", or "Newton's
+second law states ..." and "Newton's third law states ...", differ in a few
+characters but ask different things. Both go into the LSH band keys, so
+questions that differ in them are never compared. Pass no answer where it
+does not tell questions apart, e.g. True/False.
+
+Usage:
+    index = NearDuplicateIndex()
+    if index.add(question["question_statement"], question.get("answer")):
+        pool.append(question)   # first of its kind
+"""
+
+from __future__ import annotations
+
+import re
+import zlib
+from typing import Dict, List, Set
+
+import numpy as np
+
+_PRIME = np.uint64((1 << 61) - 1)
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Words that change which fact a question asks about while barely changing its text
+_COUNTING_WORDS = frozenset(
+    "zero one two three four five six seven eight nine ten eleven twelve hundred thousand million billion "
+    "first second third fourth fifth sixth seventh eighth ninth tenth last "
+    "once twice half double single".split()
+)
+
+
+class NearDuplicateIndex:
+    """MinHash/LSH index answering "have we already seen something like this?"."""
+
+    def __init__(
+        self,
+        threshold: float = 0.7,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 4,
+        seed: int = 1,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.RandomState(seed)
+        # a < 2^31 and crc32 hashes < 2^32 keep a*h + b inside uint64
+        self._a = rng.randint(1, 2 ** 31 - 1, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 2 ** 31 - 1, size=num_perm).astype(np.uint64)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: List[np.ndarray] = []
+        self._statements: Set[str] = set()
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(_TOKEN_PATTERN.findall(text.lower()))
+
+    def signature(self, text: str) -> np.ndarray:
+        normalized = self.normalize(text)
+        k = self.shingle_size
+        shingles = {normalized[i:i + k] for i in range(max(1, len(normalized) - k + 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % _PRIME).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray, discriminator: bytes) -> List[bytes]:
+        return [discriminator + signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def discriminator(self, text: str, answer: object = None) -> bytes:
+        """What near duplicates must share exactly: the answer, and the numbers and ordinals of the text."""
+        tokens = _TOKEN_PATTERN.findall(text.lower())
+        counts = sorted({token for token in tokens if token.isdigit() or token in _COUNTING_WORDS})
+        answer_tokens = _TOKEN_PATTERN.findall(str(answer).lower()) if answer is not None else []
+        return (" ".join(answer_tokens) + "|" + " ".join(counts)).encode("utf-8")
+
+    def is_duplicate(self, text: str, answer: object = None) -> bool:
+        if self.normalize(text) in self._statements:
+            return True
+        signature = self.signature(text)
+        return self._find(signature, self._band_keys(signature, self.discriminator(text, answer)))
+
+    def add(self, text: str, answer: object = None) -> bool:
+        """Insert ``text`` unless it is a near duplicate; returns True if it was new."""
+        normalized = self.normalize(text)
+        if normalized in self._statements:
+            return False
+        signature = self.signature(text)
+        keys = self._band_keys(signature, self.discriminator(text, answer))
+        if self._find(signature, keys):
+            return False
+        self._statements.add(normalized)
+        position = len(self._signatures)
+        self._signatures.append(signature)
+        for bucket, key in zip(self._buckets, keys):
+            bucket.setdefault(key, []).append(position)
+        return True
+
+    def _find(self, signature: np.ndarray, keys: List[bytes]) -> bool:
+        checked = set()
+        for bucket, key in zip(self._buckets, keys):
+            for position in bucket.get(key, ()):
+                if position in checked:
+                    continue
+                checked.add(position)
+                # Fraction of agreeing minhashes estimates the Jaccard similarity
+                if np.mean(self._signatures[position] == signature) >= self.threshold:
+                    return True
+        return False
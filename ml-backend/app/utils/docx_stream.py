@@ -0,0 +1,102 @@
+"""
+docx_stream.py - Streaming text extraction for .docx files.
+
+Reads word/document.xml straight out of the zip with lxml's iterparse and
+yields the text of each paragraph as soon as its closing tag is parsed,
+including paragraphs inside table cells. Parsed elements are released
+immediately, so memory stays flat regardless of document length, and no
+python-docx object model is built.
+
+Usage:
+    with open("course-pack.docx", "rb") as handle:
+        for paragraph in iter_docx_paragraphs(handle):
+            ...
+"""
+
+from __future__ import annotations
+
+import posixpath
+import zipfile
+from typing import BinaryIO, Iterator
+
+from lxml import etree
+
+W_NS = "http://schemas.openxmlformats.org/wordprocessingml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+_P = f"{{{W_NS}}}p"
+_T = f"{{{W_NS}}}t"
+_TAB = f"{{{W_NS}}}tab"
+_BR = f"{{{W_NS}}}br"
+_CR = f"{{{W_NS}}}cr"
+_PTAB = f"{{{W_NS}}}ptab"
+_TABS = f"{{{W_NS}}}tabs"
+_NO_BREAK_HYPHEN = f"{{{W_NS}}}noBreakHyphen"
+_BR_TYPE = f"{{{W_NS}}}type"
+
+DEFAULT_DOCUMENT_PART = "word/document.xml"
+
+
+def _main_document_part(archive: zipfile.ZipFile) -> str:
+    """Resolve the main document part from the package relationships."""
+    try:
+        rels = etree.fromstring(archive.read("_rels/.rels"))
+    except (KeyError, etree.XMLSyntaxError):
+        return DEFAULT_DOCUMENT_PART
+    for rel in rels.iter(f"{{{REL_NS}}}Relationship"):
+        if rel.get("Type") == OFFICE_DOCUMENT_REL:
+            return posixpath.normpath(rel.get("Target", DEFAULT_DOCUMENT_PART).lstrip("/"))
+    return DEFAULT_DOCUMENT_PART
+
+
+def _paragraph_text(paragraph: etree._Element) -> str:
+    # Run content rendered as python-docx (>= 1.0) renders it: line breaks and
+    # carriage returns are "\n", page and column breaks nothing. Unlike
+    # Paragraph.text, runs nested in tracked insertions, smart tags and fields count too.
+    parts = []
+    for node in paragraph.iter(_T, _TAB, _PTAB, _BR, _CR, _NO_BREAK_HYPHEN):
+        if node.tag == _T:
+            parts.append(node.text or "")
+        elif node.tag in (_TAB, _PTAB):
+            # A w:tab under w:pPr/w:tabs is a tab stop definition, not content
+            if node.getparent().tag != _TABS:
+                parts.append("\t")
+        elif node.tag == _NO_BREAK_HYPHEN:
+            parts.append("-")
+        elif node.tag == _CR or node.get(_BR_TYPE, "textWrapping") == "textWrapping":
+            parts.append("\n")
+    return "".join(parts)
+
+
+def iter_docx_paragraphs(file_stream: BinaryIO) -> Iterator[str]:
+    """
+    Yield the text of every paragraph in document order, table cells included.
+
+    Raises ValueError if the file is not a readable .docx package.
+    """
+    try:
+        archive = zipfile.ZipFile(file_stream)
+    except zipfile.BadZipFile as e:
+        raise ValueError(f"Not a .docx package: {e}")
+
+    with archive:
+        part = _main_document_part(archive)
+        try:
+            source = archive.open(part)
+        except KeyError:
+            raise ValueError(f"Missing main document part {part}")
+
+        with source:
+            context = etree.iterparse(
+                source, events=("end",), tag=_P, resolve_entities=False, no_network=True, huge_tree=True
+            )
+            try:
+                for _, paragraph in context:
+                    yield _paragraph_text(paragraph)
+                    # Nested paragraphs (text boxes) end first, so clearing here never loses text
+                    paragraph.clear()
+                    while paragraph.getprevious() is not None:
+                        del paragraph.getparent()[0]
+            except etree.XMLSyntaxError as e:
+                raise ValueError(f"Malformed document XML: {e}")
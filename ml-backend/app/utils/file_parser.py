@@ -1,9 +1,28 @@
-import fitz  # PyMuPDF
-import docx
 import io
-from typing import Optional, Tuple, Dict, Any
+import zipfile
+from contextlib import nullcontext
+from typing import Optional, Tuple, Dict, Any, List, Awaitable, Callable, ContextManager
 from fastapi import UploadFile, HTTPException
+from starlette.concurrency import run_in_threadpool
+from ..services.model_manager import model_manager
+from ..services.planner import plan_document, summarize_cost
 from ..services.summarizer import Summarizer
+from .cancellation import CancelToken, check_cancelled
+from .docx_stream import iter_docx_paragraphs
+from .metrics import stage_timer
+from .profiling import ProfileSession
+
+EXTENSION_TYPES = {
+    'pdf': 'application/pdf',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'txt': 'text/plain',
+    'doc': 'application/msword',
+}
+ARCHIVE_TYPES = ('application/zip', 'application/x-zip-compressed')
+MAX_ARCHIVE_FILES = 50
+MAX_ARCHIVE_ENTRY_BYTES = 50 * 1024 * 1024
+# .docx has no pages; cancellation is checked every this many paragraphs instead
+DOCX_CANCEL_CHECK_PARAGRAPHS = 200
 
 class FileParser:
     def __init__(self):
@@ -19,11 +38,22 @@ class FileParser:
         self,
         file: UploadFile,
         summarize_large_files: bool = True,
-        page_threshold: int = 5
+        page_threshold: int = 5,
+        total_questions: int = 10,
+        latency_target_s: Optional[float] = None,
+        cancel_token: Optional[CancelToken] = None,
+        profile: Optional[ProfileSession] = None,
+        scheduled: Optional[Callable[..., Awaitable]] = None
     ) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
         """
         Main entry point that handles all file types
-        Returns tuple of (extracted_text, metadata)
+        Returns tuple of (extracted_text, metadata); metadata['processing_plan']
+        records the planner's choice. page_threshold is no longer used.
+        The work runs in worker threads. With a cancel_token it stops between
+        pages or summarizer calls once the token is cancelled; a profile
+        records it in the request's profile. scheduled(cost, func, *args), when
+        given, runs summarize(text, metadata, schedule) once the scheduler has
+        admitted it, so the wait for the summarizer holds no thread.
         """
         if file.content_type not in self.supported_types:
             raise HTTPException(
@@ -34,23 +64,17 @@ class FileParser:
         try:
             # Read file content once
             file_content = await file.read()
-            file_stream = io.BytesIO(file_content)
-            
-            # Get parser function and process file
-            parser = self.supported_types[file.content_type]
-            text, metadata = parser(file_stream)
-            
-            if not text:
-                raise ValueError("No text could be extracted from file")
-            
-            # Handle summarization for large PDFs
-            if (summarize_large_files and 
-                file.content_type == 'application/pdf' and 
-                metadata.get('page_count', 0) > page_threshold):
-                text = self.summarizer.summarize(text)
-                metadata['was_summarized'] = True
-                metadata['post_summary_length'] = len(text.split())
-            
+            args = (file_content, file.content_type, summarize_large_files, total_questions, latency_target_s)
+            text, metadata = await run_in_threadpool(self._bind(self.extract_and_plan, cancel_token, profile), *args)
+
+            # Summarize only when the planner prefers it to the extracted text
+            plan = metadata['processing_plan']
+            if plan['path'] == 'abstractive':
+                summarize = self._bind(self.summarize, cancel_token, profile)
+                if scheduled is not None:
+                    text = await scheduled(summarize_cost(plan), summarize, text, metadata)
+                else:
+                    text = await run_in_threadpool(summarize, text, metadata)
             return text, metadata
             
         except Exception as e:
@@ -59,16 +83,141 @@ class FileParser:
                 detail=f"Error processing file: {str(e)}"
             )
 
+    def prepare(
+        self,
+        file_content: bytes,
+        content_type: str,
+        summarize_large_files: bool = True,
+        total_questions: int = 10,
+        latency_target_s: Optional[float] = None,
+        schedule: Optional[Callable[[float], ContextManager]] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Extract, plan and, when planned, summarize; parse_file in one thread."""
+        text, metadata = self.extract_and_plan(file_content, content_type, summarize_large_files, total_questions, latency_target_s)
+        if metadata['processing_plan']['path'] == 'abstractive':
+            text = self.summarize(text, metadata, schedule)
+        return text, metadata
+
+    def extract_and_plan(
+        self,
+        file_content: bytes,
+        content_type: str,
+        summarize_large_files: bool = True,
+        total_questions: int = 10,
+        latency_target_s: Optional[float] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Extract and plan; metadata['processing_plan'] says whether to summarize."""
+        text, metadata = self.extract_text(file_content, content_type)
+        self.plan(text, metadata, total_questions, summarize_large_files, latency_target_s)
+        return text, metadata
+
+    @staticmethod
+    def _bind(func: Callable, cancel_token: Optional[CancelToken], profile: Optional[ProfileSession]) -> Callable:
+        if cancel_token is not None:
+            func = cancel_token.bind(func)
+        if profile is not None:
+            func = profile.bind(func)
+        return func
+
+    def extract_text(self, file_content: bytes, content_type: str) -> Tuple[str, Dict[str, Any]]:
+        """
+        Synchronous extraction from raw bytes, without summarization.
+        Safe to run in a worker thread; raises ValueError on failure.
+        """
+        if content_type not in self.supported_types:
+            raise ValueError(f"Unsupported file type: {content_type}")
+
+        parser = self.supported_types[content_type]
+        with stage_timer("parse"):
+            text, metadata = parser(io.BytesIO(file_content))
+        
+        if not text:
+            raise ValueError("No text could be extracted from file")
+        return text, metadata
+
+    def plan(
+        self,
+        text: str,
+        metadata: Dict[str, Any],
+        total_questions: int,
+        allow_summary: bool = True,
+        latency_target_s: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Choose the processing path for this document and record it in metadata."""
+        plan = plan_document(
+            text,
+            total_questions,
+            page_count=metadata.get('page_count'),
+            latency_target_s=latency_target_s,
+            allow_abstractive=allow_summary,
+            summarizer_loaded=model_manager.is_loaded("summarizer")
+        )
+        metadata['processing_plan'] = plan
+        return plan
+
+    def summarize(
+        self,
+        text: str,
+        metadata: Dict[str, Any],
+        schedule: Optional[Callable[[float], ContextManager]] = None
+    ) -> str:
+        """
+        Summarize for the abstractive path. schedule(seconds), e.g.
+        functools.partial(scheduler.run, client), gives the summarizer a slot of
+        its own sized by the plan's summary estimate; generation is charged
+        without it.
+        """
+        slot = schedule(summarize_cost(metadata.get('processing_plan'))) if schedule else nullcontext()
+        with slot, stage_timer("summarize"):
+            text = self.summarizer.summarize(text)
+        metadata['was_summarized'] = True
+        metadata['post_summary_length'] = len(text.split())
+        return text
+
+    def expand_archive(self, file_content: bytes) -> List[Tuple[str, str, bytes]]:
+        """
+        Unpack a zip of documents into (filename, content_type, content) triples.
+        Entries with unknown extensions are skipped.
+        """
+        documents = []
+        try:
+            with zipfile.ZipFile(io.BytesIO(file_content)) as archive:
+                for entry in archive.infolist():
+                    name = entry.filename.rsplit('/', 1)[-1]
+                    content_type = EXTENSION_TYPES.get(name.rsplit('.', 1)[-1].lower())
+                    if entry.is_dir() or name.startswith('.') or content_type is None:
+                        continue
+                    if len(documents) >= MAX_ARCHIVE_FILES:
+                        raise ValueError(f"Archive contains more than {MAX_ARCHIVE_FILES} documents")
+                    if entry.file_size > MAX_ARCHIVE_ENTRY_BYTES:
+                        raise ValueError(f"Archive entry too large: {name}")
+                    documents.append((name, content_type, archive.read(entry)))
+        except zipfile.BadZipFile:
+            raise ValueError("Uploaded archive is not a valid zip file")
+        return documents
+
+    def content_type_for(self, filename: str, declared_type: Optional[str]) -> Optional[str]:
+        """Trust the declared type when we support it, otherwise go by extension."""
+        if declared_type in self.supported_types or declared_type in ARCHIVE_TYPES:
+            return declared_type
+        extension = (filename or '').rsplit('.', 1)[-1].lower()
+        if extension == 'zip':
+            return 'application/zip'
+        return EXTENSION_TYPES.get(extension)
+
     def _parse_pdf(self, file_stream: io.BytesIO) -> Tuple[str, Dict[str, Any]]:
         """Handle PDF files with PyMuPDF"""
         text = ""
         metadata = {'type': 'pdf', 'page_count': 0}
         
         try:
+            import fitz  # PyMuPDF, imported on first PDF to keep startup fast
+
             file_stream.seek(0)
             with fitz.open(stream=file_stream.read(), filetype="pdf") as doc:
                 metadata['page_count'] = len(doc)
                 for page in doc:
+                    check_cancelled("parse")
                     text += page.get_text("text") + "\n"
         except Exception as e:
             raise ValueError(f"PDF parsing failed: {str(e)}")
@@ -77,16 +226,19 @@ class FileParser:
         return text.strip(), metadata
 
     def _parse_docx(self, file_stream: io.BytesIO) -> Tuple[str, Dict[str, Any]]:
-        """Handle modern Word documents"""
+        """Handle modern Word documents, streaming paragraphs and table cells from the XML"""
         text = ""
         metadata = {'type': 'docx'}
         
         try:
             file_stream.seek(0)
-            doc = docx.Document(file_stream)
-            text = "\n".join(
-                para.text for para in doc.paragraphs if para.text.strip()
-            )
+            paragraphs = []
+            for index, para in enumerate(iter_docx_paragraphs(file_stream)):
+                if index % DOCX_CANCEL_CHECK_PARAGRAPHS == 0:
+                    check_cancelled("parse")
+                if para.strip():
+                    paragraphs.append(para)
+            text = "\n".join(paragraphs)
         except Exception as e:
             raise ValueError(f"DOCX parsing failed: {str(e)}")
         
@@ -0,0 +1,366 @@
+"""
+metrics.py - Low-overhead in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms live in process memory and are rendered on
+demand by the /metrics endpoint, so no external collector is required.
+
+Usage:
+    from app.utils.metrics import STAGE_LATENCY, stage_timer
+
+    with stage_timer("clean"):
+        cleaned, diagnostics = cleaner.clean_text(text)
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows development machines
+    resource = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+YIELD_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 12)
+
+
+# -----------------------------------------------------------------------------
+# METRIC TYPES
+# -----------------------------------------------------------------------------
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        body = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+        return "{" + body + "}"
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing value per label set."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {_num(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, optionally computed at scrape time."""
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+        self._collect = collect
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        if self._collect is not None:
+            items = list(self._collect().items())
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [f"{self.name}{self._format_labels(key)} {_num(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    """Cumulative bucketed distribution per label set."""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [bucket counts..., +Inf count], sum
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._sums[key] += value
+
+    def count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            snapshot = [(key, list(counts), self._sums[key]) for key, counts in self._counts.items()]
+
+        lines = []
+        for key, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': _num(bound)})} {cumulative}")
+            cumulative += counts[-1]
+            lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': '+Inf'})} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(key)} {_num(total)}")
+            lines.append(f"{self.name}_count{self._format_labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders the exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _num(value: float) -> str:
+    # The text format spells the non-finite values +Inf, -Inf and NaN
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+
+# -----------------------------------------------------------------------------
+# PROCESS METRICS
+# -----------------------------------------------------------------------------
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def process_rss_bytes() -> int:
+    """Current resident set size, falling back to peak RSS off Linux."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        # ru_maxrss is KiB on Linux and bytes on macOS; this path is the non-Linux one
+        if resource is None:
+            return 0
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def process_uptime_seconds() -> Optional[float]:
+    """Seconds since this process was started, or None where /proc is unavailable."""
+    try:
+        with open("/proc/self/stat") as stat, open("/proc/uptime") as uptime:
+            # Field 22 is the start time in clock ticks after boot; the command name may contain spaces
+            started_ticks = int(stat.read().rsplit(")", 1)[1].split()[19])
+            return float(uptime.read().split()[0]) - started_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError, AttributeError):
+        return None
+
+
+# -----------------------------------------------------------------------------
+# APPLICATION METRICS
+# -----------------------------------------------------------------------------
+registry = MetricsRegistry()
+
+STAGE_LATENCY = registry.register(Histogram(
+    "eduhive_stage_duration_seconds",
+    "Wall time spent per pipeline stage and request.",
+    ["stage"],
+))
+MODEL_CALLS = registry.register(Counter(
+    "eduhive_model_calls_total",
+    "Number of model inference calls.",
+    ["model"],
+))
+QUESTION_YIELD = registry.register(Histogram(
+    "eduhive_question_yield_per_sentence",
+    "Questions produced by a single sentence, per question type.",
+    ["question_type"],
+    buckets=YIELD_BUCKETS,
+))
+CACHE_LOOKUPS = registry.register(Counter(
+    "eduhive_cache_lookups_total",
+    "Cache lookups by cache name and result (hit or miss).",
+    ["cache", "result"],
+))
+
+
+def _cache_hit_ratios() -> Dict[Tuple[str, ...], float]:
+    totals: Dict[str, List[float]] = defaultdict(lambda: [0.0, 0.0])
+    with CACHE_LOOKUPS._lock:
+        for (cache, result), value in CACHE_LOOKUPS._values.items():
+            totals[cache][0 if result == "hit" else 1] += value
+    return {(cache,): hits / (hits + misses) for cache, (hits, misses) in totals.items() if hits + misses}
+
+
+CACHE_HIT_RATIO = registry.register(Gauge(
+    "eduhive_cache_hit_ratio",
+    "Fraction of cache lookups that were hits since process start.",
+    ["cache"],
+    collect=_cache_hit_ratios,
+))
+MODEL_LOADS = registry.register(Counter(
+    "eduhive_model_loads_total",
+    "Model loads by the model manager, including reloads after eviction.",
+    ["model"],
+))
+MODEL_EVICTIONS = registry.register(Counter(
+    "eduhive_model_evictions_total",
+    "Models unloaded by the model manager, by reason (budget or idle).",
+    ["model", "reason"],
+))
+MODEL_RESIDENT_BYTES = registry.register(Gauge(
+    "eduhive_model_resident_bytes",
+    "Memory footprint measured when each model was loaded; 0 while unloaded.",
+    ["model"],
+))
+REQUESTS_IN_FLIGHT = registry.register(Gauge(
+    "eduhive_requests_in_flight",
+    "HTTP requests currently being processed.",
+))
+REQUESTS_IN_FLIGHT.set(0)
+COALESCED_REQUESTS = registry.register(Counter(
+    "eduhive_coalesced_requests_total",
+    "Generation requests answered by an identical request's in-flight pipeline run.",
+))
+SCHEDULER_WAIT = registry.register(Histogram(
+    "eduhive_scheduler_wait_seconds",
+    "Time generation jobs spent waiting for the models, including while preempted, by job size.",
+    ["size"],
+))
+SCHEDULER_PREEMPTIONS = registry.register(Counter(
+    "eduhive_scheduler_preemptions_total",
+    "Running generation jobs paused between sentences for a job with an earlier fair-queuing tag.",
+))
+SCHEDULER_QUEUE_DEPTH = registry.register(Gauge(
+    "eduhive_scheduler_queue_depth",
+    "Generation jobs waiting for the models.",
+))
+SCHEDULER_QUEUE_DEPTH.set(0)
+CANCELLED_REQUESTS = registry.register(Counter(
+    "eduhive_cancelled_requests_total",
+    "Requests whose pipeline stopped early because the client disconnected, by the stage it stopped in.",
+    ["stage"],
+))
+STARTUP_DURATION = registry.register(Gauge(
+    "eduhive_startup_duration_seconds",
+    "Cold start by phase: app_import, bind and ready are seconds since process start; models is load time.",
+    ["phase"],
+))
+PROCESS_RSS = registry.register(Gauge(
+    "eduhive_process_resident_memory_bytes",
+    "Resident set size of this process.",
+    collect=lambda: {(): float(process_rss_bytes())},
+))
+
+
+# -----------------------------------------------------------------------------
+# TIMING HELPERS
+# -----------------------------------------------------------------------------
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Observe the wall time of the enclosed block as one stage sample."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, stage=stage)
+
+
+class StageTimings:
+    """Accumulates time for stages that are interleaved within one request."""
+
+    def __init__(self):
+        self.totals: Dict[str, float] = defaultdict(float)
+
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[stage] += time.perf_counter() - started
+
+    def record(self) -> None:
+        """Publish the accumulated totals as one sample per stage."""
+        for stage, seconds in self.totals.items():
+            STAGE_LATENCY.observe(seconds, stage=stage)
@@ -0,0 +1,251 @@
+"""
+profiling.py - Opt-in, allow-listed profiling of a single request.
+
+A request asks for profiling with the ``X-Profile`` header or the ``profile``
+query flag. Two modes are available:
+
+    cprofile  deterministic cProfile run, stored as ``<request_id>.pstats``
+              plus a human-readable ``<request_id>.txt`` summary
+    sample    wall-clock stack sampler, stored as ``<request_id>.collapsed``
+              (one ``frame;frame;frame count`` line per stack, flamegraph-ready)
+
+Only one request is profiled at a time; concurrent requests simply run
+unprofiled and report ``X-Profile-Status: busy``.
+
+The pipeline runs in worker threads, so the profile records what is bound to
+it: ``profile.bind(func)`` (like ``CancelToken.bind``) wraps a function so
+that the thread running it is profiled while it runs. The event loop is not
+profiled, so other requests served meanwhile do not show up.
+
+Usage:
+    with profiler.session(request, request_id) as profile:
+        result = await run_in_threadpool(profile.bind(pipeline), text)
+    response.headers.update(profile.headers())
+"""
+
+from __future__ import annotations
+
+import cProfile
+import functools
+import hmac
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Optional, Sequence
+
+from fastapi import Request
+
+PROFILE_MODES = ("cprofile", "sample")
+_TRUTHY = ("1", "true", "yes", "on")
+_REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def is_valid_request_id(request_id: Optional[str]) -> bool:
+    """Request ids become file names, so only a conservative charset is accepted."""
+    return bool(request_id) and _REQUEST_ID_PATTERN.match(request_id) is not None
+
+
+@dataclass
+class ProfileSession:
+    request_id: str
+    mode: Optional[str] = None
+    status: str = "disabled"
+    artifacts: List[str] = field(default_factory=list)
+    recorder: Optional[object] = field(default=None, repr=False)
+
+    def bind(self, func: Callable) -> Callable:
+        """func, profiled on whichever thread runs it; unchanged when this request is not being profiled."""
+        recorder = self.recorder
+        if recorder is None:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with recorder.recording():
+                return func(*args, **kwargs)
+        return wrapper
+
+    def headers(self) -> dict:
+        """Response headers describing the outcome of the profiling request."""
+        if self.mode is None:
+            return {}
+        headers = {"X-Profile-Status": self.status}
+        if self.artifacts:
+            headers["X-Profile-Artifacts"] = ",".join(os.path.basename(a) for a in self.artifacts)
+        return headers
+
+
+class _CProfileRecorder:
+    """One cProfile.Profile, enabled on each thread for the duration of a bound call."""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def recording(self) -> Iterator[None]:
+        # A Profile records one thread at a time; overlapping bound calls run unprofiled
+        if not self._lock.acquire(blocking=False):
+            yield
+            return
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+            self._lock.release()
+
+
+class StackSampler:
+    """Samples the call stack of one thread at a fixed interval."""
+
+    def __init__(self, thread_id: Optional[int], interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    @contextmanager
+    def recording(self) -> Iterator[None]:
+        """Sample the calling thread for the duration of the block."""
+        if self.thread_id is not None:
+            yield
+            return
+        self.thread_id = threading.get_ident()
+        try:
+            yield
+        finally:
+            self.thread_id = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            thread_id = self.thread_id
+            if thread_id is None:
+                continue
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class RequestProfiler:
+    """Decides whether a request may be profiled and writes its artifacts."""
+
+    def __init__(
+        self, output_dir: str, allowlist: List[str], sample_interval: float = 0.005, tokens: Sequence[str] = ()
+    ):
+        self.output_dir = output_dir
+        self.allowlist = set(allowlist)
+        self.tokens = [token.encode("utf-8") for token in tokens]
+        self.sample_interval = sample_interval
+        self._busy = threading.Lock()
+
+    def requested_mode(self, request: Request) -> Optional[str]:
+        """Return the profiling mode asked for by the request, if any."""
+        value = request.headers.get("x-profile") or request.query_params.get("profile")
+        if not value:
+            return None
+        value = value.strip().lower()
+        if value in PROFILE_MODES:
+            return value
+        return "cprofile" if value in _TRUTHY else None
+
+    def is_allowed(self, request: Request) -> bool:
+        """An allow-listed client host, or an X-Profile-Token from the token list (never a host entry)."""
+        client_host = request.client.host if request.client else None
+        if client_host is not None and client_host in self.allowlist:
+            return True
+        token = request.headers.get("x-profile-token")
+        if not token or not self.tokens:
+            return False
+        token = token.encode("utf-8")
+        # Compared against every token in constant time, so timing reveals neither a match nor a prefix
+        return any([hmac.compare_digest(token, allowed) for allowed in self.tokens])
+
+    def artifact_path(self, filename: str) -> Optional[str]:
+        """Resolve a stored artifact name, rejecting anything that is not ours."""
+        stem, _, extension = filename.rpartition(".")
+        if not is_valid_request_id(stem) or extension not in ("pstats", "txt", "collapsed"):
+            return None
+        path = os.path.join(self.output_dir, filename)
+        return path if os.path.isfile(path) else None
+
+    @contextmanager
+    def session(self, request: Request, request_id: str) -> Iterator[ProfileSession]:
+        """Profile the enclosed block if the request asked for it and is allowed to."""
+        session = ProfileSession(request_id=request_id, mode=self.requested_mode(request))
+        if session.mode is None:
+            yield session
+            return
+        if not self.is_allowed(request):
+            session.status = "forbidden"
+            yield session
+            return
+        if not self._busy.acquire(blocking=False):
+            session.status = "busy"
+            yield session
+            return
+
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            if session.mode == "sample":
+                with self._sample(session):
+                    yield session
+            else:
+                with self._cprofile(session):
+                    yield session
+            session.status = "ok"
+        finally:
+            self._busy.release()
+
+    @contextmanager
+    def _cprofile(self, session: ProfileSession) -> Iterator[None]:
+        recorder = session.recorder = _CProfileRecorder()
+        try:
+            yield
+        finally:
+            session.recorder = None
+            profiler = recorder.profile
+            base = os.path.join(self.output_dir, session.request_id)
+            profiler.dump_stats(f"{base}.pstats")
+
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(60)
+            with open(f"{base}.txt", "w", encoding="utf-8") as handle:
+                handle.write(summary.getvalue())
+            session.artifacts.extend([f"{base}.pstats", f"{base}.txt"])
+
+    @contextmanager
+    def _sample(self, session: ProfileSession) -> Iterator[None]:
+        sampler = session.recorder = StackSampler(None, self.sample_interval)
+        sampler.start()
+        try:
+            yield
+        finally:
+            session.recorder = None
+            sampler.stop()
+            path = os.path.join(self.output_dir, f"{session.request_id}.collapsed")
+            with open(path, "w", encoding="utf-8") as handle:
+                handle.write(sampler.collapsed())
+            session.artifacts.append(path)
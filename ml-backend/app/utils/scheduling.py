@@ -0,0 +1,255 @@
+"""
+scheduling.py - Fair, cost-aware access to the shared generation models.
+
+One generation job runs on the models at a time. Instead of the first come,
+first served order of a plain lock, waiting jobs are ordered by weighted fair
+queuing with start-time tags:
+
+    start  = max(virtual time, finish tag of the client's previous job)
+    finish = start + cost / client weight
+
+The job with the smallest finish tag runs next. A job's cost is its estimated
+pipeline seconds (see planner.job_cost), so a short request finishes ahead of
+a long one that arrived earlier, and a client that submits many jobs pays for
+all of them: its tags grow until other clients' work comes first.
+
+Running jobs call checkpoint() between sentences. When a waiting job has a
+smaller finish tag, the running job hands the models over there and waits for
+its turn again with the tags it already has. A job whose request is
+cancelled while it waits leaves the queue at once. A 300-page document therefore
+pauses for a pasted paragraph instead of holding it up for minutes, and still
+gets its client's fair share: a client's later jobs are tagged behind its
+earlier ones, so no client can stay ahead of it for long.
+
+A job waits for its turn either in its own thread (run() blocks) or, in the
+API, on the event loop: admit() awaits the turn without taking a threadpool
+thread, and the thread that then does the work enters run() with the
+admitted job. A paused job keeps its thread while it waits to resume, so at
+most MAX_PAUSED_JOBS are paused at once; beyond that a running job finishes
+before another starts.
+
+Usage:
+    scheduler = FairScheduler(weights={"batch-importer": 0.5})
+    with scheduler.run(client="teacher-42", cost=12.0):
+        ...                 # model calls, with checkpoint() between sentences
+
+    job = await scheduler.admit("teacher-42", 12.0, token)     # on the event loop
+    try:
+        await run_in_threadpool(work, functools.partial(scheduler.run, "teacher-42", job=job))
+    finally:
+        scheduler.release(job)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+from .cancellation import CancelToken, current_token
+from .metrics import SCHEDULER_PREEMPTIONS, SCHEDULER_QUEUE_DEPTH, SCHEDULER_WAIT
+
+# Jobs estimated at or below this many seconds are reported as "short" in the metrics
+SHORT_JOB_SECONDS = 30.0
+# Smallest cost charged per job, so a stream of near-free requests still advances its client's tags
+MIN_COST = 0.1
+# Paused jobs each keep a worker thread while they wait to resume
+MAX_PAUSED_JOBS = 8
+
+
+@dataclass(order=True)
+class Job:
+    finish: float
+    sequence: int
+    client: str = field(compare=False)
+    cost: float = field(compare=False)
+    start: float = field(compare=False)
+    scheduler: "FairScheduler" = field(compare=False, repr=False)
+    waited: float = field(default=0.0, compare=False)
+    preemptions: int = field(default=0, compare=False)
+    # Set by admit(): hands the models to a job waiting on an event loop
+    grant: Optional[Callable[[], None]] = field(default=None, compare=False, repr=False)
+
+    @property
+    def size(self) -> str:
+        return "short" if self.cost <= SHORT_JOB_SECONDS else "long"
+
+
+_current_job: contextvars.ContextVar[Optional[Job]] = contextvars.ContextVar("scheduled_job", default=None)
+
+
+def current_job() -> Optional[Job]:
+    return _current_job.get()
+
+
+def checkpoint() -> None:
+    """Let a more deserving job run first; a no-op outside FairScheduler.run()."""
+    job = _current_job.get()
+    if job is not None:
+        job.scheduler.checkpoint(job)
+
+
+class FairScheduler:
+    """Weighted fair queue in front of a single shared resource, with preemption at checkpoints."""
+
+    def __init__(self, weights: Optional[Dict[str, float]] = None, default_weight: float = 1.0):
+        self.weights = dict(weights or {})
+        self.default_weight = default_weight
+        self._condition = threading.Condition()
+        self._waiting: List[Job] = []
+        self._running: Optional[Job] = None
+        self._paused = 0
+        self._virtual_time = 0.0
+        self._client_finish: Dict[str, float] = {}
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        """Jobs waiting, including preempted ones."""
+        with self._condition:
+            return len(self._waiting)
+
+    def weight(self, client: str) -> float:
+        return self.weights.get(client, self.default_weight)
+
+    @contextmanager
+    def run(self, client: str, cost: float, job: Optional[Job] = None) -> Iterator[Job]:
+        """
+        Hold the models for the block, in fair order; checkpoint() inside may pause it.
+        With a job from admit(), which already holds them, client and cost are ignored.
+        """
+        if job is None:
+            job = self.tag(client, cost)
+            self._acquire(job)
+        token = _current_job.set(job)
+        try:
+            yield job
+        finally:
+            _current_job.reset(token)
+            self._release(job)
+            SCHEDULER_WAIT.observe(job.waited, size=job.size)
+
+    async def admit(self, client: str, cost: float, token: Optional[CancelToken] = None) -> Job:
+        """
+        Wait on the event loop for a job's turn and hold the models for it.
+        Pass the job to run() in the thread that does the work, and call
+        release(job) afterwards, also when that thread never ran.
+        """
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+        job = self.tag(client, cost)
+        job.grant = lambda: loop.call_soon_threadsafe(_resolve, admitted)
+        if token is not None:
+            token.add_callback(lambda: loop.call_soon_threadsafe(admitted.cancel))
+        started = time.perf_counter()
+        with self._condition:
+            heapq.heappush(self._waiting, job)
+            self._changed()
+        try:
+            await admitted
+        except asyncio.CancelledError:
+            with self._condition:
+                if self._running is job:
+                    self._running = None
+                elif job in self._waiting:
+                    self._waiting.remove(job)
+                    heapq.heapify(self._waiting)
+                self._changed()
+            job.waited += time.perf_counter() - started
+            if token is not None and token.cancelled:
+                token.raise_if_cancelled("queue")
+            raise
+        job.waited += time.perf_counter() - started
+        return job
+
+    def release(self, job: Job) -> None:
+        """Give the models back; a no-op when run() already has."""
+        self._release(job)
+
+    def checkpoint(self, job: Job) -> None:
+        with self._condition:
+            if not self._waiting or self._waiting[0].finish >= job.finish or self._paused >= MAX_PAUSED_JOBS:
+                return
+            job.preemptions += 1
+            SCHEDULER_PREEMPTIONS.inc()
+            print(f"⏸️ Pausing {job.client}'s job (~{job.cost:.0f}s) for {self._waiting[0].client}'s (~{self._waiting[0].cost:.0f}s)")
+            self._running = None
+            self._paused += 1
+            self._changed()
+        try:
+            self._acquire(job)
+        finally:
+            with self._condition:
+                self._paused -= 1
+
+    def tag(self, client: str, cost: float) -> Job:
+        """A job with its fair-queuing tags; run() queues it here, a broker orders by job.finish."""
+        cost = max(MIN_COST, cost)
+        with self._condition:
+            start = max(self._virtual_time, self._client_finish.get(client, 0.0))
+            finish = start + cost / self.weight(client)
+            self._client_finish[client] = finish
+            return Job(finish, next(self._sequence), client, cost, start, self)
+
+    def started(self, job: Job) -> None:
+        """Advance virtual time for a tagged job that started elsewhere, e.g. on an inference worker."""
+        with self._condition:
+            self._advance(job.start)
+
+    def _advance(self, start: float) -> None:
+        self._virtual_time = max(self._virtual_time, start)
+        # Clients whose last finish tag is behind virtual time start from it anyway
+        for client in [c for c, finish in self._client_finish.items() if finish <= self._virtual_time]:
+            del self._client_finish[client]
+
+    def _acquire(self, job: Job) -> None:
+        started = time.perf_counter()
+        token = current_token()
+        if token is not None:
+            token.add_callback(self._wake)
+        with self._condition:
+            heapq.heappush(self._waiting, job)
+            self._changed()
+            while self._running is not None or self._waiting[0] is not job:
+                if token is not None and token.cancelled:
+                    self._waiting.remove(job)
+                    heapq.heapify(self._waiting)
+                    self._changed()
+                    job.waited += time.perf_counter() - started
+                    token.raise_if_cancelled("queue")
+                self._condition.wait()
+            heapq.heappop(self._waiting)
+            SCHEDULER_QUEUE_DEPTH.set(len(self._waiting))
+            self._running = job
+            self._advance(job.start)
+        job.waited += time.perf_counter() - started
+
+    def _wake(self) -> None:
+        with self._condition:
+            self._condition.notify_all()
+
+    def _release(self, job: Job) -> None:
+        with self._condition:
+            if self._running is job:
+                self._running = None
+            self._changed()
+
+    def _changed(self) -> None:
+        """After any change to the queue (condition held): hand the models to an admit() waiter, wake threads."""
+        if self._running is None and self._waiting and self._waiting[0].grant is not None:
+            job = heapq.heappop(self._waiting)
+            self._running = job
+            self._advance(job.start)
+            job.grant()
+        SCHEDULER_QUEUE_DEPTH.set(len(self._waiting))
+        self._condition.notify_all()
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,102 @@
+"""
+segmentation.py - One sentence segmentation per document.
+
+A SegmentedText holds the cleaned text once, plus (start, end) offsets for
+each sentence. The cleaner builds it, its diagnostics read from it, and the
+question generator iterates it. No stage re-tokenizes text or passes
+re-joined sentence strings to the next stage.
+
+Punkt (NLTK) is used when its data is installed. Otherwise sentences are
+split on terminal punctuation followed by whitespace.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_FALLBACK_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+
+_tokenizer = None
+_warned = False
+
+
+def _punkt():
+    """
+    The English punkt tokenizer, or None when NLTK or its data is missing.
+    Only a loaded tokenizer is kept: data downloaded after a miss (QuestgenService
+    and PDFTextCleaner fetch it at startup) is picked up by the next call.
+    """
+    global _tokenizer, _warned
+    if _tokenizer is not None:
+        return _tokenizer
+    try:
+        import nltk
+        try:
+            from nltk.tokenize import PunktTokenizer  # nltk >= 3.8.2 loads punkt_tab
+            _tokenizer = PunktTokenizer("english")
+        except ImportError:
+            _tokenizer = nltk.data.load("tokenizers/punkt/english.pickle")
+    except (ImportError, LookupError, OSError) as e:
+        if not _warned:
+            _warned = True
+            logger.warning(f"Punkt sentence tokenizer unavailable ({type(e).__name__}); using punctuation fallback")
+    return _tokenizer
+
+
+def _fallback_spans(text: str) -> Iterator[Tuple[int, int]]:
+    start = 0
+    for match in _FALLBACK_BOUNDARY.finditer(text):
+        if match.start() > start:
+            yield start, match.start()
+        start = match.end()
+    if start < len(text):
+        yield start, len(text)
+
+
+@dataclass
+class SegmentedText:
+    """Cleaned text plus the character span of every sentence in it."""
+
+    text: str
+    spans: List[Tuple[int, int]]
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.sentences()
+
+    def sentences(self) -> Iterator[str]:
+        text = self.text
+        for start, end in self.spans:
+            yield text[start:end]
+
+    def word_count(self) -> int:
+        return len(self.text.split())
+
+    def avg_sentence_length(self) -> float:
+        """Average words per sentence."""
+        return sum(len(sentence.split()) for sentence in self.sentences()) / max(1, len(self.spans))
+
+    def chunks(self, chunk_size: int) -> str:
+        """Render sentences as paragraphs of ``chunk_size`` sentences (the legacy clean_text output)."""
+        sentences = list(self.sentences())
+        return "\n\n".join(
+            " ".join(sentences[i:i + chunk_size]) for i in range(0, len(sentences), chunk_size)
+        )
+
+
+def segment(text: str) -> SegmentedText:
+    """Split ``text`` into sentences, keeping offsets into the original string."""
+    tokenizer = _punkt()
+    if tokenizer is not None:
+        spans = list(tokenizer.span_tokenize(text))
+    else:
+        spans = list(_fallback_spans(text))
+    return SegmentedText(text, spans)
@@ -0,0 +1,74 @@
+"""
+sessions.py - Short-lived server-side state keyed by an opaque session id.
+
+Entries expire after `ttl_seconds` without use (every get() renews them). The
+store holds at most `max_sessions` entries and evicts the least recently used
+one first. Sessions live in process memory, so with several uvicorn workers a
+follow-up request that reaches another worker sees an unknown id; callers
+treat that the same as an expired session.
+
+Usage:
+    sessions = SessionStore(ttl_seconds=1800, max_sessions=200)
+    session_id = sessions.create(state)
+    state = sessions.get(session_id)    # None once expired or evicted
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+
+class SessionStore:
+    """Thread-safe TTL + LRU map from session ids to arbitrary state."""
+
+    def __init__(self, ttl_seconds: float, max_sessions: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_sessions > 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._entries)
+
+    def create(self, value: Any) -> str:
+        session_id = uuid.uuid4().hex
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._entries[session_id] = (now + self.ttl_seconds, value)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+        return session_id
+
+    def get(self, session_id: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get(session_id)
+            if entry is None:
+                return None
+            self._entries[session_id] = (now + self.ttl_seconds, entry[1])
+            self._entries.move_to_end(session_id)
+            return entry[1]
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def _expire(self, now: float) -> None:
+        # Entries are kept in last-use order, so the expired ones are at the front
+        while self._entries:
+            session_id, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[session_id]
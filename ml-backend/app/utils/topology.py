@@ -0,0 +1,149 @@
+"""
+topology.py - Size worker processes and thread pools to the CPUs we really have.
+
+os.cpu_count() reports the host's cores, not what a container may use. This
+module takes the smallest of three limits: the affinity mask, the cgroup
+(v2 or v1) CPU quota and cpu_count(). It then splits those CPUs between
+uvicorn workers, torch intra-op threads and the cleaner's thread pool, so
+that workers x threads never oversubscribes the quota.
+
+apply_environment() must run before torch/numpy are imported (it sets the
+OMP/MKL/OpenBLAS thread variables). configure_torch() runs right after torch
+is imported.
+
+Usage:
+    from app.utils.topology import current_topology
+    topology = current_topology()
+    executor = ThreadPoolExecutor(max_workers=topology.cleaner_workers)
+"""
+
+from __future__ import annotations
+
+import functools
+import math
+import os
+import sys
+from dataclasses import dataclass
+from typing import Optional
+
+from .. import config
+
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+# "auto" workers: one per this many CPUs, since below it each worker's decode slows more than workers add
+MIN_THREADS_PER_WORKER = 4
+
+
+# -----------------------------------------------------------------------------
+# CPU DETECTION
+# -----------------------------------------------------------------------------
+def _cgroup_cpu_limit() -> Optional[float]:
+    """CPU quota in cores from cgroup v2 or v1, or None when unlimited/unknown."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as handle:
+            quota, period = handle.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as quota_file, \
+                open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as period_file:
+            quota, period = int(quota_file.read()), int(period_file.read())
+        return quota / period if quota > 0 and period > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def available_cpus() -> int:
+    """Whole CPUs this process may use: affinity mask, cgroup quota and cpu_count, whichever is smallest."""
+    limits = [os.cpu_count() or 1]
+    if hasattr(os, "sched_getaffinity"):
+        limits.append(len(os.sched_getaffinity(0)))
+    quota = _cgroup_cpu_limit()
+    if quota is not None:
+        # A 1.5 CPU quota still runs two threads without throttling most of the time
+        limits.append(max(1, math.ceil(quota)))
+    return max(1, min(limits))
+
+
+# -----------------------------------------------------------------------------
+# PLANNING
+# -----------------------------------------------------------------------------
+@dataclass(frozen=True)
+class Topology:
+    cpus: int
+    workers: int
+    torch_threads: int
+    interop_threads: int
+    cleaner_workers: int
+
+
+def _setting(value: str) -> Optional[int]:
+    """Parse a config value: a positive int, or None for "auto"."""
+    if value is None or str(value).strip().lower() in ("", "auto"):
+        return None
+    return max(1, int(value))
+
+
+def plan(
+    cpus: int,
+    workers: Optional[int] = None,
+    torch_threads: Optional[int] = None,
+    cleaner_workers: Optional[int] = None,
+) -> Topology:
+    """
+    Split cpus between worker processes and their pools; None means derive it.
+    Derived workers get at least MIN_THREADS_PER_WORKER CPUs each.
+    """
+    workers = workers or max(1, cpus // MIN_THREADS_PER_WORKER)
+    per_worker = max(1, cpus // workers)
+    torch_threads = torch_threads or per_worker
+    return Topology(
+        cpus=cpus,
+        workers=workers,
+        torch_threads=torch_threads,
+        # Inter-op parallelism only helps graphs with independent branches; T5/BART decode is sequential
+        interop_threads=1 if per_worker <= 2 else 2,
+        # Cleaning is regex work that holds the GIL most of the time; a few threads are plenty
+        cleaner_workers=cleaner_workers or min(4, per_worker),
+    )
+
+
+@functools.lru_cache(maxsize=1)
+def current_topology() -> Topology:
+    """The topology for this process, from the environment (WEB_CONCURRENCY, TORCH_THREADS, CLEANER_WORKERS)."""
+    return plan(
+        available_cpus(),
+        workers=_setting(config.WORKERS),
+        torch_threads=_setting(config.TORCH_THREADS),
+        cleaner_workers=_setting(config.CLEANER_WORKERS),
+    )
+
+
+# -----------------------------------------------------------------------------
+# APPLYING
+# -----------------------------------------------------------------------------
+def apply_environment(topology: Optional[Topology] = None) -> Topology:
+    """Set OpenMP/BLAS thread counts; explicit values already in the environment win."""
+    topology = topology or current_topology()
+    for name in THREAD_ENV_VARS:
+        os.environ.setdefault(name, str(topology.torch_threads))
+    if topology.workers > 1:
+        # HF tokenizers spawn their own pool per process otherwise
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+    return topology
+
+
+def configure_torch(topology: Optional[Topology] = None) -> None:
+    """Apply the thread counts to torch, if it has been imported."""
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return
+    topology = topology or current_topology()
+    torch.set_num_threads(topology.torch_threads)
+    try:
+        torch.set_num_interop_threads(topology.interop_threads)
+    except RuntimeError:
+        # Only settable before the first parallel op; a second model load lands here
+        pass
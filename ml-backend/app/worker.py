@@ -0,0 +1,260 @@
+"""
+worker.py - Inference worker: runs the models for an API that only enqueues.
+
+The API and the workers scale separately. With BROKER_URL set, API processes
+(uvicorn) load no models and turn each generation request into a job in the
+broker; workers claim the jobs, run the same pipeline the API runs in-process
+(parse, plan, summarize, clean, generate), publish progress events and store
+the results. Add API processes for connections and uploads, workers for
+inference throughput; a worker only loads the models of the job kinds it takes.
+
+Job kinds:
+    prepare         parse an uploaded file, or summarize a registered document's
+                    text, then queue the job again as "generate"
+    generate        clean and generate (QuestgenService)
+    generate_more   continue a generation session this worker holds
+    batch           the multi-document pipeline of /generate-batch/
+
+Sessions for "generate more" stay in the memory of the worker that created
+them; their ids are prefixed with the worker id so the API can route the
+follow-up there. A worker renews the lease of the job it runs; when the API
+cancels the job (the client went away), the next renewal cancels it here and
+the pipeline stops at its next check, as in-process requests do.
+
+Usage (from ml-backend/, same image and environment as the API):
+    BROKER_URL=sqlite:///jobs.sqlite3 uvicorn app.main:app --port 8000
+    BROKER_URL=sqlite:///jobs.sqlite3 python -m app.worker run
+    BROKER_URL=sqlite:///jobs.sqlite3 python -m app.worker run --kinds prepare --threads 2
+    BROKER_URL=sqlite:///jobs.sqlite3 python -m app.worker status
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from . import config
+from .broker import Broker, BrokerJob, open_broker
+
+# Seconds between removals of finished jobs older than JOB_RETENTION_SECONDS
+PRUNE_INTERVAL_SECONDS = 600
+
+
+@dataclass
+class NextStage:
+    """Handler outcome that queues the job again as another kind."""
+    kind: str
+    payload: dict
+    data: Optional[bytes] = None
+
+
+def _prepare(job: BrokerJob):
+    from . import main
+
+    p = job.payload
+    schedule = functools.partial(main.scheduler.run, job.client)
+    with main.decoding_tier(p["tier"]):
+        if job.data is not None:
+            text, metadata = main.file_parser.prepare(
+                job.data, p["content_type"], p["summarize_large_files"], p["total_questions"], p["latency_target_s"],
+                schedule
+            )
+        else:
+            # A registered document whose plan is a summary
+            text, metadata = p["text"], p["metadata"]
+            text = main.file_parser.summarize(text, metadata, schedule)
+    if not text or len(text) < 150:
+        raise HTTPException(status_code=400, detail="Text from file is too short or could not be extracted")
+    return NextStage("generate", {
+        "context": text, "total_questions": p["total_questions"], "distribution": p["distribution"],
+        "file_metadata": metadata, "tier": p["tier"],
+    })
+
+
+def _generate(job: BrokerJob) -> dict:
+    from . import main
+
+    p = job.payload
+    return main._run_pipeline(
+        main.get_questgen(), p["context"], p["total_questions"], p["distribution"], p.get("file_metadata"),
+        p.get("tier"), main._unpack_cleaned(p.get("cleaned")), job.client,
+    )
+
+
+def _generate_more(job: BrokerJob) -> dict:
+    from . import main
+
+    p = job.payload
+    return main._continue_session(p["session_id"], p["total_questions"], p["distribution"], p["tier"], job.client)
+
+
+def _batch(job: BrokerJob) -> dict:
+    from . import main
+
+    p = job.payload
+    documents, offset = [], 0
+    for filename, content_type, size in p["documents"]:
+        documents.append((filename, content_type, job.data[offset:offset + size]))
+        offset += size
+    return main._generate_batch(
+        documents, p["total_questions"], p["distribution"], p["tier"], p["summarize_large_files"],
+        p["latency_target_s"], job.client,
+    )
+
+
+HANDLERS: Dict[str, Callable[[BrokerJob], object]] = {
+    "prepare": _prepare,
+    "generate": _generate,
+    "generate_more": _generate_more,
+    "batch": _batch,
+}
+
+
+class InferenceWorker:
+    """Claims jobs of some kinds from the broker and runs them, `threads` at a time."""
+
+    def __init__(
+        self,
+        broker: Broker,
+        kinds: List[str],
+        worker_id: Optional[str] = None,
+        threads: int = 1,
+        poll_s: float = config.BROKER_POLL_SECONDS,
+        lease_s: float = config.WORKER_LEASE_SECONDS,
+    ):
+        unknown = set(kinds) - set(HANDLERS)
+        if unknown:
+            raise ValueError(f"Unknown job kinds: {', '.join(sorted(unknown))}. Known: {', '.join(HANDLERS)}")
+        self.broker = broker
+        self.kinds = kinds
+        # No "~": it separates the worker id from the session id
+        self.worker_id = (worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}").replace("~", "-")
+        self.threads = threads
+        self.poll_s = poll_s
+        self.lease_s = lease_s
+        self.stopping = threading.Event()
+        self._running: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def run(self) -> None:
+        """Process jobs until stop() or Ctrl+C."""
+        print(f"👷 Worker {self.worker_id} taking {', '.join(self.kinds)} jobs with {self.threads} thread(s)")
+        self.broker.heartbeat(self.worker_id, self.kinds)
+        if "generate" in self.kinds or "batch" in self.kinds:
+            from . import main
+            main.get_questgen()
+            print("✅ Models ready")
+        loops = [threading.Thread(target=self._claim_loop, name=f"worker-{i}", daemon=True) for i in range(self.threads)]
+        for thread in loops:
+            thread.start()
+        try:
+            self._lease_loop()
+        except KeyboardInterrupt:
+            print("🛑 Stopping after the running jobs")
+            self.stop()
+        for thread in loops:
+            thread.join()
+
+    def stop(self) -> None:
+        self.stopping.set()
+
+    def _claim_loop(self) -> None:
+        while not self.stopping.is_set():
+            job = self.broker.claim(self.worker_id, self.kinds, self.lease_s)
+            if job is None:
+                self.stopping.wait(self.poll_s)
+                continue
+            self.execute(job)
+
+    def _lease_loop(self) -> None:
+        """Heartbeat, renew the running jobs' leases and pass on cancellations from the API."""
+        last_prune = 0.0
+        while not self.stopping.wait(self.lease_s / 3):
+            self.broker.heartbeat(self.worker_id, self.kinds)
+            with self._lock:
+                running = dict(self._running)
+            for job_id, token in running.items():
+                if self.broker.renew(job_id, self.worker_id, self.lease_s):
+                    token.cancel("cancelled by the API")
+            if time.monotonic() - last_prune > PRUNE_INTERVAL_SECONDS:
+                last_prune = time.monotonic()
+                pruned = self.broker.prune(config.JOB_RETENTION_SECONDS)
+                if pruned:
+                    print(f"🧹 Pruned {pruned} finished jobs")
+
+    def execute(self, job: BrokerJob) -> None:
+        """Run one claimed job and record its outcome in the broker."""
+        from .utils.cancellation import CancelToken, RequestCancelled
+
+        token = CancelToken()
+        if job.cancel_requested:
+            token.cancel("cancelled by the API")
+        with self._lock:
+            self._running[job.id] = token
+        print(f"▶️ {job.kind} job {job.id} for {job.client or 'unknown'} (attempt {job.attempts})")
+        try:
+            outcome = token.bind(HANDLERS[job.kind])(job)
+            if isinstance(outcome, NextStage):
+                self.broker.publish(job.id, {"event": "prepared", "plan": outcome.payload["file_metadata"].get("processing_plan")})
+                self.broker.advance(job.id, self.worker_id, outcome.kind, outcome.payload, outcome.data)
+                return
+            if outcome.get("session_id"):
+                outcome["session_id"] = f"{self.worker_id}~{outcome['session_id']}"
+            self.broker.complete(job.id, self.worker_id, outcome)
+        except RequestCancelled as e:
+            self.broker.fail(job.id, self.worker_id, f"Request cancelled: {e}", 499, cancelled=True)
+        except HTTPException as e:
+            self.broker.fail(job.id, self.worker_id, str(e.detail), e.status_code)
+        except Exception as e:
+            print(f"💥 {job.kind} job {job.id} failed: {e}")
+            self.broker.fail(job.id, self.worker_id, f"Processing failed: {e}", 500)
+        finally:
+            with self._lock:
+                self._running.pop(job.id, None)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--broker", default=config.BROKER_URL, help="Broker URL (default: BROKER_URL)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Claim and run jobs until interrupted")
+    run.add_argument("--kinds", default=",".join(config.WORKER_KINDS), help=f"Comma-separated: {', '.join(HANDLERS)}")
+    run.add_argument("--threads", type=int, default=config.WORKER_THREADS, help="Jobs run at once")
+    run.add_argument("--id", help="Worker id (default: host, pid and a random suffix)")
+
+    commands.add_parser("status", help="Live workers and job counts")
+
+    args = parser.parse_args(argv)
+    if not args.broker:
+        parser.error("Set BROKER_URL or pass --broker, e.g. sqlite:///jobs.sqlite3")
+    broker = open_broker(args.broker)
+
+    if args.command == "status":
+        for worker, kinds in sorted(broker.live_workers(config.WORKER_LEASE_SECONDS).items()):
+            print(f"worker {worker}: {', '.join(kinds)}")
+        for (kind, status), count in sorted(broker.counts().items()):
+            print(f"{kind:>14} {status:>10} {count:>6}")
+        return 0
+
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    try:
+        worker = InferenceWorker(broker, kinds, args.id, args.threads)
+    except ValueError as e:
+        parser.error(str(e))
+    worker.run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""
+adversarial_cleaning.py - PDFTextCleaner on hostile input: linear time, per-stage budgets.
+
+Each stage of the cleaner, and clean_document as a whole, runs on
+pathological texts at two sizes (--size characters and --growth times
+that). A stage fails when:
+
+    budget   its time on the large input is over its budget in ms per MB
+             of input (STAGE_BUDGETS_MS_PER_MB, scaled by --budget-scale)
+    growth   its time grew more than --growth x --slack times between the
+             two sizes, i.e. faster than linear (only checked once the
+             large run takes MIN_MEASURABLE_S, below that timings are noise)
+
+The inputs target what made regex-based cleaners quadratic: openers that
+are never closed (\\(, \\[, \\begin{equation}, [, ( ...), runs of blank or
+whitespace-only lines under ^\\s* patterns, long runs of a repeated
+character, whitespace after a line-end hyphen, one huge line, and
+thousands of equation placeholders to restore.
+
+Exits non-zero when a stage is over budget or grows superlinearly, so it
+can gate CI.
+
+Usage (from ml-backend/):
+    python -m benchmarks.adversarial_cleaning
+    python -m benchmarks.adversarial_cleaning --size 1000000 --stages equations,clean_document
+    python -m benchmarks.adversarial_cleaning --budget-scale 3 --output adversarial.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.services.pdf_text_cleaner import PDFTextCleaner, ProcessingMode
+from app.utils.segmentation import segment
+
+# Runs shorter than this on the large input are not checked for growth
+MIN_MEASURABLE_S = 0.05
+
+
+def _repeat(unit: str, prefix: str = "") -> Callable[[int], str]:
+    """Input of about `size` characters: prefix, then unit repeated."""
+    return lambda size: prefix + unit * max(1, (size - len(prefix)) // len(unit))
+
+
+INPUTS: Dict[str, Callable[[int], str]] = {
+    "unclosed_inline_math": _repeat("\\( x "),
+    "unclosed_display_math": _repeat("\\[ x "),
+    "unclosed_environment": _repeat("\\begin{equation} x "),
+    "dollar_equations": _repeat("$a$ "),
+    "lone_dollars": _repeat("$"),
+    "open_brackets": _repeat("["),
+    "open_parens": _repeat("("),
+    "citations": _repeat("[12] (Smith, 2020) 1999a "),
+    "placeholder_lookalikes": _repeat("<<EQ_12>> <<EQ_"),
+    "blank_lines": _repeat("\n"),
+    "whitespace_lines": _repeat(" \t\n"),
+    "numbered_lines": _repeat("1.\n\n"),
+    "toc_leaders": _repeat("."),
+    "hyphens": _repeat("-"),
+    "hyphen_then_whitespace": _repeat("\n \n", prefix="a-"),
+    "huge_single_line": _repeat("word "),
+    "no_whitespace": _repeat("x"),
+    "urls": _repeat("www."),
+    "html_entities": _repeat("&amp;&#"),
+    "control_characters": _repeat("\x00\x07\x1b "),
+}
+
+STAGES: Dict[str, Callable[[PDFTextCleaner, str], object]] = {
+    "normalize": lambda cleaner, text: cleaner._normalize_encoding(text),
+    "structural": lambda cleaner, text: cleaner._remove_structural_artifacts(text, cleaner.config),
+    "equations": lambda cleaner, text: cleaner._restore_protected_content(*cleaner._protect_equations(text)),
+    "citations": lambda cleaner, text: cleaner._remove_citations(text),
+    "hyphenation": lambda cleaner, text: cleaner._fix_hyphenation(text),
+    "reflow": lambda cleaner, text: cleaner._reflow_lines(text),
+    "bullets": lambda cleaner, text: cleaner._remove_bullets(text),
+    "paragraphs": lambda cleaner, text: cleaner._reconstruct_paragraphs(text),
+    "formatting": lambda cleaner, text: cleaner._apply_final_formatting(text, cleaner.config),
+    "segment": lambda cleaner, text: segment(text),
+    "clean_document": lambda cleaner, text: cleaner.clean_document(text),
+}
+
+# Milliseconds per MB of input allowed on the large run
+STAGE_BUDGETS_MS_PER_MB = {
+    "normalize": 1000,
+    "structural": 1000,
+    "equations": 2000,
+    "citations": 1000,
+    "hyphenation": 500,
+    "reflow": 500,
+    "bullets": 500,
+    "paragraphs": 500,
+    "formatting": 500,
+    "segment": 3000,
+    "clean_document": 8000,
+}
+
+
+def _time(cleaner: PDFTextCleaner, stage: Callable, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        # The header cache would turn later repeats of the structural stage into lookups
+        cleaner._common_headers_cache.clear()
+        started = time.perf_counter()
+        stage(cleaner, text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def measure(cleaner: PDFTextCleaner, input_name: str, stage_name: str, args) -> dict:
+    make, stage = INPUTS[input_name], STAGES[stage_name]
+    small, large = make(args.size), make(args.size * args.growth)
+    small_s = _time(cleaner, stage, small, args.repeat)
+    large_s = _time(cleaner, stage, large, args.repeat)
+    ms_per_mb = large_s * 1000 / (len(large.encode("utf-8")) / 1e6)
+    growth = large_s / max(small_s, 1e-9)
+    failures = []
+    if ms_per_mb > STAGE_BUDGETS_MS_PER_MB[stage_name] * args.budget_scale:
+        failures.append("budget")
+    if large_s >= MIN_MEASURABLE_S and growth > args.growth * args.slack:
+        failures.append("growth")
+    return {
+        "input": input_name,
+        "stage": stage_name,
+        "small_chars": len(small),
+        "large_chars": len(large),
+        "small_s": small_s,
+        "large_s": large_s,
+        "growth": growth,
+        "ms_per_mb": ms_per_mb,
+        "failures": failures,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inputs", default=",".join(INPUTS), help="Comma-separated subset of the inputs")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma-separated subset of the stages")
+    parser.add_argument("--size", type=int, default=200_000, help="Characters in the small input")
+    parser.add_argument("--growth", type=int, default=4, help="Large input is this many times the small one")
+    parser.add_argument("--slack", type=float, default=2.0, help="Allowed time growth is growth x slack")
+    parser.add_argument("--budget-scale", type=float, default=1.0, help="Multiply every stage budget, for slow machines")
+    parser.add_argument("--repeat", type=int, default=3, help="Best of this many runs per measurement")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    inputs = [name.strip() for name in args.inputs.split(",") if name.strip()]
+    stages = [name.strip() for name in args.stages.split(",") if name.strip()]
+    unknown = [name for name in inputs if name not in INPUTS] + [name for name in stages if name not in STAGES]
+    if unknown:
+        parser.error(f"Unknown inputs or stages: {', '.join(unknown)}")
+
+    # The cleaner logs errors and warnings per document; keep the report readable
+    logging.getLogger("PDFTextCleaner").setLevel(logging.CRITICAL)
+    cleaner = PDFTextCleaner({"processing_mode": ProcessingMode.ACADEMIC})
+    results = []
+    for input_name in inputs:
+        for stage_name in stages:
+            results.append(measure(cleaner, input_name, stage_name, args))
+        print(f"• {input_name}: done", file=sys.stderr)
+
+    # ms per MB on the large input; "!" marks a stage over budget or growing superlinearly
+    width = max(len(name) for name in inputs)
+    print(f"\nms per MB at {args.size * args.growth:,} chars ({args.growth}x growth allowed up to {args.growth * args.slack:g}x)")
+    print(f"{'input':<{width}} " + " ".join(f"{stage[:10]:>10}" for stage in stages))
+    for input_name in inputs:
+        cells = []
+        for r in results:
+            if r["input"] == input_name:
+                cells.append(f"{r['ms_per_mb']:>9.0f}{'!' if r['failures'] else ' '}")
+        print(f"{input_name:<{width}} " + " ".join(cells))
+
+    failures = [r for r in results if r["failures"]]
+    for r in failures:
+        print(
+            f"FAIL {r['stage']} on {r['input']}: {', '.join(r['failures'])} "
+            f"({r['ms_per_mb']:.0f} ms/MB, budget {STAGE_BUDGETS_MS_PER_MB[r['stage']] * args.budget_scale:g}; "
+            f"{r['growth']:.1f}x for {args.growth}x input)"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"settings": vars(args), "budgets_ms_per_mb": STAGE_BUDGETS_MS_PER_MB, "results": results}, handle, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
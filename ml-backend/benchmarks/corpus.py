@@ -0,0 +1,164 @@
+"""
+corpus.py - Reproducible synthetic documents for the benchmarks.
+
+Pages are built from a seeded generator, so the same size always yields the
+same bytes. Each page carries the artifacts the cleaner has to deal with:
+running headers, page numbers, citations, hyphenated line breaks, URLs,
+bullets and inline equations.
+"""
+
+from __future__ import annotations
+
+import io
+import os
+import random
+from dataclasses import dataclass
+from typing import List
+
+SUBJECTS = [
+    "photosynthesis", "the mitochondrion", "plate tectonics", "the water cycle",
+    "natural selection", "the French Revolution", "supply and demand", "the immune system",
+    "electromagnetic induction", "cellular respiration", "the Industrial Revolution",
+    "chemical equilibrium", "the nitrogen cycle", "Newtonian mechanics", "the Renaissance",
+]
+VERBS = [
+    "converts", "regulates", "explains", "transforms", "drives", "describes",
+    "influences", "determines", "produces", "stabilises", "accelerates", "limits",
+]
+OBJECTS = [
+    "light energy into chemical energy", "the flow of energy through ecosystems",
+    "the movement of continental plates", "the distribution of resources in markets",
+    "the response of organisms to pathogens", "the rate of a chemical reaction",
+    "the evolution of political institutions", "the behaviour of charged particles",
+    "the adaptation of species to their environment", "the balance between reactants and products",
+]
+QUALIFIERS = [
+    "under controlled laboratory conditions", "across many generations",
+    "according to most modern textbooks", "in both plants and animals",
+    "during the late eighteenth century", "when temperature and pressure remain constant",
+    "as described by several independent studies", "in the majority of observed cases",
+]
+
+WORDS_PER_PAGE = 420
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "txt": "text/plain",
+}
+
+
+@dataclass
+class Document:
+    name: str
+    kind: str
+    pages: int
+    content: bytes
+
+    @property
+    def content_type(self) -> str:
+        return MIME_TYPES[self.kind]
+
+
+def _sentence(rng: random.Random) -> str:
+    sentence = (
+        f"{rng.choice(SUBJECTS).capitalize()} {rng.choice(VERBS)} "
+        f"{rng.choice(OBJECTS)} {rng.choice(QUALIFIERS)}"
+    )
+    roll = rng.random()
+    if roll < 0.15:
+        sentence += f" [{rng.randint(1, 40)}]"
+    elif roll < 0.25:
+        sentence += f" (Smith, {rng.randint(1950, 2023)})"
+    elif roll < 0.30:
+        sentence += " where $E = mc^2$ holds"
+    return sentence + "."
+
+
+def page_lines(page_number: int, seed: int = 0) -> List[str]:
+    """Lines of one synthetic page, including header/footer artifacts."""
+    rng = random.Random(seed * 100_003 + page_number)
+    lines = ["Introductory Science Course Pack", f"Chapter {page_number // 10 + 1}", ""]
+    words = 0
+    while words < WORDS_PER_PAGE:
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(3, 6)))
+        words += len(paragraph.split())
+        # Wrap at ~80 chars, occasionally hyphenating a word across lines
+        line = ""
+        for word in paragraph.split():
+            if len(line) + len(word) > 80:
+                if len(word) > 8 and rng.random() < 0.2:
+                    lines.append(f"{line} {word[:4]}-")
+                    word = word[4:]
+                else:
+                    lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}".strip()
+        lines.append(line)
+        if rng.random() < 0.2:
+            lines.append(f"• See https://example.edu/notes/{page_number} for details")
+        lines.append("")
+    lines.append(str(page_number))
+    return lines
+
+
+def make_text(pages: int, seed: int = 0) -> str:
+    return "\n".join("\n".join(page_lines(page, seed)) for page in range(1, pages + 1))
+
+
+def make_pdf(pages: int, seed: int = 0) -> bytes:
+    import fitz  # PyMuPDF
+
+    doc = fitz.open()
+    try:
+        for page_number in range(1, pages + 1):
+            page = doc.new_page()
+            page.insert_textbox(page.rect + (36, 36, -36, -36), "\n".join(page_lines(page_number, seed)), fontsize=7)
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def make_docx(pages: int, seed: int = 0, tables: bool = False) -> bytes:
+    import docx
+
+    document = docx.Document()
+    for page_number in range(1, pages + 1):
+        for line in page_lines(page_number, seed):
+            document.add_paragraph(line)
+        if tables:
+            table = document.add_table(rows=3, cols=2)
+            for row, table_row in enumerate(table.rows):
+                table_row.cells[0].text = f"Term {page_number}.{row + 1}"
+                table_row.cells[1].text = _sentence(random.Random(seed * 7 + page_number * 3 + row))
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def build_corpus(sizes: List[int], kinds: List[str], seed: int = 0) -> List[Document]:
+    builders = {"pdf": make_pdf, "docx": make_docx, "txt": lambda p, s: make_text(p, s).encode("utf-8")}
+    return [
+        Document(f"synthetic-{pages}p.{kind}", kind, pages, builders[kind](pages, seed))
+        for kind in kinds
+        for pages in sizes
+    ]
+
+
+def load_fixtures(directory: str) -> List[Document]:
+    """Load real documents (pdf/docx/txt) from a fixture directory."""
+    documents = []
+    for filename in sorted(os.listdir(directory)):
+        kind = filename.rsplit(".", 1)[-1].lower()
+        if kind not in MIME_TYPES:
+            continue
+        with open(os.path.join(directory, filename), "rb") as handle:
+            content = handle.read()
+        pages = 0
+        if kind == "pdf":
+            import fitz
+
+            with fitz.open(stream=content, filetype="pdf") as doc:
+                pages = len(doc)
+        documents.append(Document(filename, kind, pages, content))
+    return documents
@@ -0,0 +1,142 @@
+"""
+dedup.py - Model calls saved by stopping generation at distinct targets.
+
+Runs QuestgenService.generate_questions with the stub models twice per
+document: once with a fixed overgeneration factor (the old behaviour kept up
+to 3x the requested questions per type) and once with the default, where each
+type stops as soon as its near-duplicate-checked pool reaches its target.
+
+It first checks the near-duplicate index on PAIRS, questions that look alike
+but ask different things, true rewordings and exact repeats with different
+answers, and exits non-zero when one is judged wrongly.
+
+Usage (from ml-backend/):
+    python -m benchmarks.dedup --sizes 1,10,100 --questions 10,30
+    python -m benchmarks.dedup --baseline-factor 2 --output dedup.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+from typing import List, Optional
+
+from .corpus import make_text
+from .stubs import install_stub_questgen
+
+install_stub_questgen()
+
+from app.services.pdf_text_cleaner import PDFTextCleaner, ProcessingMode  # noqa: E402
+from app.services.questgen_service import QuestgenService  # noqa: E402
+from app.utils.dedup import NearDuplicateIndex  # noqa: E402
+from app.utils.metrics import MODEL_CALLS  # noqa: E402
+from app.utils.segmentation import SegmentedText  # noqa: E402
+
+DISTRIBUTION = {"mcq": 0.4, "true_false": 0.4, "fill_in": 0.2}
+MODELS = ("qgen", "boolq")
+
+# (question, answer, question, answer, expected to be near duplicates); True/False
+# questions pass no answer, as QuestionPool does
+PAIRS = [
+    ("Is the Treaty of Versailles signed in 1919?", None,
+     "Is the Treaty of Versailles signed in 1920?", None, False),
+    ("Newton's second law states that force equals mass times acceleration?", None,
+     "Newton's third law states that force equals mass times acceleration?", None, False),
+    ("Which law states that force equals mass times acceleration?", "Newton's second law",
+     "Which law states that force equals mass times acceleration?", "Newton's third law", True),
+    ("Which law relates force to mass times acceleration?", "Newton's second law",
+     "Which law relates force to the mass times acceleration?", "Newton's third law", False),
+    ("What is the function of the mitochondria?", "energy production",
+     "What is the main function of mitochondria?", "energy production", True),
+    ("Is the mitochondria the powerhouse of the cell?", None,
+     "Is mitochondria the powerhouse of the cell?", None, True),
+    ("Is the mitochondria the powerhouse of the cell?", True,
+     "Is the mitochondria the powerhouse of the cell?", False, True),
+]
+
+
+def _model_calls() -> float:
+    return sum(MODEL_CALLS.value(model=model) for model in MODELS)
+
+
+def check_pairs() -> List[dict]:
+    results = []
+    for first, first_answer, second, second_answer, expected in PAIRS:
+        index = NearDuplicateIndex()
+        index.add(first, first_answer)
+        duplicate = index.is_duplicate(second, second_answer)
+        results.append({"first": first, "second": second, "expected": expected, "duplicate": duplicate})
+    return results
+
+
+def measure(service: QuestgenService, document: SegmentedText, total_questions: int, factor: float, seed: int) -> dict:
+    service.overgeneration = factor
+    random.seed(seed)
+    calls_before = _model_calls()
+    started = time.perf_counter()
+    questions = service.generate_questions(document, total_questions, DISTRIBUTION)["questions"]
+    return {
+        "model_calls": _model_calls() - calls_before,
+        "questions": len(questions),
+        "elapsed_s": time.perf_counter() - started,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,10,100", help="Comma-separated page counts")
+    parser.add_argument("--questions", default="10,30", help="Comma-separated total_questions values")
+    parser.add_argument("--baseline-factor", type=float, default=3.0, help="Fixed overgeneration factor to compare against")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's own console output")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    question_counts = [int(count) for count in args.questions.split(",") if count]
+    cleaner = PDFTextCleaner({"processing_mode": ProcessingMode.ACADEMIC})
+
+    pairs = check_pairs()
+    wrong = [pair for pair in pairs if pair["duplicate"] != pair["expected"]]
+    for pair in pairs:
+        verdict = "duplicate" if pair["duplicate"] else "distinct"
+        print(f"{'FAIL' if pair in wrong else 'ok':>4} {verdict:>9}  {pair['first']} / {pair['second']}")
+    print()
+
+    results = []
+    with open(os.devnull, "w") as devnull:
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+        with quiet:
+            service = QuestgenService()
+            for pages in sizes:
+                document, _ = cleaner.clean_document(make_text(pages, args.seed))
+                for total_questions in question_counts:
+                    results.append({
+                        "pages": pages,
+                        "total_questions": total_questions,
+                        "baseline": measure(service, document, total_questions, args.baseline_factor, args.seed),
+                        "distinct": measure(service, document, total_questions, 1.0, args.seed),
+                    })
+
+    print(f"{'pages':>6} {'questions':>10} {'calls x' + format(args.baseline_factor, 'g'):>10} {'calls':>8} {'saved':>8}"
+          f" {'returned':>10}")
+    for result in results:
+        base, new = result["baseline"]["model_calls"], result["distinct"]["model_calls"]
+        saved = 1 - new / base if base else 0.0
+        result["calls_saved"] = saved
+        returned = f"{result['baseline']['questions']}/{result['distinct']['questions']}"
+        print(f"{result['pages']:>6} {result['total_questions']:>10} {base:>10.0f} {new:>8.0f} {saved:>8.0%} {returned:>10}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"settings": vars(args), "pairs": pairs, "results": results}, handle, indent=2)
+    return 1 if wrong else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,331 @@
+"""
+distractors.py - Distractor latency and per-worker memory, current path vs the mmap index.
+
+Engines:
+    inram      the shape of Questgen's path: each process loads the whole
+               vector table as float32, runs one most_similar() scan per
+               answer, and filters with Questgen's pairwise Levenshtein loop
+               (strsimilarity when installed, otherwise pure Python)
+    sense2vec  the real thing: Sense2Vec.from_disk plus Questgen's get_options
+               and filter_phrases (only with --sense2vec)
+    mmap       app.distractors.DistractorIndex: memory-mapped float16 vectors,
+               one blockwise scan for all answers, vectorized filtering
+    questgen   Questgen's own QGen(), which loads sense2vec, serving options
+               through qgen.s2v (only with --service)
+    service    the service's QGen (questgen_service.build_qgen with the index
+               as DISTRACTOR_INDEX_DIR), serving options through qgen.s2v
+               (only with --service)
+
+questgen and service load T5 and spaCy too, in the same way, so the
+difference in their memory is what sense2vec costs each worker on the
+service's real path. They need Questgen installed and --sense2vec pointing
+at its s2v_old directory, which QGen loads relative to the working directory.
+
+The table is synthetic (--rows phrases in clusters of spelling variants and
+related terms) unless --index points at an index built with
+`python -m app.distractors build`. Every engine runs in --workers spawned
+processes at the same time. Each worker reports its median and p95 latency
+per request (--answers answers) and its RSS, PSS (shared pages divided
+between the processes mapping them) and USS (private pages) from /proc.
+
+Usage (from ml-backend/):
+    python -m benchmarks.distractors --rows 300000 --workers 4
+    python -m benchmarks.distractors --index model_cache/distractors --sense2vec model_cache/s2v_old
+    python -m benchmarks.distractors --index model_cache/distractors --sense2vec model_cache/s2v_old --service
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from app.distractors import DISTRACTORS, MIN_DISTANCE, NEIGHBOURS, DistractorIndex, write_index
+
+_SYLLABLES = ["ka", "mi", "to", "re", "sa", "lo", "nu", "phe", "gra", "dri", "ven", "tor", "lys", "cyt", "ox"]
+_SUFFIXES = ["", "s", "ic", "ase", "ation", "ism"]
+
+
+def synthetic_index(directory: str, rows: int, dims: int, seed: int) -> None:
+    """Clusters of ~12 phrases (spelling variants plus related terms) around random centres."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    chooser = random.Random(seed)
+    phrases, vectors, frequencies = [], [], []
+    seen = set()
+    while len(phrases) < rows:
+        centre = rng.standard_normal(dims).astype(np.float32)
+        stem = "".join(chooser.choice(_SYLLABLES) for _ in range(chooser.randint(2, 4)))
+        related = ["".join(chooser.choice(_SYLLABLES) for _ in range(3)) for _ in range(6)]
+        for word in [stem + suffix for suffix in _SUFFIXES] + related:
+            if word in seen or len(phrases) >= rows:
+                continue
+            seen.add(word)
+            phrases.append(word)
+            vectors.append(centre + 0.35 * rng.standard_normal(dims).astype(np.float32))
+            frequencies.append(int(rng.zipf(1.5)))
+    write_index(directory, phrases, np.stack(vectors), frequencies)
+
+
+# -----------------------------------------------------------------------------
+# ENGINES
+# -----------------------------------------------------------------------------
+def _python_levenshtein() -> Callable[[str, str], float]:
+    try:
+        from strsimpy.normalized_levenshtein import NormalizedLevenshtein
+
+        return NormalizedLevenshtein().distance
+    except ImportError:
+        pass
+    try:
+        from similarity.normalized_levenshtein import NormalizedLevenshtein
+
+        return NormalizedLevenshtein().distance
+    except ImportError:
+        pass
+
+    def distance(a: str, b: str) -> float:
+        previous = list(range(len(b) + 1))
+        for i, x in enumerate(a, 1):
+            current = [i]
+            for j, y in enumerate(b, 1):
+                current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (x != y)))
+            previous = current
+        return previous[-1] / max(1, len(a), len(b))
+
+    return distance
+
+
+def _filter_phrases(phrases: List[str], limit: int, distance: Callable[[str, str], float]) -> List[str]:
+    """Questgen's filter_phrases: keep a phrase when it is far from every phrase kept so far."""
+    kept = phrases[:1]
+    for phrase in phrases[1:]:
+        if min(distance(k.lower(), phrase.lower()) for k in kept) >= MIN_DISTANCE:
+            kept.append(phrase)
+        if len(kept) >= limit:
+            break
+    return kept
+
+
+def _inram_engine(index_dir: str) -> Callable[[List[str]], Dict[str, List[str]]]:
+    import numpy as np
+
+    vectors = np.load(os.path.join(index_dir, "vectors.npy")).astype(np.float32)
+    phrases = [p.decode("utf-8") for p in np.load(os.path.join(index_dir, "phrases.npy"))]
+    lookup = {phrase.lower(): row for row, phrase in enumerate(phrases)}
+    distance = _python_levenshtein()
+
+    def run(answers: List[str]) -> Dict[str, List[str]]:
+        result = {}
+        for answer in answers:
+            row = lookup.get(answer.lower().replace(" ", "_"))
+            if row is None:
+                result[answer] = []
+                continue
+            scores = vectors @ vectors[row]
+            scores[row] = -np.inf
+            top = np.argpartition(scores, -NEIGHBOURS)[-NEIGHBOURS:]
+            top = top[np.argsort(-scores[top])]
+            words = [phrases[i].replace("_", " ").title() for i in top]
+            result[answer] = _filter_phrases(words, DISTRACTORS, distance)
+        return result
+
+    return run
+
+
+def _sense2vec_engine(path: str) -> Callable[[List[str]], Dict[str, List[str]]]:
+    from sense2vec import Sense2Vec
+    from Questgen.mcq.mcq import filter_phrases, get_options
+    from strsimpy.normalized_levenshtein import NormalizedLevenshtein
+
+    s2v = Sense2Vec().from_disk(path)
+    levenshtein = NormalizedLevenshtein()
+
+    def run(answers: List[str]) -> Dict[str, List[str]]:
+        result = {}
+        for answer in answers:
+            options, _ = get_options(answer, s2v)
+            result[answer] = filter_phrases(options, DISTRACTORS, levenshtein)
+        return result
+
+    return run
+
+
+def _mmap_engine(index_dir: str) -> Callable[[List[str]], Dict[str, List[str]]]:
+    return DistractorIndex(index_dir).distractors
+
+
+def _qgen_engine(qgen) -> Callable[[List[str]], Dict[str, List[str]]]:
+    from Questgen.mcq.mcq import filter_phrases, get_options
+
+    def run(answers: List[str]) -> Dict[str, List[str]]:
+        if hasattr(qgen.s2v, "prime"):
+            qgen.s2v.prime(answers)  # as the generator does before decoding
+        result = {}
+        for answer in answers:
+            options, _ = get_options(answer, qgen.s2v)
+            result[answer] = filter_phrases(options, DISTRACTORS, qgen.normalized_levenshtein)
+        return result
+
+    return run
+
+
+def _questgen_engine(source: tuple) -> Callable[[List[str]], Dict[str, List[str]]]:
+    from Questgen import main as questgen_main
+
+    _, sense2vec_dir = source
+    os.chdir(os.path.dirname(os.path.abspath(sense2vec_dir)))
+    return _qgen_engine(questgen_main.QGen())
+
+
+def _service_engine(source: tuple) -> Callable[[List[str]], Dict[str, List[str]]]:
+    from app import config
+    from app.services.questgen_service import build_qgen
+
+    index_dir, sense2vec_dir = source
+    os.chdir(os.path.dirname(os.path.abspath(sense2vec_dir)))
+    config.DISTRACTOR_INDEX_DIR = os.path.abspath(index_dir)
+    return _qgen_engine(build_qgen())
+
+
+ENGINES = {
+    "inram": _inram_engine,
+    "sense2vec": _sense2vec_engine,
+    "mmap": _mmap_engine,
+    "questgen": _questgen_engine,
+    "service": _service_engine,
+}
+
+
+# -----------------------------------------------------------------------------
+# WORKERS
+# -----------------------------------------------------------------------------
+def _memory() -> Dict[str, int]:
+    """RSS, PSS and USS of this process in bytes, from /proc/self/smaps_rollup."""
+    fields = {}
+    try:
+        with open("/proc/self/smaps_rollup") as handle:
+            for line in handle:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0]) * 1024
+    except OSError:
+        return {"rss": 0, "pss": 0, "uss": 0}
+    return {
+        "rss": fields.get("Rss", 0),
+        "pss": fields.get("Pss", 0),
+        "uss": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0),
+    }
+
+
+def _worker(engine: str, source: str, requests: List[List[str]], ready, start, measured, done, results) -> None:
+    run = ENGINES[engine](source)
+    run(requests[0])  # warm-up
+    ready.release()
+    start.wait()
+    latencies = []
+    for answers in requests:
+        started = time.perf_counter()
+        run(answers)
+        latencies.append(time.perf_counter() - started)
+    # Memory is read while every worker is still alive, so shared pages are split between them
+    measured.release()
+    done.wait()
+    results.put({"latencies": latencies, **_memory()})
+
+
+def measure(engine: str, source: str, requests: List[List[str]], workers: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    ready, measured = context.Semaphore(0), context.Semaphore(0)
+    start, done, results = context.Event(), context.Event(), context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(engine, source, requests, ready, start, measured, done, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+    start.set()
+    for _ in processes:
+        measured.acquire()
+    done.set()
+    reports = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latencies = sorted(latency for report in reports for latency in report["latencies"])
+    return {
+        "engine": engine,
+        "workers": workers,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+        **{key: statistics.mean(report[key] for report in reports) for key in ("rss", "pss", "uss")},
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", help="Built index directory (default: a synthetic one)")
+    parser.add_argument("--sense2vec", help="sense2vec directory, adds the real sense2vec engine")
+    parser.add_argument("--service", action="store_true",
+                        help="Add Questgen's QGen and the service's QGen (needs Questgen and --sense2vec)")
+    parser.add_argument("--rows", type=int, default=300_000, help="Synthetic index size")
+    parser.add_argument("--dims", type=int, default=128, help="Synthetic vector width (sense2vec: 128)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent worker processes per engine")
+    parser.add_argument("--requests", type=int, default=10, help="Requests per worker")
+    parser.add_argument("--answers", type=int, default=8, help="Answers per request (MCQs in one request)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+    if args.service and not args.sense2vec:
+        parser.error("--service needs --sense2vec")
+
+    with tempfile.TemporaryDirectory() as scratch:
+        index_dir = args.index
+        if not index_dir:
+            index_dir = os.path.join(scratch, "index")
+            print(f"Building a synthetic index of {args.rows:,} x {args.dims}...", file=sys.stderr)
+            synthetic_index(index_dir, args.rows, args.dims, args.seed)
+
+        index = DistractorIndex(index_dir)
+        rng = random.Random(args.seed)
+        # Answers from the common end of the table, like the keywords of real documents
+        common = [index.phrases[row].decode("utf-8") for row in range(min(len(index), 20_000))]
+        requests = [rng.sample(common, args.answers) for _ in range(args.requests)]
+        del index
+
+        engines = [("inram", index_dir), ("mmap", index_dir)]
+        if args.sense2vec:
+            engines.insert(0, ("sense2vec", args.sense2vec))
+        if args.service:
+            engines += [("questgen", (index_dir, args.sense2vec)), ("service", (index_dir, args.sense2vec))]
+        results = []
+        for engine, source in engines:
+            results.append(measure(engine, source, requests, args.workers))
+            print(f"• {engine}: done", file=sys.stderr)
+
+    mib = 1_048_576
+    print(f"\n{'engine':>10} {'workers':>8} {'p50':>9} {'p95':>9} {'RSS/worker':>11} {'PSS/worker':>11} {'USS/worker':>11}")
+    for r in results:
+        print(
+            f"{r['engine']:>10} {r['workers']:>8} {r['p50_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms "
+            f"{r['rss'] / mib:>9.0f}Mi {r['pss'] / mib:>9.0f}Mi {r['uss'] / mib:>9.0f}Mi"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"settings": vars(args), "results": results}, handle, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
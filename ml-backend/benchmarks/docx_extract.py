@@ -0,0 +1,129 @@
+"""
+docx_extract.py - Streaming DOCX extraction versus the python-docx object model.
+
+Builds synthetic course packs (one glossary table per page) and extracts
+their text two ways:
+
+    python-docx   docx.Document(...).paragraphs, the previous FileParser path,
+                  which never sees table text
+    stream        app.utils.docx_stream.iter_docx_paragraphs, the current path
+
+Each measurement runs in a fresh subprocess so the reported peak memory is
+that extractor's own high-water mark above the process baseline (ru_maxrss;
+Linux and macOS only).
+
+Usage (from ml-backend/):
+    python -m benchmarks.docx_extract --pages 100,300,1000
+    python -m benchmarks.docx_extract --fixtures ./fixtures --output docx.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import List, Optional
+
+from .corpus import make_docx
+
+METHODS = ("python-docx", "stream")
+
+
+def _peak_rss_bytes() -> int:
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _extract(method: str, content: bytes) -> str:
+    if method == "python-docx":
+        import docx
+
+        document = docx.Document(io.BytesIO(content))
+        return "\n".join(para.text for para in document.paragraphs if para.text.strip())
+
+    from app.utils.docx_stream import iter_docx_paragraphs
+
+    return "\n".join(para for para in iter_docx_paragraphs(io.BytesIO(content)) if para.strip())
+
+
+def _measure(method: str, path: str, repeat: int) -> dict:
+    """Runs in a child process."""
+    import docx  # noqa: F401  (import cost stays out of the measurement)
+    from app.utils.docx_stream import iter_docx_paragraphs  # noqa: F401
+
+    with open(path, "rb") as handle:
+        content = handle.read()
+    baseline = _peak_rss_bytes()
+    timings, text = [], ""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text = _extract(method, content)
+        timings.append(time.perf_counter() - started)
+    return {
+        "median_s": statistics.median(timings),
+        "peak_mb": max(0, _peak_rss_bytes() - baseline) / 1_048_576,
+        "chars": len(text),
+        "words": len(text.split()),
+    }
+
+
+def run(documents: List[tuple], repeat: int, workdir: str) -> List[dict]:
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for name, content in documents:
+        path = os.path.join(workdir, name)
+        with open(path, "wb") as handle:
+            handle.write(content)
+        for method in METHODS:
+            with context.Pool(1) as pool:
+                measured = pool.apply(_measure, (method, path, repeat))
+            results.append({"document": name, "size_mb": len(content) / 1_048_576, "method": method, **measured})
+            print(f"• {name} {method}: {measured['median_s'] * 1000:.0f} ms", file=sys.stderr)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="100,300", help="Comma-separated page counts")
+    parser.add_argument("--fixtures", help="Directory of real .docx documents to include")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    documents = [
+        (f"synthetic-{pages}p-tables.docx", make_docx(pages, args.seed, tables=True))
+        for pages in (int(p) for p in args.pages.split(",") if p)
+    ]
+    if args.fixtures:
+        for filename in sorted(os.listdir(args.fixtures)):
+            if filename.lower().endswith(".docx"):
+                with open(os.path.join(args.fixtures, filename), "rb") as handle:
+                    documents.append((filename, handle.read()))
+
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run(documents, args.repeat, workdir)
+
+    print(f"\n{'document':<32} {'method':<12} {'MiB':>6} {'median ms':>10} {'peak MiB':>9} {'words':>9}")
+    for result in results:
+        print(
+            f"{result['document']:<32} {result['method']:<12} {result['size_mb']:>6.1f} "
+            f"{result['median_s'] * 1000:>10.1f} {result['peak_mb']:>9.1f} {result['words']:>9,}"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"settings": vars(args), "results": results}, handle, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
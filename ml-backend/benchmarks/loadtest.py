@@ -0,0 +1,262 @@
+"""
+loadtest.py - In-process load-testing harness for the FastAPI endpoints.
+
+Starts the app under uvicorn in a background thread and drives
+/generate-from-text/ and /generate-from-file/ with a configurable number of
+concurrent clients and a weighted document mix. A separate probe polls
+/health throughout the run: its latency is the time a trivial request waits
+for the event loop, so it exposes blocking work in the request path.
+
+Backends:
+    fake   deterministic stub models (see stubs.py) with an optional per-call
+           sleep that stands in for inference time; runs fully offline
+    real   the production models, loaded exactly as app.main loads them
+
+Usage (from ml-backend/):
+    python -m benchmarks.loadtest --concurrency 8 --requests 200
+    python -m benchmarks.loadtest --backend fake --model-latency-ms 40 \\
+        --mix text:0.6,pdf:0.3,docx:0.1 --pages 1,10 --output load.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from .corpus import build_corpus, make_text
+
+DISTRIBUTION = {"mcq": 0.5, "true_false": 0.5, "fill_in": 0.0}
+
+
+@dataclass
+class Sample:
+    kind: str
+    latency: float
+    status: int
+    error: Optional[str] = None
+
+
+@dataclass
+class RunState:
+    samples: List[Sample] = field(default_factory=list)
+    probe_latencies: List[float] = field(default_factory=list)
+    peak_rss: int = 0
+
+
+def _free_port() -> int:
+    with contextlib.closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(backend: str, model_latency: float, port: int):
+    """Import the app with the requested backend and serve it from a thread."""
+    if backend == "fake":
+        from .stubs import StubSummarizer, install_stub_questgen
+
+        install_stub_questgen(model_latency)
+
+    import uvicorn
+    from app import main as app_main
+
+    if backend == "fake":
+        app_main.file_parser.summarizer = StubSummarizer(model_latency)
+
+    config = uvicorn.Config(app_main.app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("uvicorn failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+
+def _parse_mix(mix: str) -> Tuple[List[str], List[float]]:
+    kinds, weights = [], []
+    for part in mix.split(","):
+        kind, _, weight = part.partition(":")
+        kinds.append(kind.strip())
+        weights.append(float(weight or 1))
+    return kinds, weights
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+async def _send(client, kind: str, payloads: Dict[str, list], rng: random.Random, questions: int) -> Sample:
+    started = time.perf_counter()
+    try:
+        if kind == "text":
+            response = await client.post("/generate-from-text/", json={
+                "text_input": rng.choice(payloads["text"]),
+                "total_questions": questions,
+                "mcq_percentage": DISTRIBUTION["mcq"],
+                "true_false_percentage": DISTRIBUTION["true_false"],
+                "fill_in_percentage": DISTRIBUTION["fill_in"],
+            })
+        else:
+            document = rng.choice(payloads[kind])
+            response = await client.post(
+                "/generate-from-file/",
+                files={"file": (document.name, document.content, document.content_type)},
+                data={"total_questions": str(questions), "question_distribution_json": json.dumps(DISTRIBUTION)},
+            )
+        error = None if response.status_code < 400 else response.text[:200]
+        return Sample(kind, time.perf_counter() - started, response.status_code, error)
+    except Exception as e:
+        return Sample(kind, time.perf_counter() - started, 0, repr(e))
+
+
+async def _drive(base_url: str, args, payloads: Dict[str, list], state: RunState):
+    import httpx
+
+    from app.utils.metrics import process_rss_bytes
+
+    kinds, weights = _parse_mix(args.mix)
+    rng = random.Random(args.seed)
+    schedule = rng.choices(kinds, weights=weights, k=args.requests)
+    queue: asyncio.Queue = asyncio.Queue()
+    for kind in schedule:
+        queue.put_nowait(kind)
+    done = asyncio.Event()
+
+    async def worker(client):
+        worker_rng = random.Random(rng.random())
+        while True:
+            try:
+                kind = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            state.samples.append(await _send(client, kind, payloads, worker_rng, args.questions))
+
+    async def probe(client):
+        while not done.is_set():
+            started = time.perf_counter()
+            with contextlib.suppress(Exception):
+                await client.get("/health")
+                state.probe_latencies.append(time.perf_counter() - started)
+            state.peak_rss = max(state.peak_rss, process_rss_bytes())
+            await asyncio.sleep(args.probe_interval)
+
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        probe_task = asyncio.create_task(probe(client))
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        done.set()
+        await probe_task
+
+
+def summarize(state: RunState, elapsed: float) -> dict:
+    latencies = [s.latency for s in state.samples]
+    ok = [s.latency for s in state.samples if 0 < s.status < 400]
+    errors = Counter(s.status for s in state.samples if not 0 < s.status < 400)
+    by_kind = {}
+    for kind in sorted({s.kind for s in state.samples}):
+        kind_latencies = [s.latency for s in state.samples if s.kind == kind]
+        by_kind[kind] = {
+            "requests": len(kind_latencies),
+            "p50_s": _percentile(kind_latencies, 50),
+            "p95_s": _percentile(kind_latencies, 95),
+        }
+    return {
+        "requests": len(state.samples),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(ok) / elapsed if elapsed else 0.0,
+        "error_rate": 1 - len(ok) / len(state.samples) if state.samples else 0.0,
+        "errors_by_status": {str(status): count for status, count in errors.items()},
+        "p50_s": _percentile(latencies, 50),
+        "p95_s": _percentile(latencies, 95),
+        "p99_s": _percentile(latencies, 99),
+        "mean_s": statistics.fmean(latencies) if latencies else 0.0,
+        "peak_rss_mb": state.peak_rss / 1_048_576,
+        "loop_probe_p99_s": _percentile(state.probe_latencies, 99),
+        "loop_probe_max_s": max(state.probe_latencies, default=0.0),
+        "by_kind": by_kind,
+        "sample_errors": [s.error for s in state.samples if s.error][:5],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("fake", "real"), default="fake")
+    parser.add_argument("--model-latency-ms", type=float, default=0.0, help="Per-call sleep of the fake models")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--mix", default="text:0.5,pdf:0.3,docx:0.2", help="Weighted kinds: text, pdf, docx, txt")
+    parser.add_argument("--pages", default="1,5", help="Comma-separated page counts for generated documents")
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--probe-interval", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--verbose", action="store_true", help="Keep the app's own console output")
+    args = parser.parse_args(argv)
+
+    pages = [int(p) for p in args.pages.split(",") if p]
+    kinds, _ = _parse_mix(args.mix)
+    file_kinds = [kind for kind in kinds if kind != "text"]
+    payloads: Dict[str, list] = {kind: [] for kind in kinds}
+    for document in build_corpus(pages, file_kinds, args.seed):
+        payloads[document.kind].append(document)
+    if "text" in payloads:
+        payloads["text"] = [make_text(p, args.seed) for p in pages]
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    port = _free_port()
+    state = RunState()
+    with open(os.devnull, "w") as devnull:
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+        with quiet:
+            server, thread = start_server(args.backend, args.model_latency_ms / 1000, port)
+            started = time.perf_counter()
+            try:
+                asyncio.run(_drive(f"http://127.0.0.1:{port}", args, payloads, state))
+            finally:
+                elapsed = time.perf_counter() - started
+                server.should_exit = True
+                thread.join(timeout=10)
+
+    report = summarize(state, elapsed)
+    report["settings"] = vars(args)
+    print(
+        f"{report['requests']} requests in {elapsed:.1f}s at concurrency {args.concurrency} ({args.backend} backend)\n"
+        f"  throughput  {report['throughput_rps']:.2f} req/s   error rate {report['error_rate']:.1%}\n"
+        f"  latency     p50 {report['p50_s'] * 1000:.0f} ms   p95 {report['p95_s'] * 1000:.0f} ms"
+        f"   p99 {report['p99_s'] * 1000:.0f} ms\n"
+        f"  loop probe  p99 {report['loop_probe_p99_s'] * 1000:.0f} ms   max {report['loop_probe_max_s'] * 1000:.0f} ms\n"
+        f"  peak RSS    {report['peak_rss_mb']:.0f} MiB"
+    )
+    for kind, stats in report["by_kind"].items():
+        print(f"  {kind:<5} n={stats['requests']:<5} p50 {stats['p50_s'] * 1000:.0f} ms   p95 {stats['p95_s'] * 1000:.0f} ms")
+    if report["sample_errors"]:
+        print("  first errors:\n    " + "\n    ".join(report["sample_errors"]))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    return 0 if report["error_rate"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
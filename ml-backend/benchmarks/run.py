@@ -0,0 +1,220 @@
+"""
+run.py - Offline benchmark suite for the parse -> clean -> generate pipeline.
+
+Measures, over a synthetic corpus (and optional fixture documents):
+
+    parse       FileParser.parse_file (summarization disabled)
+    clean       PDFTextCleaner.clean_document (clean + one segmentation pass)
+    sentences   get_all_sentences over the segmented document
+    generate    QuestgenService.generate_questions with deterministic stub
+                models, i.e. pure orchestration overhead
+
+No T5 or BART weights are downloaded or loaded; fill-in questions use
+spaCy's small English pipeline (en_core_web_sm), which is quick to load and
+part of the measured generate time. Without NLTK's punkt data the
+sentence splitter falls back to punctuation rules, so timings are not
+comparable with runs that have it.
+
+Usage (from ml-backend/):
+    python -m benchmarks.run --sizes 1,10,100,500 --output bench.json
+    python -m benchmarks.run --compare bench-main.json --fail-on-regression
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from .corpus import Document, build_corpus, load_fixtures
+from .stubs import StubSummarizer, install_stub_questgen
+
+install_stub_questgen()
+
+from fastapi import UploadFile  # noqa: E402
+from starlette.datastructures import Headers  # noqa: E402
+
+from app.services.pdf_text_cleaner import PDFTextCleaner, ProcessingMode  # noqa: E402
+from app.services.questgen_service import QuestgenService, get_all_sentences  # noqa: E402
+from app.utils.file_parser import FileParser  # noqa: E402
+from app.utils.metrics import MODEL_CALLS  # noqa: E402
+
+DISTRIBUTION = {"mcq": 0.4, "true_false": 0.4, "fill_in": 0.2}
+MODELS = ("qgen", "boolq")
+
+
+def _time(func: Callable[[], object], repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def _upload(document: Document) -> UploadFile:
+    return UploadFile(
+        file=io.BytesIO(document.content),
+        filename=document.name,
+        headers=Headers({"content-type": document.content_type}),
+    )
+
+
+def _result(name: str, document: Document, timings: List[float], units: Dict[str, float], **extra) -> dict:
+    median = statistics.median(timings)
+    result = {
+        "benchmark": name,
+        "document": document.name,
+        "pages": document.pages,
+        "repeat": len(timings),
+        "median_s": median,
+        "min_s": min(timings),
+    }
+    for unit, amount in units.items():
+        result[f"{unit}_per_s"] = amount / median if median else float("inf")
+    result.update(extra)
+    return result
+
+
+def _model_calls() -> float:
+    return sum(MODEL_CALLS.value(model=model) for model in MODELS)
+
+
+def run_suite(documents: List[Document], repeat: int, total_questions: int) -> List[dict]:
+    parser = FileParser()
+    parser.summarizer = StubSummarizer()
+    cleaner = PDFTextCleaner({"processing_mode": ProcessingMode.ACADEMIC})
+    service = QuestgenService()
+    results = []
+
+    for document in documents:
+        print(f"• {document.name} ({len(document.content) / 1024:.0f} KiB)", file=sys.stderr)
+        size_mb = len(document.content) / 1_000_000
+
+        def parse():
+            return asyncio.run(parser.parse_file(_upload(document), summarize_large_files=False))
+
+        text, _ = parse()
+        words = len(text.split())
+        results.append(_result("parse", document, _time(parse, repeat), {"mb": size_mb, "pages": document.pages}))
+
+        cleaned, _ = cleaner.clean_document(text)
+        results.append(_result(
+            "clean", document, _time(lambda: cleaner.clean_document(text), repeat),
+            {"words": words, "mb": len(text) / 1_000_000},
+        ))
+
+        sentences = get_all_sentences(cleaned)
+        results.append(_result(
+            "sentences", document, _time(lambda: get_all_sentences(cleaned), repeat),
+            {"words": cleaned.word_count()}, sentence_count=len(sentences),
+        ))
+
+        calls_before = _model_calls()
+        timings = _time(lambda: service.generate_questions(cleaned, total_questions, DISTRIBUTION), repeat)
+        calls = (_model_calls() - calls_before) / repeat
+        results.append(_result(
+            "generate", document, timings, {"questions": total_questions},
+            model_calls_per_request=calls,
+        ))
+    return results
+
+
+def _environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(current: List[dict], baseline: List[dict], threshold: float) -> List[str]:
+    """Print a per-benchmark delta table and return the regressions."""
+    previous = {(r["benchmark"], r["document"]): r for r in baseline}
+    regressions = []
+    print(f"\n{'benchmark':<10} {'document':<26} {'base ms':>10} {'now ms':>10} {'delta':>8}")
+    for result in current:
+        key = (result["benchmark"], result["document"])
+        if key not in previous:
+            continue
+        base, now = previous[key]["median_s"], result["median_s"]
+        delta = (now - base) / base if base else 0.0
+        flag = ""
+        if delta > threshold:
+            flag = "  REGRESSION"
+            regressions.append(f"{key[0]} on {key[1]}: {delta:+.1%}")
+        print(f"{key[0]:<10} {key[1]:<26} {base * 1000:>10.2f} {now * 1000:>10.2f} {delta:>+8.1%}{flag}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,10,100,500", help="Comma-separated page counts")
+    parser.add_argument("--kinds", default="pdf,docx,txt", help="Comma-separated document kinds")
+    parser.add_argument("--fixtures", help="Directory of real pdf/docx/txt documents to include")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--questions", type=int, default=10, help="total_questions per generate call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative slowdown flagged as regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    parser.add_argument("--verbose", action="store_true", help="Keep the pipeline's own console output")
+    args = parser.parse_args(argv)
+
+    from app.utils.segmentation import _punkt
+
+    if _punkt() is None:
+        print("NLTK punkt data is missing, using the punctuation fallback; "
+              "run `python -m nltk.downloader punkt punkt_tab` for comparable numbers.", file=sys.stderr)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    documents = build_corpus(sizes, args.kinds.split(","), args.seed)
+    if args.fixtures:
+        documents.extend(load_fixtures(args.fixtures))
+
+    with open(os.devnull, "w") as devnull:
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)
+        with quiet:
+            results = run_suite(documents, args.repeat, args.questions)
+    report = {"environment": _environment(), "settings": vars(args), "results": results}
+
+    print(f"\n{'benchmark':<10} {'document':<26} {'median ms':>10}  throughput")
+    for result in report["results"]:
+        rates = ", ".join(f"{v:,.1f} {k[:-6]}/s" for k, v in result.items() if k.endswith("_per_s"))
+        print(f"{result['benchmark']:<10} {result['document']:<26} {result['median_s'] * 1000:>10.2f}  {rates}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as handle:
+            baseline = json.load(handle)["results"]
+        regressions = compare(report["results"], baseline, args.threshold)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            if args.fail_on_regression:
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+scheduling.py - Latency of small requests behind heavy documents, FIFO lock vs fair scheduler.
+
+Simulates the generation stage only: every job is a number of "sentences",
+each a sleep of --sentence-ms standing in for one model call, with a
+checkpoint() between sentences as in the real pipeline. One job runs at a
+time, as on the shared models.
+
+Workload: --heavy clients each submit one document of --heavy-sentences
+sentences at t=0, then --light clients submit short texts of
+--light-sentences sentences with exponential gaps (--rate per second in
+total) for --duration seconds. Costs are passed to the scheduler from the
+sentence counts, as planner.job_cost estimates them.
+
+Modes:
+    fifo   a plain lock, as before the scheduler (arrival order)
+    fair   app.utils.scheduling.FairScheduler
+
+Reports p50/p95/max latency of the light jobs and when the heavy jobs finish.
+
+Usage (from ml-backend/):
+    python -m benchmarks.scheduling
+    python -m benchmarks.scheduling --heavy 2 --heavy-sentences 400 --rate 4 --output sched.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from typing import List, Optional
+
+from app.utils.scheduling import FairScheduler, checkpoint
+
+
+class _FifoScheduler:
+    """The previous behaviour: one lock, no ordering beyond arrival."""
+
+    def __init__(self):
+        # threading.Lock makes no ordering promise; a ticket queue keeps arrival order
+        self._condition = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+
+    @contextlib.contextmanager
+    def run(self, client: str, cost: float):
+        with self._condition:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while self._serving != ticket:
+                self._condition.wait()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._serving += 1
+                self._condition.notify_all()
+
+
+def _job(scheduler, client: str, sentences: int, sentence_s: float, arrived: float, results: list, kind: str) -> None:
+    with scheduler.run(client, sentences * sentence_s):
+        for _ in range(sentences):
+            checkpoint()
+            time.sleep(sentence_s)
+    results.append({"kind": kind, "client": client, "latency_s": time.perf_counter() - arrived})
+
+
+def simulate(mode: str, args) -> dict:
+    scheduler = FairScheduler() if mode == "fair" else _FifoScheduler()
+    sentence_s = args.sentence_ms / 1000
+    rng = random.Random(args.seed)
+    results: List[dict] = []
+    threads = []
+
+    def submit(client: str, sentences: int, kind: str) -> None:
+        thread = threading.Thread(
+            target=_job, args=(scheduler, client, sentences, sentence_s, time.perf_counter(), results, kind)
+        )
+        thread.start()
+        threads.append(thread)
+
+    began = time.perf_counter()
+    for h in range(args.heavy):
+        submit(f"heavy-{h}", args.heavy_sentences, "heavy")
+    time.sleep(0.01)  # the heavy jobs are running before the first light job arrives
+    while time.perf_counter() - began < args.duration:
+        time.sleep(rng.expovariate(args.rate))
+        submit(f"light-{rng.randrange(args.light)}", args.light_sentences, "light")
+    for thread in threads:
+        thread.join()
+
+    light = sorted(r["latency_s"] for r in results if r["kind"] == "light")
+    heavy = [r["latency_s"] for r in results if r["kind"] == "heavy"]
+    return {
+        "mode": mode,
+        "light_jobs": len(light),
+        "light_p50_s": statistics.median(light),
+        "light_p95_s": light[int(0.95 * (len(light) - 1))],
+        "light_max_s": light[-1],
+        "heavy_done_s": max(heavy),
+        "total_s": time.perf_counter() - began,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="fifo,fair")
+    parser.add_argument("--sentence-ms", type=float, default=20.0, help="Simulated model time per sentence")
+    parser.add_argument("--heavy", type=int, default=1, help="Clients submitting one heavy document each")
+    parser.add_argument("--heavy-sentences", type=int, default=300)
+    parser.add_argument("--light", type=int, default=20, help="Clients submitting short texts")
+    parser.add_argument("--light-sentences", type=int, default=6)
+    parser.add_argument("--rate", type=float, default=3.0, help="Light jobs per second, all clients together")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds during which light jobs arrive")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    results = []
+    for mode in args.modes.split(","):
+        # The scheduler logs every preemption; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()):
+            results.append(simulate(mode, args))
+        print(f"• {mode}: done", file=sys.stderr)
+
+    print(f"\n{'mode':>6} {'light jobs':>11} {'p50':>8} {'p95':>8} {'max':>8} {'heavy done':>11}")
+    for r in results:
+        print(
+            f"{r['mode']:>6} {r['light_jobs']:>11} {r['light_p50_s']:>7.2f}s {r['light_p95_s']:>7.2f}s "
+            f"{r['light_max_s']:>7.2f}s {r['heavy_done_s']:>10.2f}s"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"settings": vars(args), "results": results}, handle, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""
+startup.py - Cold-start budget for the API process.
+
+Measures, each in a fresh interpreter:
+
+    import      `python -X importtime -c "import app.main"`: total time and the
+                slowest modules, plus any heavy dependency (torch,
+                transformers, spacy, nltk, Questgen, ...) that is imported
+                eagerly although it should load lazily
+    bind        process start until uvicorn accepts TCP connections
+    ready       process start until /ready returns 200 (models loaded)
+
+Exits non-zero when a phase exceeds its budget, so it can gate CI.
+
+Usage (from ml-backend/):
+    python -m benchmarks.startup
+    python -m benchmarks.startup --backend real --bind-budget 3 --ready-budget 120
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import List, Optional
+
+from .loadtest import _free_port
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("torch", "transformers", "spacy", "nltk", "Questgen", "pke", "fitz", "docx", "pypdf", "sense2vec")
+FAKE_PRELUDE = "from benchmarks.stubs import install_stub_questgen; install_stub_questgen(); "
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    return env
+
+
+def measure_imports(prelude: str, workdir: str, top: int) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"{prelude}import app.main"],
+        cwd=workdir, env=_env(), capture_output=True, text=True, check=False,
+    )
+    if completed.returncode:
+        raise RuntimeError(f"import app.main failed:\n{completed.stderr[-2000:]}")
+
+    modules = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            modules.append((match.group(4), int(match.group(1)) / 1e6, int(match.group(2)) / 1e6))
+    total = next((cumulative for name, _, cumulative in modules if name == "app.main"), 0.0)
+    eager = sorted({name.split(".")[0] for name, _, _ in modules} & set(HEAVY_MODULES))
+    slowest = sorted(modules, key=lambda m: m[1], reverse=True)[:top]
+    return {
+        "total_s": total,
+        "eager_heavy_imports": eager,
+        "slowest": [{"module": name, "self_s": own, "cumulative_s": cumulative} for name, own, cumulative in slowest],
+    }
+
+
+def measure_serving(prelude: str, workdir: str, timeout: float) -> dict:
+    port = _free_port()
+    code = f"{prelude}import uvicorn; uvicorn.run('app.main:app', host='127.0.0.1', port={port}, log_level='warning')"
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-c", code], cwd=workdir, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    result = {"bind_s": None, "ready_s": None}
+    try:
+        deadline = started + timeout
+        while time.perf_counter() < deadline and process.poll() is None:
+            if result["bind_s"] is None:
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+                    result["bind_s"] = time.perf_counter() - started
+                except OSError:
+                    time.sleep(0.02)
+                    continue
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/ready", timeout=1) as response:
+                    if response.status == 200:
+                        result["ready_s"] = time.perf_counter() - started
+                        break
+            except (urllib.error.URLError, OSError):
+                pass
+            time.sleep(0.05)
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited early:\n{process.stderr.read().decode()[-2000:]}")
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("fake", "real"), default="fake")
+    parser.add_argument("--import-budget", type=float, default=1.5, help="Seconds allowed for `import app.main`")
+    parser.add_argument("--bind-budget", type=float, default=3.0, help="Seconds allowed until the port accepts")
+    parser.add_argument("--ready-budget", type=float, default=None, help="Seconds allowed until /ready (off by default)")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--top", type=int, default=15, help="Slowest modules to list")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    prelude = FAKE_PRELUDE if args.backend == "fake" else ""
+    # Scratch working directory keeps logs and symlinks out of the source tree
+    with tempfile.TemporaryDirectory() as workdir:
+        imports = measure_imports(prelude, workdir, args.top)
+        serving = measure_serving(prelude, workdir, args.timeout)
+
+    print(f"import app.main  {imports['total_s']:.2f}s (budget {args.import_budget:g}s)")
+    for module in imports["slowest"]:
+        print(f"  {module['self_s'] * 1000:>8.1f} ms self {module['cumulative_s'] * 1000:>9.1f} ms cum  {module['module']}")
+    if imports["eager_heavy_imports"]:
+        print(f"  eagerly imported: {', '.join(imports['eager_heavy_imports'])}")
+    for phase in ("bind", "ready"):
+        value = serving[f"{phase}_s"]
+        print(f"{phase:<16} {'timed out' if value is None else f'{value:.2f}s'}")
+
+    failures = []
+    if imports["total_s"] > args.import_budget:
+        failures.append("import")
+    if serving["bind_s"] is None or serving["bind_s"] > args.bind_budget:
+        failures.append("bind")
+    if args.ready_budget is not None and (serving["ready_s"] is None or serving["ready_s"] > args.ready_budget):
+        failures.append("ready")
+    if failures:
+        print(f"Over budget: {', '.join(failures)}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"settings": vars(args), "imports": imports, "serving": serving, "over_budget": failures}, handle, indent=2)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+stubs.py - Deterministic stand-ins for the Questgen and BART models.
+
+The stubs mimic the output shapes of ``Questgen.main`` and ``Summarizer`` so the
+real orchestration code runs unchanged, without downloading or loading any
+model weights. Outputs depend only on the input text, so runs are repeatable.
+
+``install_stub_questgen()`` covers ``Questgen.main`` and the ``Questgen.mcq.mcq``
+helpers used by the document-level MCQ path. It must be called before
+``app.services.questgen_service`` is imported.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import sys
+import time
+import types
+
+
+def _digest(text: str) -> int:
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _keywords(text: str, limit: int):
+    words = [w.strip(".,;:()") for w in text.split()]
+    return [w for w in words if len(w) > 6][:limit]
+
+
+class StubSeq2Seq:
+    """Stands in for a T5 model's generate(): costs latency scaled by beams and length.
+
+    Returns how many sequences the call produced, so decoding tiers
+    (app.utils.decoding) change both the time and the yield of the stubs.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def generate(self, **kwargs) -> int:
+        if self.latency:
+            length = kwargs.get("max_new_tokens") or kwargs.get("max_length") or 150
+            time.sleep(self.latency * kwargs.get("num_beams", 1) ** 0.5 * length / 150)
+        return kwargs.get("num_return_sequences", 1)
+
+
+class StubQGen:
+    """Returns 0-2 MCQs per call, chosen from the longest words of the input."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        # Handles the document-level MCQ path passes to the Questgen.mcq helpers
+        self.nlp = self.s2v = self.fdist = self.normalized_levenshtein = None
+        self.device = self.tokenizer = self
+        self.model = StubSeq2Seq(latency)
+
+    def predict_mcq(self, payload: dict) -> dict:
+        # Same decode settings as Questgen's generate_questions_mcq
+        self.model.generate(early_stopping=True, max_length=150)
+        text = payload.get("input_text", "")
+        count = _digest(text) % 3
+        questions = []
+        for index, keyword in enumerate(_keywords(text, count)):
+            questions.append({
+                "question_statement": f"Which term is described by: {text[:60].strip()} ({index + 1})?",
+                "question_type": "MCQ",
+                "answer": keyword,
+                "id": index + 1,
+                "options": [f"{keyword}-a", f"{keyword}-b", f"{keyword}-c"],
+                "options_algorithm": "stub",
+                "extra_options": [],
+                "context": text,
+            })
+        if not questions:
+            return {}
+        return {"statement": text, "questions": questions, "time_taken": self.latency}
+
+
+def stub_get_keywords(nlp, text, max_keywords, s2v, fdist, normalized_levenshtein, no_of_sentences):
+    """Most frequent long words, ties broken alphabetically."""
+    counts = {}
+    for word in _keywords(text, len(text)):
+        counts[word.lower()] = counts.get(word.lower(), 0) + 1
+    ranked = sorted(counts, key=lambda w: (-counts[w], w))
+    return ranked[:min(int(max_keywords), 2 * no_of_sentences)]
+
+
+def stub_get_sentences_for_keyword(keywords, sentences):
+    mapping = {}
+    for keyword in keywords:
+        found = [s for s in sentences if keyword in s.lower()]
+        if found:
+            mapping[keyword] = sorted(found, key=len, reverse=True)
+    return mapping
+
+
+def stub_generate_questions_mcq(keyword_sent_mapping, device, tokenizer, model, sense2vec, normalized_levenshtein):
+    model.generate(early_stopping=True, max_length=150)
+    questions = []
+    for index, (answer, snippet) in enumerate(keyword_sent_mapping.items()):
+        questions.append({
+            "question_statement": f"Which term completes: {snippet[:60].strip()}... ({answer})?",
+            "question_type": "MCQ",
+            "answer": answer,
+            "id": index + 1,
+            "options": [f"{answer}-a", f"{answer}-b", f"{answer}-c"],
+            "options_algorithm": "stub",
+            "extra_options": [],
+            "context": snippet,
+        })
+    return {"questions": questions}
+
+
+class StubBoolQGen:
+    """Returns 1-3 yes/no questions per call."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.model = StubSeq2Seq(latency)
+
+    def predict_boolq(self, payload: dict) -> dict:
+        # Questgen's beam search settings; the beams returned cap the questions
+        returned = self.model.generate(
+            max_length=256, num_beams=10, num_return_sequences=3, no_repeat_ngram_size=2, early_stopping=True
+        )
+        text = payload.get("input_text", "")
+        count = min(returned, 1 + _digest(text) % 3)
+        subject = " ".join(text.split()[:8]).rstrip(".,")
+        questions = [f"Is it true that {subject.lower()} ({index + 1})?" for index in range(count)]
+        return {"Text": text, "Count": count, "Boolean Questions": questions}
+
+
+class StubSummarizer:
+    """Extractive stand-in for ``Summarizer``: keeps every third sentence."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.model = None
+
+    def summarize(self, text: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        sentences = re.split(r"(?<=[.!?])\s+", text)
+        return " ".join(sentences[::3])
+
+    chunk_and_summarize = summarize
+
+
+def install_stub_questgen(latency: float = 0.0) -> None:
+    """Register fake ``Questgen.main`` and ``Questgen.mcq.mcq`` modules backed by the stubs."""
+    package = types.ModuleType("Questgen")
+    package.__path__ = []
+    main = types.ModuleType("Questgen.main")
+    main.QGen = lambda: StubQGen(latency)
+    main.BoolQGen = lambda: StubBoolQGen(latency)
+    mcq_package = types.ModuleType("Questgen.mcq")
+    mcq_package.__path__ = []
+    mcq = types.ModuleType("Questgen.mcq.mcq")
+    mcq.get_keywords = stub_get_keywords
+    mcq.get_sentences_for_keyword = stub_get_sentences_for_keyword
+    mcq.generate_questions_mcq = stub_generate_questions_mcq
+    package.main = main
+    package.mcq = mcq_package
+    mcq_package.mcq = mcq
+    sys.modules["Questgen"] = package
+    sys.modules["Questgen.main"] = main
+    sys.modules["Questgen.mcq"] = mcq_package
+    sys.modules["Questgen.mcq.mcq"] = mcq
@@ -0,0 +1,96 @@
+"""
+tiers.py - Latency and question yield of each decoding tier.
+
+Runs QuestgenService.generate_questions on the same documents under every
+tier in app.utils.decoding (fast, balanced, thorough) and reports the median
+latency and how many of the requested questions came back.
+
+Backends:
+    fake    the stub models (benchmarks.stubs); each generate() sleeps in
+            proportion to its beams and length, so the table shows the shape
+            of the trade-off without model weights
+    real    the production Questgen models
+
+Usage (from ml-backend/):
+    python -m benchmarks.tiers --sizes 1,5 --questions 10
+    python -m benchmarks.tiers --backend real --repeat 3 --output tiers.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+from typing import List, Optional
+
+from .corpus import make_text
+
+DISTRIBUTION = {"mcq": 0.4, "true_false": 0.4, "fill_in": 0.2}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("fake", "real"), default="fake")
+    parser.add_argument("--model-latency-ms", type=float, default=5.0, help="Per-call base sleep of the fake models")
+    parser.add_argument("--sizes", default="1,5", help="Comma-separated page counts")
+    parser.add_argument("--questions", type=int, default=10, help="total_questions per request")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per tier and document; the median is reported")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    if args.backend == "fake":
+        from .stubs import install_stub_questgen
+
+        install_stub_questgen(args.model_latency_ms / 1000)
+
+    from app.services.pdf_text_cleaner import PDFTextCleaner, ProcessingMode
+    from app.services.questgen_service import QuestgenService
+    from app.utils.decoding import TIERS, decoding_tier
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    cleaner = PDFTextCleaner({"processing_mode": ProcessingMode.ACADEMIC})
+
+    results = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        service = QuestgenService()
+        for pages in sizes:
+            document, _ = cleaner.clean_document(make_text(pages, args.seed))
+            for name in TIERS:
+                latencies, counts = [], []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    with decoding_tier(name):
+                        payload = service.generate_questions(document, args.questions, DISTRIBUTION)
+                    latencies.append(time.perf_counter() - started)
+                    counts.append(len(payload["questions"]))
+                results.append({
+                    "pages": pages,
+                    "tier": name,
+                    "latency_s": statistics.median(latencies),
+                    "questions": statistics.median(counts),
+                    "yield": statistics.median(counts) / args.questions,
+                })
+
+    print(f"{'pages':>6} {'tier':>10} {'latency':>10} {'questions':>10} {'yield':>7} {'vs thorough':>12}")
+    for result in results:
+        reference = next(r for r in results if r["pages"] == result["pages"] and r["tier"] == "thorough")
+        speedup = reference["latency_s"] / result["latency_s"] if result["latency_s"] else 0.0
+        result["speedup"] = speedup
+        print(
+            f"{result['pages']:>6} {result['tier']:>10} {result['latency_s'] * 1000:>8.0f}ms "
+            f"{result['questions']:>10g} {result['yield']:>7.0%} {speedup:>11.1f}x"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"settings": vars(args), "results": results}, handle, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
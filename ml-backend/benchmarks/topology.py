@@ -0,0 +1,145 @@
+"""
+topology.py - Auto-tune the workers x threads split for this machine.
+
+For every split that fits in the available CPUs (app.utils.topology), this
+starts that many worker processes and configures each one exactly as
+app.serve would. The workers run the same inference workload
+concurrently for a fixed time, and the total throughput of each split is
+compared.
+
+Workloads:
+    proxy   float32 matmuls shaped like a T5-base feed-forward layer (numpy,
+            or torch when installed); needs no model weights
+    real    QuestgenService.generate_questions on a synthetic page, with the
+            production models
+
+Usage (from ml-backend/):
+    python -m benchmarks.topology
+    python -m benchmarks.topology --workload real --duration 60 --output topology.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from app import config
+from app.utils.topology import THREAD_ENV_VARS, apply_environment, available_cpus, configure_torch, current_topology
+
+
+def candidate_splits(cpus: int, max_workers: Optional[int] = None) -> List[Tuple[int, int]]:
+    """(workers, threads) pairs that use at most `cpus` cores, threads dividing them evenly."""
+    splits = []
+    for workers in range(1, (max_workers or cpus) + 1):
+        threads = cpus // workers
+        if threads >= 1 and (workers, threads) not in splits:
+            splits.append((workers, threads))
+    return splits
+
+
+def _proxy_step():
+    try:
+        import torch
+
+        configure_torch()
+        a, b = torch.randn(64, 768), torch.randn(768, 3072)
+        return lambda: a @ b
+    except ImportError:
+        import numpy as np
+
+        a = np.random.rand(64, 768).astype(np.float32)
+        b = np.random.rand(768, 3072).astype(np.float32)
+        return lambda: a @ b
+
+
+def _real_step():
+    from benchmarks.corpus import make_text
+
+    from app.services.questgen_service import get_questgen
+
+    service = get_questgen()
+    text = make_text(1)
+    return lambda: service.generate_questions(text, 5, {"mcq": 0.4, "true_false": 0.4, "fill_in": 0.2})
+
+
+def _worker(workload: str, workers: int, threads: int, duration: float, ready, start, results) -> None:
+    """Runs in a spawned process: configure threads like app.serve, warm up, then count steps."""
+    # Make current_topology() (used by configure_torch and the services) return this split
+    config.WORKERS, config.TORCH_THREADS = str(workers), str(threads)
+    current_topology.cache_clear()
+    for name in THREAD_ENV_VARS:
+        os.environ.pop(name, None)
+    apply_environment()
+
+    with open(os.devnull, "w") as devnull:
+        sys.stdout = devnull
+        step = _proxy_step() if workload == "proxy" else _real_step()
+        step()
+        ready.release()
+        start.wait()
+        steps, deadline = 0, time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            step()
+            steps += 1
+    results.put(steps)
+
+
+def measure(workload: str, workers: int, threads: int, duration: float) -> float:
+    """Total steps per second across all workers for one split."""
+    context = multiprocessing.get_context("spawn")
+    ready, start, results = context.Semaphore(0), context.Event(), context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(workload, workers, threads, duration, ready, start, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.acquire()
+    start.set()
+    total = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return total / duration
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workload", choices=("proxy", "real"), default="proxy")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of measurement per split")
+    parser.add_argument("--cpus", type=int, help="Override the detected CPU count")
+    parser.add_argument("--max-workers", type=int, help="Largest worker count to try (memory bound for real models)")
+    parser.add_argument("--output", help="Write the JSON report to this path")
+    args = parser.parse_args(argv)
+
+    cpus = args.cpus or available_cpus()
+    print(f"{cpus} usable CPUs (affinity and cgroup quota), workload={args.workload}", file=sys.stderr)
+
+    results = []
+    for workers, threads in candidate_splits(cpus, args.max_workers):
+        throughput = measure(args.workload, workers, threads, args.duration)
+        results.append({"workers": workers, "threads": threads, "steps_per_s": throughput})
+        print(f"• {workers} x {threads}: {throughput:.1f} steps/s", file=sys.stderr)
+
+    best = max(results, key=lambda r: r["steps_per_s"])
+    print(f"\n{'workers':>8} {'threads':>8} {'steps/s':>10} {'vs best':>8}")
+    for result in results:
+        print(
+            f"{result['workers']:>8} {result['threads']:>8} {result['steps_per_s']:>10.1f} "
+            f"{result['steps_per_s'] / best['steps_per_s']:>8.0%}"
+        )
+    print(f"\nRecommended: WEB_CONCURRENCY={best['workers']} TORCH_THREADS={best['threads']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"cpus": cpus, "settings": vars(args), "results": results, "best": best}, handle, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())